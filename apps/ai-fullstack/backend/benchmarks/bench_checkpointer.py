@@ -0,0 +1,121 @@
+"""Checkpoint write/read latency and size: InMemorySaver vs the SQLite saver.
+
+Simulates threads the way the graph checkpoints them: every turn writes a checkpoint
+whose `messages` channel holds the whole (growing) history, plus the turn's canvas
+context and role fields, and pending writes for one task. Reports p50/p95 `put` and
+`get_tuple` latency and stored bytes per thread for:
+
+  memory          InMemorySaver (JsonPlusSerializer, msgpack)
+  sqlite          SqliteSaver, msgpack without compression
+  sqlite+zstd     SqliteSaver with CompressedSerializer (the default)
+
+Usage:
+    python benchmarks/bench_checkpointer.py
+    python benchmarks/bench_checkpointer.py --threads 20 --turns 60 --canvas-nodes 400
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent / "src"))
+sys.path.insert(0, str(HERE))
+
+from bench_graph_e2e import QUESTIONS, percentile  # noqa: E402
+from micro import make_canvas  # noqa: E402
+
+
+def run(saver, threads: int, turns: int, canvas: dict) -> dict:
+    """Write and read back `turns` growing checkpoints per thread; return p50/p95 latencies in ms."""
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+
+    rng = random.Random(11)
+    put_ms: list[float] = []
+    get_ms: list[float] = []
+    for t in range(threads):
+        config = {"configurable": {"thread_id": f"bench-{t}", "checkpoint_ns": ""}}
+        checkpoint = empty_checkpoint()
+        messages: list = []
+        versions: dict[str, str | None] = {}
+        for turn in range(turns):
+            messages = messages + [
+                HumanMessage(content=QUESTIONS[turn % len(QUESTIONS)], id=f"h{t}-{turn}"),
+                AIMessage(content="分镜说明。" * rng.randint(60, 200), id=f"a{t}-{turn}"),
+            ]
+            values = {
+                "messages": messages,
+                "canvas_context": canvas,
+                "active_role": "storyboard",
+                "conversation_summary": "摘要。" * 200,
+            }
+            new_versions = {}
+            for channel in values:
+                versions[channel] = saver.get_next_version(versions.get(channel), None)
+                new_versions[channel] = versions[channel]
+            checkpoint = create_checkpoint({**checkpoint, "channel_versions": dict(versions)}, None, turn)
+            checkpoint["channel_values"] = values
+            started = time.perf_counter()
+            config = saver.put(config, checkpoint, {"source": "loop", "step": turn, "parents": {}}, new_versions)
+            saver.put_writes(config, [("messages", messages[-1:])], task_id=f"task-{turn}")
+            put_ms.append((time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+            saver.get_tuple({"configurable": {"thread_id": f"bench-{t}", "checkpoint_ns": ""}})
+            get_ms.append((time.perf_counter() - started) * 1000)
+    return {
+        "put_p50": percentile(put_ms, 50),
+        "put_p95": percentile(put_ms, 95),
+        "get_p50": percentile(get_ms, 50),
+        "get_p95": percentile(get_ms, 95),
+    }
+
+
+def main() -> int:
+    """Compare the in-memory saver with the SQLite saver, with and without compression."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--canvas-nodes", type=int, default=200)
+    args = parser.parse_args()
+
+    from langgraph.checkpoint.memory import InMemorySaver
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+    from agent.checkpointer import CompressedSerializer, SqliteSaver
+
+    canvas = make_canvas(nodes=args.canvas_nodes, edges=args.canvas_nodes * 2)
+    sys.stdout.write(f"{'saver':<14}{'put p50':>10}{'put p95':>10}{'get p50':>10}{'get p95':>10}{'KB/thread':>12}\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        savers = {
+            "memory": InMemorySaver(),
+            "sqlite": SqliteSaver(Path(tmp) / "plain.sqlite", serde=JsonPlusSerializer()),
+            "sqlite+zstd": SqliteSaver(Path(tmp) / "zstd.sqlite", serde=CompressedSerializer()),
+        }
+        for name, saver in savers.items():
+            report = run(saver, args.threads, args.turns, canvas)
+            if isinstance(saver, SqliteSaver):
+                saver._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                stored = sum(
+                    len(row[0] or b"")
+                    for table in ("checkpoints", "blobs", "writes")
+                    for row in saver._conn.execute(f"SELECT {'checkpoint' if table == 'checkpoints' else 'blob'} FROM {table}")
+                )
+                saver.close()
+            else:
+                stored = sum(len(blob) for _, blob in saver.blobs.values())
+                stored += sum(len(c[1]) + len(m[1]) for ns in saver.storage.values() for cps in ns.values() for c, m, _ in cps.values())
+            sys.stdout.write(
+                f"{name:<14}{report['put_p50']:>10.2f}{report['put_p95']:>10.2f}"
+                f"{report['get_p50']:>10.2f}{report['get_p95']:>10.2f}{stored / 1024 / args.threads:>12.1f}\n"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,195 @@
+"""Offline end-to-end benchmark for `agent.graph.graph` against the fake OpenAI server.
+
+Starts benchmarks/fake_openai_server.py in-process (or uses --base-url), runs turns
+through the compiled graph at the requested concurrency and reports throughput plus
+p50/p95/p99 latency per turn and per node. No real API keys are needed.
+
+Usage:
+    python benchmarks/bench_graph_e2e.py --turns 40 --concurrency 8 --latency-ms 150 --tokens-per-second 200
+    python benchmarks/bench_graph_e2e.py --smoke        # quick correctness run (used by `make test`)
+    python benchmarks/bench_graph_e2e.py --json out.json
+    python benchmarks/bench_graph_e2e.py --turns 5 --record trace.jsonl.zst          # capture a cassette
+    python benchmarks/bench_graph_e2e.py --replay trace.jsonl.zst --speed 0           # replay it offline
+
+--replay also accepts cassettes recorded in production (CASSETTE_MODE=record); the
+cassette is looped so any --turns count can be replayed.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent / "src"))
+sys.path.insert(0, str(HERE))
+
+from fake_openai_server import start_in_thread  # noqa: E402
+
+QUESTIONS = (
+    "九宫格怎么连视频",
+    "怎么锁定风格？",
+    "帮我写一个猫咪侦探的 15 秒短片分镜",
+    "给角色小橘做一套三视图设定",
+    "这个镜头的光线怎么调更有电影感",
+)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Return the linearly interpolated `pct` percentile of `values` (0.0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def run_turn(graph, index: int, interaction_mode: str) -> tuple[float, dict[str, float], str]:
+    """Run one turn; return (total seconds, {node: seconds}, final text)."""
+    from langchain_core.messages import HumanMessage
+
+    state = {
+        "messages": [HumanMessage(content=QUESTIONS[index % len(QUESTIONS)])],
+        "interaction_mode": interaction_mode,
+    }
+    config = {"configurable": {"llm_provider": "openai", "thread_id": f"bench-{index}"}}
+    started = time.perf_counter()
+    node_started: dict[str, float] = {}
+    node_seconds: dict[str, float] = {}
+    final_text = ""
+    # "tasks" events arrive synchronously at node start and finish.
+    for mode, event in graph.stream(state, config, stream_mode=["tasks", "values"]):
+        now = time.perf_counter()
+        if mode == "tasks":
+            name = event.get("name")
+            if "result" in event or "error" in event:
+                if name in node_started:
+                    node_seconds[name] = now - node_started.pop(name)
+            else:
+                node_started[name] = now
+        elif mode == "values":
+            messages = event.get("messages") or []
+            if messages:
+                final_text = str(getattr(messages[-1], "content", "") or "")
+    return time.perf_counter() - started, node_seconds, final_text
+
+
+def main() -> int:
+    """Run the benchmark and print per-turn and per-node latency percentiles."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--interaction-mode", default="agent", choices=("agent", "agent_max", "plan"))
+    parser.add_argument("--base-url", help="Use an already running fake/real OpenAI-compatible server")
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-second", type=float, default=400.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--responses-unsupported", action="store_true", help="Force the Chat Completions fallback")
+    parser.add_argument("--smoke", action="store_true", help="Few fast turns; exit non-zero if any turn fails")
+    parser.add_argument("--record", metavar="CASSETTE", help="Record all model/RAG traffic to this cassette")
+    parser.add_argument("--replay", metavar="CASSETTE", help="Replay a cassette instead of calling a server")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed factor (0 = no delays)")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    if args.smoke:
+        args.turns, args.concurrency = 4, 2
+        args.latency_ms, args.jitter_ms, args.tokens_per_second = 5.0, 0.0, 0.0
+
+    server = None
+    base_url = args.base_url or "http://cassette.invalid/v1"
+    if not args.base_url and not args.replay:
+        server, base_url = start_in_thread(
+            # get_openai_client rewrites 127.0.0.1/localhost to host.docker.internal inside
+            # containers; any other loopback address is left alone.
+            host="127.0.0.2" if os.path.exists("/.dockerenv") else "127.0.0.1",
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            tokens_per_second=args.tokens_per_second,
+            error_rate=args.error_rate,
+            responses_unsupported=args.responses_unsupported,
+        )
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+    os.environ["LANGSMITH_TRACING"] = "false"
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+    from agent.cassette import active_cassette, use_cassette
+    from agent.graph import graph
+
+    if args.record:
+        use_cassette(args.record, "record")
+    elif args.replay:
+        use_cassette(args.replay, "replay", speed=args.speed, loop=True)
+
+    # Warm-up turn: imports, client construction and first connections are not measured.
+    run_turn(graph, 0, args.interaction_mode)
+
+    totals: list[float] = []
+    per_node: dict[str, list[float]] = defaultdict(list)
+    failures: list[str] = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        futures = [pool.submit(run_turn, graph, i, args.interaction_mode) for i in range(args.turns)]
+        for fut in futures:
+            try:
+                seconds, nodes, text = fut.result()
+            except Exception as exc:
+                failures.append(f"{exc.__class__.__name__}: {exc}")
+                continue
+            if not text.strip():
+                failures.append("empty answer")
+            totals.append(seconds)
+            for name, value in nodes.items():
+                per_node[name].append(value)
+    wall = time.perf_counter() - started
+
+    def summary(values: list[float]) -> dict:
+        return {
+            "n": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+
+    report = {
+        "turns": args.turns,
+        "concurrency": args.concurrency,
+        "wall_seconds": round(wall, 3),
+        "throughput_turns_per_s": round(len(totals) / wall, 3) if wall > 0 else 0.0,
+        "failures": len(failures),
+        "turn": summary(totals),
+        "nodes": {name: summary(values) for name, values in sorted(per_node.items())},
+        "llm_requests": server.fake.requests if server is not None else None,
+    }
+
+    sys.stdout.write(
+        f"turns={report['turns']} concurrency={report['concurrency']} wall={report['wall_seconds']}s "
+        f"throughput={report['throughput_turns_per_s']} turns/s failures={report['failures']}\n"
+    )
+    sys.stdout.write(f"{'':<20} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}\n")
+    for name, stats in [("turn", report["turn"])] + list(report["nodes"].items()):
+        sys.stdout.write(f"{name:<20} {stats['n']:>5} {stats['p50_ms']:>10} {stats['p95_ms']:>10} {stats['p99_ms']:>10}\n")
+    for failure in failures[:5]:
+        sys.stdout.write(f"FAIL {failure}\n")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if server is not None:
+        server.shutdown()
+    if args.record or args.replay:
+        sys.stdout.write(f"cassette {active_cassette().stats()}\n")
+        use_cassette(None)
+    return 1 if (args.smoke and failures) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,91 @@
+"""Cold-start import budget check based on `python -X importtime`.
+
+For each target module, imports it in fresh interpreters, takes the median cumulative
+import time and fails when it exceeds the budget in baselines/import_budget.json (scaled
+by --scale for slower machines). It also fails when a module listed as `forbidden` gets
+imported as a side effect (e.g. a provider SDK that should load lazily on first use).
+
+Usage:
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --runs 7 --scale 1.5 --top 15
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+SRC = HERE.parent / "src"
+DEFAULT_BUDGET = HERE / "baselines" / "import_budget.json"
+
+
+def import_once(module: str) -> tuple[dict[str, int], set[str]]:
+    """Import `module` in a fresh interpreter; return ({name: cumulative us}, loaded modules)."""
+    code = f"import sys, json; import {module}; print(json.dumps(sorted(sys.modules)))"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(SRC), os.environ.get("PYTHONPATH")]))}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    cumulative: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        # Top-level entries (the indentation shows nesting) carry the full cost.
+        cumulative[name] = max(cumulative.get(name, 0), int(parts[1]))
+    loaded = set(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return cumulative, loaded
+
+
+def main() -> int:
+    """Check every target against its import time budget and forbidden eager imports."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=Path, default=DEFAULT_BUDGET)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every time budget (slow CI machines)")
+    parser.add_argument("--top", type=int, default=10, help="Show the N most expensive imports per target")
+    args = parser.parse_args()
+
+    targets: dict[str, dict] = json.loads(args.budget.read_text(encoding="utf-8"))
+    failures: list[str] = []
+    for module, spec in targets.items():
+        samples: list[int] = []
+        heaviest: dict[str, int] = {}
+        loaded: set[str] = set()
+        for _ in range(max(1, args.runs)):
+            cumulative, loaded = import_once(module)
+            samples.append(cumulative.get(module, 0))
+            for name, us in cumulative.items():
+                heaviest[name] = max(heaviest.get(name, 0), us)
+        median_ms = statistics.median(samples) / 1000
+        budget_ms = float(spec.get("budget_ms") or 0) * args.scale
+        over = budget_ms and median_ms > budget_ms
+        sys.stdout.write(f"{module:<24} median {median_ms:8.1f} ms  budget {budget_ms:8.1f} ms  {'OVER' if over else 'ok'}\n")
+        if over:
+            failures.append(f"{module}: {median_ms:.1f} ms > {budget_ms:.1f} ms")
+        leaked = sorted(m for m in spec.get("forbidden", []) if m in loaded)
+        if leaked:
+            failures.append(f"{module}: imports {', '.join(leaked)} eagerly")
+        for name, us in sorted(heaviest.items(), key=lambda kv: -kv[1])[1 : args.top + 1]:
+            sys.stdout.write(f"    {us / 1000:8.1f} ms  {name}\n")
+
+    for failure in failures:
+        sys.stdout.write(f"FAIL {failure}\n")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,103 @@
+"""Long-thread checkpoint growth with and without summary-aware message trimming.
+
+Runs many turns on ONE thread through the graph compiled with an InMemorySaver, against
+the fake OpenAI server, once with the full history and once with
+`memory_trim_max_messages`. Reports how many messages the latest checkpoint holds, the
+serialized size of its state and the time to serialize it, plus turn latency for the
+first and last 10% of turns.
+
+Usage:
+    python benchmarks/bench_long_thread.py                  # 200 turns, trim at 64 messages
+    python benchmarks/bench_long_thread.py --turns 500 --trim 48
+    python benchmarks/bench_long_thread.py --archive-dir /tmp/archive
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent / "src"))
+sys.path.insert(0, str(HERE))
+
+from bench_graph_e2e import QUESTIONS  # noqa: E402
+from fake_openai_server import start_in_thread  # noqa: E402
+
+
+def run_thread(turns: int, trim: int, archive_dir: str) -> dict:
+    """Run `turns` turns on one thread; report the final state size and turn latency."""
+    from langchain_core.messages import HumanMessage
+    from langgraph.checkpoint.memory import InMemorySaver
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+    from agent.graph import builder
+
+    graph = builder.compile(checkpointer=InMemorySaver())
+    serde = JsonPlusSerializer()
+    config = {
+        "configurable": {
+            "llm_provider": "openai",
+            "thread_id": f"long-thread-trim-{trim}",
+            "memory_trim_max_messages": trim,
+            "memory_archive_dir": archive_dir,
+        }
+    }
+    latencies: list[float] = []
+    for index in range(turns):
+        # Pad the questions so the history grows like a real creative thread.
+        text = f"{QUESTIONS[index % len(QUESTIONS)]}（第 {index} 轮）" + "补充说明。" * 40
+        started = time.perf_counter()
+        graph.invoke({"messages": [HumanMessage(content=text)], "interaction_mode": "agent"}, config)
+        latencies.append(time.perf_counter() - started)
+
+    values = graph.get_state(config).values
+    started = time.perf_counter()
+    _, blob = serde.dumps_typed(values)
+    serialize_ms = (time.perf_counter() - started) * 1000
+    edge = max(1, turns // 10)
+    return {
+        "messages": len(values.get("messages") or []),
+        "state_kb": len(blob) / 1024,
+        "serialize_ms": serialize_ms,
+        "first_turns_ms": statistics.median(latencies[:edge]) * 1000,
+        "last_turns_ms": statistics.median(latencies[-edge:]) * 1000,
+    }
+
+
+def main() -> int:
+    """Compare the full-history and trimmed runs against the fake OpenAI server."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--trim", type=int, default=64, help="memory_trim_max_messages for the trimmed run")
+    parser.add_argument("--archive-dir", default="", help="Also archive trimmed messages here")
+    args = parser.parse_args()
+
+    server, base_url = start_in_thread(
+        host="127.0.0.2" if os.path.exists("/.dockerenv") else "127.0.0.1",
+        latency_ms=0.0,
+        jitter_ms=0.0,
+        tokens_per_second=0.0,
+    )
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+    os.environ["LANGSMITH_TRACING"] = "false"
+    os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+    sys.stdout.write(f"{'mode':<14}{'messages':>10}{'state KB':>12}{'dump ms':>10}{'first p50':>12}{'last p50':>12}\n")
+    for label, trim in (("full history", 0), (f"trim@{args.trim}", args.trim)):
+        report = run_thread(args.turns, trim, args.archive_dir if trim else "")
+        sys.stdout.write(
+            f"{label:<14}{report['messages']:>10}{report['state_kb']:>12.1f}{report['serialize_ms']:>10.2f}"
+            f"{report['first_turns_ms']:>12.1f}{report['last_turns_ms']:>12.1f}\n"
+        )
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,103 @@
+"""Throughput benchmark for the prompt generator and /api/prompt/generate.
+
+Measures:
+  - generate_prompt()          precompiled templates, no memoization
+  - render_prompt_response()   memoized (ETag, body) path, warm cache
+  - POST /api/prompt/generate  in-process ASGI round trips
+
+Usage:
+    python benchmarks/bench_prompt_generator.py [--iterations 20000] [--requests 2000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import httpx  # noqa: E402
+
+from agent.app import app  # noqa: E402
+from agent.prompt_generator import generate_prompt, render_prompt_response  # noqa: E402
+from agent.tools_and_schemas import PromptRequest  # noqa: E402
+
+
+def _requests() -> list[PromptRequest]:
+    out: list[PromptRequest] = []
+    for workflow, language, subject, style in itertools.product(
+        ("character_creation", "direct_image", "merchandise"),
+        ("zh", "en"),
+        ("拟人狐狸城市探员", "赛博朋克街景", "cat astronaut"),
+        (None, "高端 3D 动画电影质感, PBR"),
+    ):
+        out.append(
+            PromptRequest(
+                workflow=workflow,
+                language=language,
+                subject=subject,
+                visual_style=style,
+                model="Sora",
+                consistency="保持同一角色服装与配色",
+            )
+        )
+    return out
+
+
+def _report(name: str, count: int, seconds: float) -> None:
+    per_op_us = seconds / count * 1e6 if count else 0.0
+    sys.stdout.write(f"{name:<34} {count:>8} ops  {count / seconds:>12,.0f} ops/s  {per_op_us:>9.2f} us/op\n")
+
+
+def bench_functions(iterations: int) -> None:
+    """Time generate_prompt and the memoized render_prompt_response."""
+    reqs = _requests()
+    started = time.perf_counter()
+    for i in range(iterations):
+        generate_prompt(reqs[i % len(reqs)])
+    _report("generate_prompt", iterations, time.perf_counter() - started)
+
+    for r in reqs:
+        render_prompt_response(r)
+    started = time.perf_counter()
+    for i in range(iterations):
+        render_prompt_response(reqs[i % len(reqs)])
+    _report("render_prompt_response (warm)", iterations, time.perf_counter() - started)
+
+
+async def bench_endpoint(total: int, concurrency: int) -> None:
+    """Time concurrent POST /api/prompt/generate round trips through the ASGI app."""
+    payloads = [json.loads(r.model_dump_json()) for r in _requests()]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue = iter(range(total))
+
+        async def worker() -> None:
+            for i in queue:
+                resp = await client.post("/api/prompt/generate", json=payloads[i % len(payloads)])
+                if resp.status_code != 200:
+                    raise RuntimeError(f"unexpected status {resp.status_code}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        _report(f"POST /api/prompt/generate (c={concurrency})", total, time.perf_counter() - started)
+
+
+def main() -> None:
+    """Run the function and endpoint benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    bench_functions(args.iterations)
+    asyncio.run(bench_endpoint(args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
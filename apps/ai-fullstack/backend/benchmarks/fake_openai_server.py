@@ -0,0 +1,392 @@
+"""Fake OpenAI-compatible server for offline benchmarks.
+
+Speaks enough of the API for `agent.graph`:
+  - POST /v1/responses (stream=true): SSE events response.created,
+    response.output_item.added/done, response.output_text.delta/done,
+    response.function_call_arguments.delta/done, response.completed (with usage).
+  - POST /v1/chat/completions: JSON (or SSE chunks with stream=true).
+
+Behaviour is scriptable:
+  - latency_ms / jitter_ms: delay before the first event (TTFT).
+  - tokens_per_second: pacing of streamed deltas (0 = as fast as possible).
+  - error_rate / error_status: random error injection.
+  - responses_unsupported: answer 404 on /v1/responses to force the Chat Completions fallback.
+  - rules: list of {"match": "<substring of the prompt>", "text": "...",
+    "tool_calls": [{"name": "...", "arguments": {...}}], "latency_ms": ..., "error": <status>}.
+    The first matching rule wins; tool calls are only emitted when the request offers tools.
+
+Structured-output requests (text.format json_schema, or the chat fallback prompt that embeds
+the schema) get a minimal JSON instance built from the schema.
+
+Usage:
+    python benchmarks/fake_openai_server.py --port 8900 --latency-ms 300 --tokens-per-second 80
+    OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8900/v1 ...
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+DEFAULT_TEXT = (
+    "好的，这里是建议：先确定角色设定与画风，再拆成九宫格分镜，最后合成 15 秒视频。"
+    "每个镜头保持同一光照和服装，关键转折放在第 5 格。"
+)
+
+_TOKEN_RE = re.compile(r"[㐀-鿿]|[^\s㐀-鿿]+\s*|\s+")
+_SCHEMA_MARKER = "Return ONLY a single JSON object matching this schema:\n"
+
+
+def _tokens(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text) or [text]
+
+
+def _instance_for_schema(schema: dict, defs: dict | None = None) -> Any:
+    """Build a minimal value that validates against a (pydantic-generated) JSON schema."""
+    defs = defs if defs is not None else (schema.get("$defs") or {})
+    if "$ref" in schema:
+        return _instance_for_schema(defs.get(schema["$ref"].rsplit("/", 1)[-1], {}), defs)
+    if "default" in schema:
+        return schema["default"]
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "anyOf" in schema:
+        options = [s for s in schema["anyOf"] if s.get("type") != "null"]
+        return _instance_for_schema(options[0], defs) if options else None
+    kind = schema.get("type")
+    if kind == "object":
+        props = schema.get("properties") or {}
+        return {name: _instance_for_schema(sub, defs) for name, sub in props.items()}
+    if kind == "array":
+        return []
+    if kind == "boolean":
+        return False
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "string":
+        return ""
+    return None
+
+
+def _prompt_text(payload: dict) -> str:
+    """Flatten Responses `input` or Chat `messages` into one string for rule matching."""
+    chunks: list[str] = []
+    items = payload.get("input") if "input" in payload else payload.get("messages")
+    if isinstance(items, str):
+        return items
+    for item in items or []:
+        content = item.get("content") if isinstance(item, dict) else None
+        if isinstance(content, str):
+            chunks.append(content)
+        elif isinstance(content, list):
+            for block in content:
+                if isinstance(block, dict) and isinstance(block.get("text"), str):
+                    chunks.append(block["text"])
+    return "\n".join(chunks)
+
+
+@dataclass
+class Reply:
+    """What the fake model answers to one request."""
+
+    text: str
+    tool_calls: list[dict] = field(default_factory=list)
+    latency_ms: float = 0.0
+    error: int | None = None
+
+
+@dataclass
+class FakeOpenAI:
+    """Scripted OpenAI-compatible backend: latency, streaming rate, errors and canned replies."""
+
+    latency_ms: float = 200.0
+    jitter_ms: float = 0.0
+    tokens_per_second: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 500
+    responses_unsupported: bool = False
+    rules: list[dict] = field(default_factory=list)
+    text: str = DEFAULT_TEXT
+    requests: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def plan(self, payload: dict, *, has_tools: bool) -> Reply:
+        """Pick the reply: the first matching rule, else a schema-shaped instance or the default text."""
+        with self._lock:
+            self.requests += 1
+        prompt = _prompt_text(payload)
+        latency = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+        error = self.error_status if self.error_rate and random.random() < self.error_rate else None
+
+        schema = None
+        fmt = (payload.get("text") or {}).get("format") if isinstance(payload.get("text"), dict) else None
+        if isinstance(fmt, dict) and fmt.get("type") == "json_schema":
+            schema = fmt.get("schema")
+        elif _SCHEMA_MARKER in prompt:
+            try:
+                schema = json.loads(prompt.split(_SCHEMA_MARKER, 1)[1])
+            except ValueError:
+                schema = None
+
+        for rule in self.rules:
+            if str(rule.get("match") or "") in prompt:
+                text = rule.get("text")
+                if text is None:
+                    text = json.dumps(_instance_for_schema(schema), ensure_ascii=False) if schema else self.text
+                return Reply(
+                    text=text,
+                    tool_calls=list(rule.get("tool_calls") or []) if has_tools else [],
+                    latency_ms=float(rule.get("latency_ms", latency)),
+                    error=rule.get("error", error),
+                )
+        if schema:
+            return Reply(text=json.dumps(_instance_for_schema(schema), ensure_ascii=False), latency_ms=latency, error=error)
+        return Reply(text=self.text, latency_ms=latency, error=error)
+
+    def usage(self, payload: dict, reply: Reply) -> tuple[int, int]:
+        """Return approximate (prompt, completion) token counts for the usage block."""
+        return len(_tokens(_prompt_text(payload))), len(_tokens(reply.text)) + 8 * len(reply.tool_calls)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    @property
+    def fake(self) -> FakeOpenAI:
+        return self.server.fake  # type: ignore[attr-defined]
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        return
+
+    def _json(self, status: int, obj: Any) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str) -> None:
+        self._json(status, {"error": {"message": message, "type": "fake_error", "code": status}})
+
+    def _start_sse(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+    def _sse(self, event: str | None, data: Any) -> None:
+        chunk = ""
+        if event:
+            chunk += f"event: {event}\n"
+        chunk += "data: " + (data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)) + "\n\n"
+        self.wfile.write(chunk.encode("utf-8"))
+        self.wfile.flush()
+
+    def _pace(self) -> None:
+        rate = self.fake.tokens_per_second
+        if rate > 0:
+            time.sleep(1.0 / rate)
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.rstrip("/") in ("/health", "/v1/models"):
+            self._json(200, {"ok": True, "requests": self.fake.requests, "data": []})
+            return
+        self._error(404, "not found")
+
+    def do_POST(self) -> None:  # noqa: N802
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._error(400, "invalid JSON")
+            return
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/responses"):
+            if self.fake.responses_unsupported:
+                self._error(404, "responses API not supported")
+                return
+            self._responses(payload)
+        elif path.endswith("/chat/completions"):
+            self._chat(payload)
+        else:
+            self._error(404, "not found")
+
+    def _responses(self, payload: dict) -> None:
+        fake = self.fake
+        reply = fake.plan(payload, has_tools=bool(payload.get("tools")))
+        time.sleep(reply.latency_ms / 1000.0)
+        if reply.error:
+            self._error(int(reply.error), "injected error")
+            return
+        model = payload.get("model") or "fake-model"
+        resp_id = f"resp_{uuid.uuid4().hex[:16]}"
+        msg_id = f"msg_{uuid.uuid4().hex[:16]}"
+        seq = iter(range(1_000_000))
+        base = {"id": resp_id, "object": "response", "created_at": int(time.time()), "model": model, "output": []}
+
+        self._start_sse()
+        self._sse("response.created", {"type": "response.created", "sequence_number": next(seq), "response": {**base, "status": "in_progress"}})
+
+        output: list[dict] = []
+        index = 0
+        if reply.text:
+            item = {"type": "message", "id": msg_id, "role": "assistant", "status": "in_progress", "content": []}
+            self._sse("response.output_item.added", {"type": "response.output_item.added", "sequence_number": next(seq), "output_index": index, "item": item})
+            part = {"type": "output_text", "text": "", "annotations": []}
+            self._sse("response.content_part.added", {"type": "response.content_part.added", "sequence_number": next(seq), "item_id": msg_id, "output_index": index, "content_index": 0, "part": part})
+            for tok in _tokens(reply.text):
+                self._pace()
+                self._sse(
+                    "response.output_text.delta",
+                    {"type": "response.output_text.delta", "sequence_number": next(seq), "item_id": msg_id, "output_index": index, "content_index": 0, "delta": tok, "logprobs": []},
+                )
+            self._sse("response.output_text.done", {"type": "response.output_text.done", "sequence_number": next(seq), "item_id": msg_id, "output_index": index, "content_index": 0, "text": reply.text, "logprobs": []})
+            done_item = {**item, "status": "completed", "content": [{"type": "output_text", "text": reply.text, "annotations": []}]}
+            self._sse("response.output_item.done", {"type": "response.output_item.done", "sequence_number": next(seq), "output_index": index, "item": done_item})
+            output.append(done_item)
+            index += 1
+
+        for call in reply.tool_calls:
+            fc_id = f"fc_{uuid.uuid4().hex[:16]}"
+            call_id = f"call_{uuid.uuid4().hex[:16]}"
+            arguments = json.dumps(call.get("arguments") or {}, ensure_ascii=False)
+            item = {"type": "function_call", "id": fc_id, "call_id": call_id, "name": call.get("name"), "arguments": "", "status": "in_progress"}
+            self._sse("response.output_item.added", {"type": "response.output_item.added", "sequence_number": next(seq), "output_index": index, "item": item})
+            for i in range(0, len(arguments), 16):
+                self._pace()
+                self._sse(
+                    "response.function_call_arguments.delta",
+                    {"type": "response.function_call_arguments.delta", "sequence_number": next(seq), "item_id": fc_id, "output_index": index, "delta": arguments[i : i + 16]},
+                )
+            self._sse("response.function_call_arguments.done", {"type": "response.function_call_arguments.done", "sequence_number": next(seq), "item_id": fc_id, "output_index": index, "arguments": arguments})
+            done_item = {**item, "arguments": arguments, "status": "completed"}
+            self._sse("response.output_item.done", {"type": "response.output_item.done", "sequence_number": next(seq), "output_index": index, "item": done_item})
+            output.append(done_item)
+            index += 1
+
+        input_tokens, output_tokens = fake.usage(payload, reply)
+        usage = {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        }
+        self._sse("response.completed", {"type": "response.completed", "sequence_number": next(seq), "response": {**base, "status": "completed", "output": output, "usage": usage}})
+
+    def _chat(self, payload: dict) -> None:
+        fake = self.fake
+        reply = fake.plan(payload, has_tools=bool(payload.get("tools")))
+        time.sleep(reply.latency_ms / 1000.0)
+        if reply.error:
+            self._error(int(reply.error), "injected error")
+            return
+        model = payload.get("model") or "fake-model"
+        chat_id = f"chatcmpl-{uuid.uuid4().hex[:16]}"
+        tool_calls = [
+            {
+                "id": f"call_{uuid.uuid4().hex[:16]}",
+                "type": "function",
+                "function": {"name": c.get("name"), "arguments": json.dumps(c.get("arguments") or {}, ensure_ascii=False)},
+            }
+            for c in reply.tool_calls
+        ]
+        input_tokens, output_tokens = fake.usage(payload, reply)
+        usage = {"prompt_tokens": input_tokens, "completion_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+        finish = "tool_calls" if tool_calls else "stop"
+
+        if not payload.get("stream"):
+            message: dict = {"role": "assistant", "content": reply.text}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            self._json(
+                200,
+                {
+                    "id": chat_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+                    "usage": usage,
+                },
+            )
+            return
+
+        self._start_sse()
+        base = {"id": chat_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        for tok in _tokens(reply.text):
+            self._pace()
+            self._sse(None, {**base, "choices": [{"index": 0, "delta": {"content": tok}, "finish_reason": None}]})
+        for i, call in enumerate(tool_calls):
+            self._sse(None, {**base, "choices": [{"index": 0, "delta": {"tool_calls": [{"index": i, **call}]}, "finish_reason": None}]})
+        self._sse(None, {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish}], "usage": usage})
+        self._sse(None, "[DONE]")
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, **options: Any) -> ThreadingHTTPServer:
+    """Create (but do not start) a fake server; `server.fake` holds the scriptable behaviour."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.fake = FakeOpenAI(**options)  # type: ignore[attr-defined]
+    return server
+
+
+def start_in_thread(host: str = "127.0.0.1", **options: Any) -> tuple[ThreadingHTTPServer, str]:
+    """Start a fake server on a free port in a daemon thread and return (server, base_url)."""
+    server = make_server(host, 0, **options)
+    threading.Thread(target=server.serve_forever, name="fake-openai", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+def main() -> None:
+    """Run the fake server in the foreground until interrupted."""
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--responses-unsupported", action="store_true")
+    parser.add_argument("--script", help="JSON file with a list of rules (see module docstring)")
+    args = parser.parse_args()
+
+    rules: list[dict] = []
+    if args.script:
+        with open(args.script, encoding="utf-8") as fh:
+            rules = json.load(fh)
+    server = make_server(
+        args.host,
+        args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        responses_unsupported=args.responses_unsupported,
+        rules=rules,
+    )
+    sys.stdout.write(f"Fake OpenAI server on http://{args.host}:{server.server_address[1]}/v1\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
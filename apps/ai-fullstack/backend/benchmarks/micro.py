@@ -0,0 +1,311 @@
+"""Micro-benchmarks for the pure, per-turn CPU helpers in `agent.graph` / `agent.utils`.
+
+Each case runs a helper on synthetic input (large canvases, ~50k-char stories, 10k-event
+streams, long answers with tapcanvas_actions payloads) and reports the best-of-N time per call.
+
+Timings are normalized by a fixed pure-Python calibration loop so stored baselines stay
+comparable across machines. A case fails when its normalized time exceeds
+baseline * (1 + threshold).
+
+Usage:
+    python benchmarks/micro.py                      # run and compare against baselines/micro.json
+    python benchmarks/micro.py -k sanitize          # only cases whose name contains "sanitize"
+    python benchmarks/micro.py --update-baseline    # (re)record baselines after an intended change
+    python benchmarks/micro.py --threshold 0.5 --json out.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import platform
+import random
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent / "src"))
+
+DEFAULT_BASELINE = HERE / "baselines" / "micro.json"
+
+_HAN = "角色镜头光影分镜画面风格故事人物动作表情背景场景色彩构图节奏转场特写远景中景夜雨街道城市森林海边"
+_NARRATIVE = ("他转身看向窗外。", "她忽然抬头，“你听见了吗？”", "是夜，雨下得很大。", "他们回头望去。")
+
+
+# --------------------------------------------------------------------------- generators
+
+
+def make_canvas(nodes: int = 2000, edges: int = 4000, seed: int = 7) -> dict:
+    """Canvas context shaped like the frontend payload (summary/characters/timeline/nodes/edges)."""
+    rng = random.Random(seed)
+    node_list = [
+        {
+            "id": f"n{i}",
+            "label": f"镜头{i}-{_HAN[i % len(_HAN)]}",
+            "kind": rng.choice(("image", "video", "text", "character", "composeVideo")),
+            "status": rng.choice(("success", "idle", "running", "error")),
+            "promptPreview": "".join(rng.choice(_HAN) for _ in range(160)),
+            "imageUrl": f"https://example.com/{i}.png" if i % 3 == 0 else "",
+        }
+        for i in range(nodes)
+    ]
+    edge_list = [
+        {"id": f"e{i}", "source": f"n{rng.randrange(nodes)}", "target": f"n{rng.randrange(nodes)}"}
+        for i in range(edges)
+    ]
+    return {
+        "summary": {"nodeCount": nodes, "edgeCount": edges, "kinds": ["image", "video", "text", "character"]},
+        "characters": [
+            {"nodeId": f"n{i}", "label": f"角色{i}", "description": "".join(rng.choice(_HAN) for _ in range(200))}
+            for i in range(12)
+        ],
+        "storyContext": [
+            {"nodeId": f"n{i}", "label": f"故事{i}", "promptExcerpt": "".join(rng.choice(_HAN) for _ in range(800))}
+            for i in range(4)
+        ],
+        "timeline": [
+            {"nodeId": f"n{i}", "label": f"片段{i}", "kind": "video", "status": "success", "duration": 5}
+            for i in range(24)
+        ],
+        "nodes": node_list,
+        "edges": edge_list,
+    }
+
+
+def make_story(chars: int = 50_000, seed: int = 11) -> str:
+    """Long-form narrative with paragraphs, dialogue and a storyboard hint near the end."""
+    rng = random.Random(seed)
+    out: list[str] = []
+    size = 0
+    while size < chars:
+        sentence = rng.choice(_NARRATIVE) if rng.random() < 0.3 else "".join(rng.choice(_HAN) for _ in range(24)) + "。"
+        if rng.random() < 0.05:
+            sentence += "\n\n"
+        out.append(sentence)
+        size += len(sentence)
+    out.append("请把上面的故事做成九宫格分镜。")
+    return "".join(out)
+
+
+def make_stream_events(events: int = 10_000, tool_calls: int = 3) -> list[Any]:
+    """Responses API streaming events: text deltas interleaved with function-call argument deltas."""
+    out: list[Any] = [SimpleNamespace(type="response.created")]
+    for c in range(tool_calls):
+        out.append(
+            SimpleNamespace(
+                type="response.output_item.added",
+                item=SimpleNamespace(type="function_call", call_id=f"call_{c}", id=f"fc_{c}", name="createNode", arguments=""),
+            )
+        )
+    for i in range(events):
+        if i % 10 == 9:
+            out.append(SimpleNamespace(type="response.function_call_arguments.delta", item_id=f"fc_{i % tool_calls}", delta='"x",'))
+        else:
+            out.append(SimpleNamespace(type="response.output_text.delta", delta=_HAN[i % len(_HAN)] * 3))
+    for c in range(tool_calls):
+        out.append(
+            SimpleNamespace(
+                type="response.function_call_arguments.done",
+                item_id=f"fc_{c}",
+                arguments=json.dumps({"type": "image", "label": f"n{c}", "config": {"prompt": "cat"}}),
+            )
+        )
+    out.append(SimpleNamespace(type="response.completed"))
+    return out
+
+
+def make_answer_with_actions(chars: int = 20_000, fenced: bool = False) -> str:
+    """Long assistant answer followed by a tapcanvas_actions payload (fenced or bare marker)."""
+    body = make_story(chars, seed=3)
+    actions = {
+        "actions": [
+            {"label": f"生成分镜 {i}", "input": f"请为第 {i} 格生成画面，包含 {{花括号}} 与 \"引号\""}
+            for i in range(8)
+        ]
+    }
+    payload = json.dumps(actions, ensure_ascii=False)
+    if fenced:
+        return f"{body}\n\n```tapcanvas_actions\n{payload}\n```\n"
+    return f"{body}\ntapcanvas_actions {payload}\n后续说明。"
+
+
+def make_citations(text: str, count: int = 400) -> list[dict]:
+    """Evenly spaced grounding citations over `text`, one segment each."""
+    step = max(1, len(text) // count)
+    return [
+        {
+            "start_index": i * step,
+            "end_index": min(len(text), i * step + step // 2),
+            "segments": [{"label": f"src{i}", "short_url": f"https://vertexaisearch.cloud.google.com/id/{i}"}],
+        }
+        for i in range(count)
+    ]
+
+
+# --------------------------------------------------------------------------- cases
+
+
+def build_cases() -> dict[str, Callable[[], Any]]:
+    """Return the benchmark cases by name, each a zero-argument callable."""
+    graph = importlib.import_module("agent.graph")
+    utils = importlib.import_module("agent.utils")
+    intent = importlib.import_module("agent.intent_features")
+    sanitizer = importlib.import_module("agent.sanitizer")
+    configuration = importlib.import_module("agent.configuration")
+    actions_stream = importlib.import_module("agent.actions_stream")
+
+    canvas = make_canvas()
+    story = make_story()
+    events = make_stream_events()
+    bare_actions = make_answer_with_actions()
+    fenced_actions = make_answer_with_actions(fenced=True)
+    risky = (story[:20_000] + "爆头 断肢 血浆 裸体 porn ") * 2
+    citation_text = story[:40_000]
+    citations = make_citations(citation_text)
+    kb_sources = [
+        {"label": f"doc{i}", "value": f"https://kb.example.com/docs/{i}", "short_url": utils.kb_short_url(f"https://kb.example.com/docs/{i}")}
+        for i in range(200)
+    ]
+    cited_answer = "".join(f"{citation_text[i * 200 : i * 200 + 200]} [doc{i}]({s['short_url']})" for i, s in enumerate(kb_sources[::2]))
+    # Same engines finalize_answer uses: built-in rules merged with SANITIZER_RULES_PATH.
+    rules_path = configuration.Configuration.from_runnable_config({}).sanitizer_rules_path
+    engines = sanitizer.sanitizer_engines(rules_path)
+    fenced_deltas = [fenced_actions[i : i + 6] for i in range(0, len(fenced_actions), 6)]
+
+    def stream_actions() -> None:
+        extractor = actions_stream.ActionsStreamExtractor()
+        for delta in fenced_deltas:
+            extractor.feed(delta)
+        extractor.finish()
+    plan_prompts = [risky[i * 200 : i * 200 + 400] for i in range(200)]
+
+    def sanitize_plan(table: str) -> None:
+        # apply_plan rewrites in place, so every call gets a fresh plan.
+        plan = [{"name": "createNode", "arguments": {"config": {"prompt": p}}} for p in plan_prompts]
+        engines[table].apply_plan(plan)
+
+    return {
+        "render_canvas_context": lambda: graph._render_canvas_context_for_prompt(canvas),
+        "collect_stream_10k_events": lambda: graph._collect_stream_text_and_tools(iter(events)),
+        "extract_actions_bare_20k": lambda: graph._extract_tapcanvas_actions(bare_actions),
+        "extract_actions_fenced_20k": lambda: graph._extract_tapcanvas_actions(fenced_actions),
+        "stream_actions_fenced_20k": stream_actions,
+        "canvas_existing_pairs": lambda: graph._canvas_existing_pairs_by_label(canvas),
+        # Clear the per-text cache so the keyword scan itself is measured.
+        "looks_like_story_50k": lambda: (intent.intent_features.cache_clear(), graph._looks_like_story_request(story)),
+        "intent_flags_all_50k": lambda: intent.IntentFeatures(story).flags(),
+        "sanitize_plan_sexual_200_prompts": lambda: sanitize_plan("sexual"),
+        "sanitize_plan_violent_200_prompts": lambda: sanitize_plan("violent"),
+        "insert_citation_markers_400": lambda: utils.insert_citation_markers(citation_text, citations),
+        "resolve_short_urls_200_sources": lambda: utils.resolve_short_urls(cited_answer, kb_sources),
+    }
+
+
+# --------------------------------------------------------------------------- timing
+
+
+def _calibration() -> None:
+    # Fixed mix of dict/str/list work, roughly the shape of the helpers above.
+    d: dict[str, int] = {}
+    parts: list[str] = []
+    for i in range(20_000):
+        key = "k" + str(i % 512)
+        d[key] = d.get(key, 0) + i
+        if i % 7 == 0:
+            parts.append(key)
+    "".join(parts).replace("k1", "x")
+
+
+def time_per_call(fn: Callable[[], Any], *, repeat: int, min_time: float) -> float:
+    """Best-of-`repeat` seconds per call; each sample loops until it lasts at least `min_time`."""
+    fn()  # warm caches / lazy imports
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def main() -> int:
+    """Time every case, compare it with the stored baseline and report regressions."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="keyword", default="", help="Only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.1, help="Seconds per sample")
+    parser.add_argument("--threshold", type=float, default=0.3, help="Allowed slowdown vs baseline (0.3 = +30%%)")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    cases = {name: fn for name, fn in build_cases().items() if args.keyword in name}
+    calibration = time_per_call(_calibration, repeat=args.repeat, min_time=args.min_time)
+
+    baseline: dict[str, Any] = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    base_cases = baseline.get("cases") or {}
+
+    results: dict[str, dict[str, float]] = {}
+    regressions: list[str] = []
+    sys.stdout.write(f"calibration {calibration * 1e6:.1f} us\n")
+    sys.stdout.write(f"{'case':<32} {'us/call':>12} {'norm':>9} {'baseline':>9} {'ratio':>7}\n")
+    for name, fn in cases.items():
+        seconds = time_per_call(fn, repeat=args.repeat, min_time=args.min_time)
+        norm = seconds / calibration
+        results[name] = {"us_per_call": round(seconds * 1e6, 3), "normalized": round(norm, 5)}
+        ref = (base_cases.get(name) or {}).get("normalized")
+        ratio = norm / ref if ref else None
+        flag = ""
+        if ratio is not None and ratio > 1 + args.threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        sys.stdout.write(
+            f"{name:<32} {seconds * 1e6:>12.1f} {norm:>9.4g} "
+            f"{(f'{ref:.4g}' if ref else '-'):>9} {(f'{ratio:.2f}' if ratio else '-'):>7}{flag}\n"
+        )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"calibration_us": calibration * 1e6, "cases": results}, indent=2), encoding="utf-8")
+
+    if args.update_baseline:
+        merged = {**base_cases, **results}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(
+            json.dumps(
+                {
+                    "python": platform.python_version(),
+                    "calibration_us": round(calibration * 1e6, 3),
+                    "cases": dict(sorted(merged.items())),
+                },
+                indent=2,
+            )
+            + "\n",
+            encoding="utf-8",
+        )
+        sys.stdout.write(f"baseline written to {args.baseline}\n")
+        return 0
+
+    if regressions:
+        sys.stdout.write(f"FAIL {len(regressions)} regression(s) past +{args.threshold:.0%}: {', '.join(regressions)}\n")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
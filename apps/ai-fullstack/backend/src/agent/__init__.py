@@ -1,3 +1,11 @@
-from agent.graph import graph
-
 __all__ = ["graph"]
+
+
+def __getattr__(name: str):
+    # Importing the compiled graph pulls in LangGraph and compiles the graph; only do it
+    # when `agent.graph` is actually requested (e.g. not for `agent.app` / prompt tools).
+    if name == "graph":
+        from agent.graph import graph
+
+        return graph
+    raise AttributeError(f"module 'agent' has no attribute {name!r}")
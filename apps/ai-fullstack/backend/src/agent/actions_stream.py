@@ -0,0 +1,332 @@
+"""Incremental extraction of the `tapcanvas_actions` quick-reply block while streaming.
+
+The answer model appends quick replies as a ```` ```tapcanvas_actions ```` fenced JSON
+block (or, when the fence is omitted, a bare `tapcanvas_actions` line followed by a JSON
+object). `ActionsStreamExtractor` watches text deltas, holds back only what could be the
+start of a marker, buffers just the JSON part, and reports:
+
+  - user-visible text with the block stripped, as it streams;
+  - normalized quick replies as soon as the block closes.
+
+Inside a graph node both are written to the LangGraph custom stream (stream_mode
+"custom") as {"event": "answer_delta", ...} and {"event": "quick_replies", ...}, so a
+client can render buttons before the turn ends.
+
+An optional `text_filter` (an object with `feed(text) -> str` and `finish() -> str`, e.g.
+utils.ShortUrlStreamResolver) rewrites the visible text before it is reported.
+
+With `hold=True` visible text is buffered until `release()`, so a node can keep raw model
+text back until its safety checks pass (or `discard()` it). Quick replies are reported as
+soon as their block closes even while holding: they are buttons, not answer text. The
+final message is still cleaned by graph._extract_tapcanvas_actions on the full text and
+stays authoritative: `sync()` brings the stream in line with it, appending the missing
+tail or, when the streamed text is not a prefix of the final one, sending
+{"event": "answer_reset", "text": ...}.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Protocol
+
+FENCE_MARKER = "```tapcanvas_actions"
+BARE_MARKER = "tapcanvas_actions"
+MAX_ACTIONS = 6
+
+
+def normalize_actions(obj: object) -> list[dict] | None:
+    """Validate a parsed actions payload into at most MAX_ACTIONS {label, input} items."""
+    actions = obj.get("actions") if isinstance(obj, dict) else None
+    if not isinstance(actions, list):
+        return None
+    normalized: list[dict] = []
+    for item in actions:
+        if not isinstance(item, dict):
+            continue
+        label = item.get("label")
+        input_text = item.get("input")
+        if not isinstance(label, str) or not label.strip():
+            continue
+        if not isinstance(input_text, str) or not input_text.strip():
+            continue
+        normalized.append({"label": label.strip(), "input": input_text})
+        if len(normalized) >= MAX_ACTIONS:
+            break
+    return normalized or None
+
+
+def _parse_actions(raw: str) -> list[dict] | None:
+    try:
+        return normalize_actions(json.loads(raw))
+    except Exception:
+        return None
+
+
+class TextFilter(Protocol):
+    """Incremental rewrite of the visible text (see module docstring)."""
+
+    def feed(self, text: str) -> str:
+        """Return the rewritten text that can be shown after appending `text`."""
+        ...
+
+    def finish(self) -> str:
+        """Return whatever was still held back at the end of the stream."""
+        ...
+
+
+def current_stream_writer() -> Callable[[Any], None] | None:
+    """LangGraph custom-stream writer of the running node, or None outside a graph run."""
+    try:
+        from langgraph.config import get_stream_writer
+
+        return get_stream_writer()
+    except Exception:
+        return None
+
+
+class ActionsStreamExtractor:
+    """Strip the tapcanvas_actions block from streamed text and surface it early."""
+
+    def __init__(
+        self,
+        on_text: Callable[[str], None] | None = None,
+        on_actions: Callable[[list[dict]], None] | None = None,
+        on_reset: Callable[[str], None] | None = None,
+        *,
+        hold: bool = False,
+        text_filter: TextFilter | None = None,
+    ) -> None:
+        """Create an extractor reporting through the callbacks; `hold` buffers text until `release()`."""
+        self.on_text = on_text
+        self.on_actions = on_actions
+        self.on_reset = on_reset
+        self.text_filter = text_filter
+        self.actions: list[dict] | None = None
+        self.hold = hold
+        self._held: list[str] = []
+        self._emitted: list[str] = []  # text already reported through on_text
+        self._emitted_actions: list[dict] | None = None
+        self._state = "text"  # text | fence_header | fence_payload | bare_marker | bare
+        self._pending = ""  # held-back text that may begin a marker
+        self._marker = ""  # bare marker (plus whitespace) not yet followed by "{"
+        self._line_start = True  # the character before _pending is a newline (or none)
+        self._payload = ""
+        self._payload_searched = 0
+        # Brace matching for the bare form (same rules as the non-streaming fallback).
+        self._depth = 0
+        self._quote = ""
+        self._escape = False
+
+    @classmethod
+    def for_node(
+        cls, node: str, *, hold: bool = False, text_filter: TextFilter | None = None
+    ) -> ActionsStreamExtractor | None:
+        """Extractor that writes to the current node's custom stream (None outside a run)."""
+        writer = current_stream_writer()
+        if writer is None:
+            return None
+
+        def on_text(text: str) -> None:
+            writer({"event": "answer_delta", "node": node, "text": text})
+
+        def on_actions(actions: list[dict]) -> None:
+            writer({"event": "quick_replies", "node": node, "quick_replies": actions})
+
+        def on_reset(text: str) -> None:
+            writer({"event": "answer_reset", "node": node, "text": text})
+
+        return cls(on_text, on_actions, on_reset, hold=hold, text_filter=text_filter)
+
+    # ------------------------------------------------------------------ public
+
+    def feed(self, delta: str) -> str:
+        """Consume one text delta; return (and report) the newly visible text."""
+        if not delta:
+            return ""
+        visible = self._consume(self._pending + delta)
+        if self.text_filter is not None:
+            visible = self.text_filter.feed(visible)
+        self._report_text(visible)
+        return visible
+
+    def finish(self) -> str:
+        """Flush held-back text at the end of the stream (an unclosed block stays hidden)."""
+        if self._state == "bare_marker":
+            visible, self._state = self._marker, "text"
+        else:
+            visible = self._pending if self._state == "text" else ""
+        self._pending = self._marker = ""
+        if self.text_filter is not None:
+            visible = self.text_filter.feed(visible) + self.text_filter.finish()
+        self._report_text(visible)
+        return visible
+
+    def release(self) -> None:
+        """Stop holding: report the held text; later text is reported as it streams."""
+        if not self.hold:
+            return
+        self.hold = False
+        text = "".join(self._held)
+        self._held = []
+        self._report_text(text)
+
+    def discard(self) -> None:
+        """Drop everything held so far; later output is held too until `release()`."""
+        self._held = []
+        self.hold = True
+
+    def sync(self, text: str, actions: list[dict] | None) -> None:
+        """Bring the reported stream in line with the final `text` and quick replies."""
+        self._held = []
+        self.hold = False
+        emitted = "".join(self._emitted)
+        text = text or ""
+        if text.startswith(emitted):
+            self._report_text(text[len(emitted) :])
+        else:
+            self._emitted = [text]
+            if self.on_reset is not None:
+                self.on_reset(text)
+        if (actions or None) != self._emitted_actions:
+            self._report_actions(list(actions or []))
+
+    def _report_text(self, text: str) -> None:
+        if not text:
+            return
+        if self.hold:
+            self._held.append(text)
+            return
+        self._emitted.append(text)
+        if self.on_text is not None:
+            self.on_text(text)
+
+    def _report_actions(self, actions: list[dict]) -> None:
+        self._emitted_actions = actions or None
+        if self.on_actions is not None:
+            self.on_actions(actions)
+
+    # ---------------------------------------------------------------- internals
+
+    def _consume(self, buf: str) -> str:
+        self._pending = ""
+        out: list[str] = []
+        line_start = self._line_start
+        while buf:
+            if self._state == "text":
+                index, marker = self._find_marker(buf, line_start)
+                if index < 0:
+                    keep = self._marker_prefix_len(buf, line_start)
+                    text = buf[: len(buf) - keep]
+                    out.append(text)
+                    if text:
+                        line_start = text.endswith("\n")
+                    self._pending = buf[len(buf) - keep :]
+                    break
+                out.append(buf[:index])
+                buf = buf[index + len(marker) :]
+                line_start = False
+                self._state = "fence_header" if marker == FENCE_MARKER else "bare_marker"
+                self._marker = marker
+                self._payload, self._payload_searched = "", 0
+                self._depth, self._quote, self._escape = 0, "", False
+            elif self._state == "bare_marker":
+                # A bare marker only opens a block when a JSON object follows it.
+                rest = buf.lstrip()
+                if not rest:
+                    self._marker += buf
+                    break
+                self._marker += buf[: len(buf) - len(rest)]
+                buf = rest
+                if buf[0] == "{":
+                    self._state = "bare"
+                else:
+                    out.append(self._marker)
+                    line_start = self._marker.endswith("\n")
+                    self._state = "text"
+                self._marker = ""
+            elif self._state == "fence_header":
+                newline = buf.find("\n")
+                if newline < 0:
+                    break
+                buf = buf[newline + 1 :]
+                self._state = "fence_payload"
+            elif self._state == "fence_payload":
+                self._payload += buf
+                end = self._payload.find("```", self._payload_searched)
+                if end < 0:
+                    self._payload_searched = max(0, len(self._payload) - 2)
+                    break
+                buf = self._payload[end + 3 :]
+                self._close_block(self._payload[:end])
+            else:
+                buf = self._scan_bare(buf)
+        self._line_start = line_start
+        return "".join(out)
+
+    @staticmethod
+    def _find_marker(buf: str, line_start: bool) -> tuple[int, str]:
+        fence = buf.find(FENCE_MARKER)
+        limit = fence if fence >= 0 else len(buf)
+        bare = buf.find(BARE_MARKER, 0, limit)
+        while bare >= 0:
+            if (bare == 0 and line_start) or (bare > 0 and buf[bare - 1] == "\n"):
+                return bare, BARE_MARKER
+            bare = buf.find(BARE_MARKER, bare + 1, limit)
+        return (fence, FENCE_MARKER) if fence >= 0 else (-1, "")
+
+    @staticmethod
+    def _marker_prefix_len(buf: str, line_start: bool) -> int:
+        """Length of the longest suffix of `buf` that could start a marker."""
+        window = max(0, len(buf) - len(FENCE_MARKER) + 1)
+        pos = buf.find("`", window)
+        while pos >= 0:
+            if FENCE_MARKER.startswith(buf[pos:]):
+                return len(buf) - pos
+            pos = buf.find("`", pos + 1)
+        window = max(0, len(buf) - len(BARE_MARKER) + 1)
+        if window == 0 and line_start and BARE_MARKER.startswith(buf):
+            return len(buf)
+        pos = buf.find("\n", max(0, window - 1))
+        while pos >= 0:
+            if pos + 1 < len(buf) and BARE_MARKER.startswith(buf[pos + 1 :]):
+                return len(buf) - pos - 1
+            pos = buf.find("\n", pos + 1)
+        return 0
+
+    def _scan_bare(self, buf: str) -> str:
+        if self._depth == 0:
+            start = buf.find("{")
+            if start < 0:
+                self._payload += buf
+                return ""
+            self._payload = ""
+            buf = buf[start:]
+        for i, ch in enumerate(buf):
+            if self._escape:
+                self._escape = False
+            elif self._quote:
+                if ch == "\\":
+                    self._escape = True
+                elif ch == self._quote:
+                    self._quote = ""
+            elif ch in ('"', "'"):
+                self._quote = ch
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._close_block(self._payload + buf[: i + 1])
+                    return buf[i + 1 :]
+        self._payload += buf
+        return ""
+
+    def _close_block(self, raw: str) -> None:
+        self._state = "text"
+        self._payload, self._payload_searched = "", 0
+        actions = _parse_actions(raw.strip())
+        if actions is None:
+            return
+        if self.actions is None:
+            self.actions = actions
+        self._report_actions(actions)
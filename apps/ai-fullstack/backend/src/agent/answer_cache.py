@@ -0,0 +1,145 @@
+"""Opt-in semantic cache of final answers for repeated history-free questions."""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Hashable
+
+import numpy as np
+
+from agent.embeddings import HashingEmbedder
+from agent.rag_cache import normalize_rag_query
+
+
+@dataclass
+class _Scope:
+    """Answers cached for one (role, interaction_mode) scope, as a row-aligned matrix."""
+
+    vectors: np.ndarray
+    questions: list[str] = field(default_factory=list)
+    values: list[Any] = field(default_factory=list)
+    stored_at: list[float] = field(default_factory=list)
+
+
+class SemanticAnswerCache:
+    """Thread-safe cache of final answers keyed by question embedding similarity.
+
+    A lookup embeds the normalized question and returns the best cached answer in
+    the same scope whose cosine similarity is >= threshold and whose age is < ttl.
+    Each scope keeps at most `max_entries` answers (oldest evicted first).
+    """
+
+    def __init__(self, *, max_entries: int = 512, embedder: HashingEmbedder | None = None) -> None:
+        """Create an empty cache holding at most `max_entries` answers per scope."""
+        self.max_entries = max(1, int(max_entries))
+        self._embedder = embedder or HashingEmbedder()
+        self._scopes: dict[Hashable, _Scope] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0}
+
+    def _empty_scope(self) -> _Scope:
+        return _Scope(vectors=np.zeros((0, self._embedder.dim), dtype=np.float32))
+
+    def lookup(self, scope: Hashable, question: str, *, threshold: float, ttl_seconds: float) -> tuple[Any, float] | None:
+        """Return (cached value, similarity) or None."""
+        normalized = normalize_rag_query(question)
+        if not normalized:
+            return None
+        q = self._embedder.embed(normalized)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._scopes.get(scope)
+            if entry is None or not entry.questions:
+                self._stats["misses"] += 1
+                return None
+            self._expire(entry, now, ttl_seconds)
+            if not entry.questions:
+                self._stats["misses"] += 1
+                return None
+            sims = entry.vectors @ q
+            best = int(np.argmax(sims))
+            similarity = float(sims[best])
+            if similarity < threshold:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            return entry.values[best], similarity
+
+    def store(self, scope: Hashable, question: str, value: Any) -> None:
+        """Cache `value` for `question` in `scope`, replacing the same normalized question."""
+        normalized = normalize_rag_query(question)
+        if not normalized:
+            return
+        vec = self._embedder.embed(normalized)
+        with self._lock:
+            entry = self._scopes.setdefault(scope, self._empty_scope())
+            if normalized in entry.questions:
+                idx = entry.questions.index(normalized)
+                self._remove(entry, idx)
+            entry.vectors = np.vstack([entry.vectors, vec[None, :]])
+            entry.questions.append(normalized)
+            entry.values.append(value)
+            entry.stored_at.append(time.monotonic())
+            self._stats["stores"] += 1
+            while len(entry.questions) > self.max_entries:
+                self._remove(entry, 0)
+                self._stats["evictions"] += 1
+
+    def _expire(self, entry: _Scope, now: float, ttl_seconds: float) -> None:
+        # Entries are appended in store order, so expired ones form a prefix.
+        cut = 0
+        while cut < len(entry.stored_at) and now - entry.stored_at[cut] >= ttl_seconds:
+            cut += 1
+        if cut:
+            entry.vectors = entry.vectors[cut:]
+            del entry.questions[:cut]
+            del entry.values[:cut]
+            del entry.stored_at[:cut]
+            self._stats["expired"] += cut
+
+    @staticmethod
+    def _remove(entry: _Scope, idx: int) -> None:
+        entry.vectors = np.delete(entry.vectors, idx, axis=0)
+        del entry.questions[idx]
+        del entry.values[idx]
+        del entry.stored_at[idx]
+
+    def clear(self) -> None:
+        """Drop every scope."""
+        with self._lock:
+            self._scopes.clear()
+
+    def stats(self) -> dict:
+        """Return counters plus hit ratio, scope and entry counts."""
+        with self._lock:
+            out = dict(self._stats)
+            out["scopes"] = len(self._scopes)
+            out["entries"] = sum(len(s.questions) for s in self._scopes.values())
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = (out["hits"] / lookups) if lookups else 0.0
+        return out
+
+
+_answer_cache: SemanticAnswerCache | None = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache(max_entries: int) -> SemanticAnswerCache:
+    """Return the process-wide answer cache, applying the latest entry cap."""
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache(max_entries=max_entries)
+        else:
+            _answer_cache.max_entries = max(1, int(max_entries))
+    return _answer_cache
+
+
+def answer_cache_stats() -> dict:
+    """Return cache metrics, or `{"enabled": False}` before the first cached answer lookup."""
+    cache = _answer_cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
@@ -1,14 +1,31 @@
 # mypy: disable - error - code = "no-untyped-def,misc"
+import hmac
+import os
 import pathlib
-from fastapi import FastAPI, Response
+from fastapi import Depends, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from agent.tools_and_schemas import PromptRequest, PromptResult
-from agent.prompt_generator import generate_prompt
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
+from agent.tools_and_schemas import PromptBatchRequest, PromptBatchResult, PromptRequest, PromptResult
+from agent.prompt_generator import (
+    expand_prompt_batch,
+    generate_prompt_batch,
+    prompt_batch_size,
+    render_prompt_response,
+)
+from agent.rag_cache import rag_cache_stats
+from agent.answer_cache import answer_cache_stats
+from agent.metrics import CONTENT_TYPE_LATEST, render_metrics
+from agent.usage import thread_usage
+from agent.debug_log import debug_stats
+from agent.static_files import PrecompressedStaticFiles
 
 # Define the FastAPI app
 app = FastAPI()
 
+# Prompt batch limits: reject oversized batches; stream NDJSON above the threshold.
+PROMPT_BATCH_MAX_ITEMS = 2000
+PROMPT_BATCH_STREAM_THRESHOLD = 100
+
 # CORS for local dev + production web app.
 # LangGraph SDK uses preflighted requests (e.g. POST /threads), so OPTIONS must succeed.
 app.add_middleware(
@@ -51,7 +68,8 @@ def create_frontend_router(build_dir="../frontend/dist"):
 
         return Route("/{path:path}", endpoint=dummy_frontend)
 
-    return StaticFiles(directory=build_path, html=True)
+    # Serves prebuilt .br/.gz siblings, immutable hashed assets and an in-memory index.html.
+    return PrecompressedStaticFiles(directory=build_path, html=True)
 
 
 # Mount the frontend under /app to not conflict with the LangGraph API routes
@@ -76,7 +94,93 @@ def health():
     return {"ok": True}
 
 
+def require_internal_secret(request: Request) -> None:
+    """Guard /internal/* routes with the Worker's shared `x-internal-secret`.
+
+    The routes are only served when INTERNAL_API_SECRET is set (404 otherwise), and the
+    header must match it (401 otherwise).
+    """
+    expected = (os.getenv("INTERNAL_API_SECRET") or "").strip()
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    provided = request.headers.get("x-internal-secret") or ""
+    if not hmac.compare_digest(provided.encode("utf-8"), expected.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="unauthorized")
+
+
+@app.get("/internal/rag/cache", dependencies=[Depends(require_internal_secret)])
+def rag_cache():
+    """Expose retrieval cache counters (hits, stale hits, misses, hit ratio, bytes)."""
+    return rag_cache_stats()
+
+
+@app.get("/internal/answer/cache", dependencies=[Depends(require_internal_secret)])
+def answer_cache():
+    """Expose semantic answer cache counters (hits, misses, entries, hit ratio)."""
+    return answer_cache_stats()
+
+
+@app.get("/internal/usage/threads/{thread_id}", dependencies=[Depends(require_internal_secret)])
+def usage_for_thread(thread_id: str):
+    """Return running token/latency/cost totals for one thread (since this process started)."""
+    totals = thread_usage(thread_id)
+    if totals is None:
+        raise HTTPException(status_code=404, detail="No usage recorded for this thread.")
+    return {"thread_id": thread_id, **totals}
+
+
+@app.get("/internal/debug/log", dependencies=[Depends(require_internal_secret)])
+def debug_log_stats():
+    """Debug logging pipeline counters (emitted, sampled out, dropped on a full queue)."""
+    return debug_stats()
+
+
+@app.post("/internal/config/reload", dependencies=[Depends(require_internal_secret)])
+def reload_config():
+    """Re-read environment-backed configuration on the next run (memoized otherwise)."""
+    from agent.configuration import Configuration
+
+    return {"ok": True, "env_version": Configuration.reload()}
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition of per-node and per-LLM-call latency/usage metrics."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.post("/api/prompt/generate", response_model=PromptResult)
-def api_generate_prompt(payload: PromptRequest) -> PromptResult:
-    """Generate a ready-to-use prompt (and negative prompt) for the given workflow."""
-    return generate_prompt(payload)
+async def api_generate_prompt(payload: PromptRequest) -> Response:
+    """Generate a ready-to-use prompt (and negative prompt) for the given workflow.
+
+    Generation is CPU-light and memoized, so it runs on the event loop instead of the threadpool.
+    The ETag fingerprints the result; this POST route does no conditional (304/412) handling,
+    and `no-cache` keeps shared caches from storing a per-request POST body.
+    """
+    etag, body = render_prompt_response(payload)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"},
+    )
+
+
+@app.post("/api/prompt/generate/batch", response_model=PromptBatchResult)
+def api_generate_prompt_batch(payload: PromptBatchRequest):
+    """Generate prompts for many items in one round trip.
+
+    Results keep request order and carry per-item errors. Large batches (or `stream: true`)
+    are returned as NDJSON, one `PromptBatchItem` per line, as they are generated.
+    """
+    size = prompt_batch_size(payload)
+    if size > PROMPT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {size} items (max {PROMPT_BATCH_MAX_ITEMS}).",
+        )
+    items = expand_prompt_batch(payload)
+    stream = payload.stream if payload.stream is not None else len(items) > PROMPT_BATCH_STREAM_THRESHOLD
+    if stream:
+        lines = (item.model_dump_json() + "\n" for item in generate_prompt_batch(items))
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+    return PromptBatchResult(results=list(generate_prompt_batch(items)))
@@ -0,0 +1,190 @@
+"""Local AutoRAG stand-in server for offline load tests.
+
+Mimics the Worker route `POST /internal/autorag/search` (see worker/index.ts):
+request `{ragId, query, options?}` with optional `x-internal-secret`, response
+`{ok, ragId, query, result}`. Latency, payload and error rate are configurable.
+
+Usage:
+    python -m agent.autorag_server --port 8787 --latency-ms 120 --jitter-ms 40
+    AUTORAG_ENDPOINT=http://127.0.0.1:8787/internal/autorag/search AUTORAG_ID=local ...
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SEARCH_PATH = "/internal/autorag/search"
+
+
+def synthesize_result(query: str, *, sources: int = 5, text_chars: int = 600) -> dict:
+    """Build a deterministic AutoRAG-like result for `query`."""
+    rng = random.Random(query)
+    words = [w for w in query.replace("\n", " ").split(" ") if w] or ["TapCanvas"]
+    items: list[dict] = []
+    for idx in range(1, sources + 1):
+        seed = " ".join(rng.choice(words) for _ in range(12))
+        body = (f"[doc {idx}] {seed}. " * (text_chars // max(len(seed) + 12, 1) + 1))[:text_chars]
+        items.append(
+            {
+                "title": f"KB 文档 {idx}",
+                "url": f"https://kb.example.local/docs/{rng.randrange(10_000)}-{idx}",
+                "text": body,
+                "score": round(1.0 - idx * 0.07, 3),
+            }
+        )
+    return {"response": f"（本地 AutoRAG 模拟）关于：{query[:120]}", "sources": items}
+
+
+class AutoRagStandIn:
+    """Configurable behaviour shared by all request handler threads."""
+
+    def __init__(
+        self,
+        *,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        secret: str = "",
+        payload: dict | None = None,
+        sources: int = 5,
+        text_chars: int = 600,
+    ) -> None:
+        """Store the simulated latency, error rate, secret and payload settings."""
+        self.latency_ms = max(0.0, latency_ms)
+        self.jitter_ms = max(0.0, jitter_ms)
+        self.error_rate = min(max(error_rate, 0.0), 1.0)
+        self.secret = secret
+        self.payload = payload
+        self.sources = sources
+        self.text_chars = text_chars
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def result_for(self, query: str) -> dict:
+        """Return the fixed payload, or a synthesized result for `query`."""
+        if isinstance(self.payload, dict):
+            return self.payload
+        return synthesize_result(query, sources=self.sources, text_chars=self.text_chars)
+
+    def delay(self) -> None:
+        """Sleep for the configured latency plus jitter."""
+        delay_ms = self.latency_ms
+        if self.jitter_ms:
+            delay_ms += random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+
+
+def _make_handler(standin: AutoRagStandIn) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 keeps connections alive so pooled clients are exercised realistically.
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; avoid Nagle/delayed-ACK stalls.
+        disable_nagle_algorithm = True
+
+        def log_message(self, format: str, *args) -> None:  # noqa: A002
+            return
+
+        def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+            self.send_response(status)
+            self.send_header("content-type", content_type)
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self) -> None:  # noqa: N802
+            length = int(self.headers.get("content-length") or 0)
+            raw = self.rfile.read(length) if length > 0 else b""
+            if self.path.split("?", 1)[0] != SEARCH_PATH:
+                self._send(404, b"not found", "text/plain")
+                return
+            with standin._lock:
+                standin.requests += 1
+            if standin.secret and self.headers.get("x-internal-secret", "") != standin.secret:
+                self._send(401, b"unauthorized", "text/plain")
+                return
+            try:
+                payload = json.loads(raw.decode("utf-8") or "null")
+            except Exception:
+                self._send(400, b"invalid json body", "text/plain")
+                return
+            fields = payload if isinstance(payload, dict) else {}
+            rag_id, query = fields.get("ragId"), fields.get("query")
+            rag_id = rag_id.strip() if isinstance(rag_id, str) else ""
+            query = query.strip() if isinstance(query, str) else ""
+            if not rag_id or not query:
+                self._send(400, json.dumps({"error": "ragId and query must be non-empty strings"}).encode("utf-8"))
+                return
+            standin.delay()
+            if standin.error_rate and random.random() < standin.error_rate:
+                self._send(502, b"simulated upstream error", "text/plain")
+                return
+            body = {"ok": True, "ragId": rag_id, "query": query, "result": standin.result_for(query)}
+            self._send(200, json.dumps(body, ensure_ascii=False).encode("utf-8"))
+
+        def do_GET(self) -> None:  # noqa: N802
+            if self.path == "/health":
+                self._send(200, json.dumps({"ok": True, "requests": standin.requests}).encode("utf-8"))
+                return
+            self._send(405, b"method not allowed", "text/plain")
+
+    return Handler
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8787, **options) -> ThreadingHTTPServer:
+    """Create (but do not start) a stand-in server; port 0 picks a free port."""
+    standin = AutoRagStandIn(**options)
+    server = ThreadingHTTPServer((host, port), _make_handler(standin))
+    server.daemon_threads = True
+    server.standin = standin  # type: ignore[attr-defined]
+    return server
+
+
+def main() -> None:
+    """Run the stand-in server until interrupted."""
+    parser = argparse.ArgumentParser(description="Local AutoRAG stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Base response latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 502")
+    parser.add_argument("--secret", default="", help="Require this x-internal-secret header")
+    parser.add_argument("--payload", default="", help="JSON file used verbatim as `result` for every query")
+    parser.add_argument("--sources", type=int, default=5, help="Synthesized sources per query")
+    parser.add_argument("--text-chars", type=int, default=600, help="Synthesized characters per source")
+    args = parser.parse_args()
+
+    payload = None
+    if args.payload:
+        with open(args.payload, encoding="utf-8") as fh:
+            payload = json.load(fh)
+
+    server = make_server(
+        args.host,
+        args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        secret=args.secret,
+        payload=payload,
+        sources=args.sources,
+        text_chars=args.text_chars,
+    )
+    sys.stdout.write(f"AutoRAG stand-in listening on http://{args.host}:{server.server_port}{SEARCH_PATH}\n")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
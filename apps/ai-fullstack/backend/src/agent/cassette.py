@@ -0,0 +1,449 @@
+"""Record/replay cassettes for OpenAI, Gemini and AutoRAG traffic.
+
+Recording captures each request, its timing and the full response (every stream event
+with its offset from the request start) as one JSON line. Replay serves those lines
+back in place of the network: the exact request (by content hash) is matched first,
+otherwise the next unplayed interaction of the same kind, so traces still replay when
+prompts drift (e.g. the current date). Delays are reproduced at CASSETTE_SPEED
+(1 = original timing, 10 = ten times faster, 0 = no delays).
+
+Environment:
+  CASSETTE_MODE   off | record | replay
+  CASSETTE_PATH   cassette file; `.zst` (needs `zstandard`), `.gz` or plain JSONL.
+                  `{pid}` is replaced by the process id (one file per worker when recording).
+  CASSETTE_SPEED  replay speed factor (default 1)
+  CASSETTE_LOOP   1 = start over when a kind runs out during replay (benchmarks)
+"""
+
+from __future__ import annotations
+
+import atexit
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Iterator
+
+try:  # optional: zstd-compressed cassettes
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore[assignment]
+
+CASSETTE_VERSION = 1
+KIND_RESPONSES = "openai.responses"
+KIND_CHAT = "openai.chat"
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recorded interaction for a request."""
+
+
+class Recorded:
+    """Read-only attribute view over recorded JSON (stands in for SDK response objects)."""
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: dict) -> None:
+        """Wrap one recorded JSON object."""
+        self._data = data
+
+    def __getattr__(self, name: str) -> Any:
+        """Return the field as an attribute (wrapped), or None when it was not recorded."""
+        try:
+            return _wrap(self._data[name])
+        except KeyError:
+            return None
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """Return the field (wrapped), or `default`."""
+        return _wrap(self._data.get(name, default))
+
+    def model_dump(self, **_: Any) -> dict:
+        """Return the underlying JSON, mirroring pydantic's `model_dump`."""
+        return self._data
+
+    def __repr__(self) -> str:
+        """Show the wrapped JSON."""
+        return f"Recorded({self._data!r})"
+
+
+def _wrap(value: Any) -> Any:
+    if isinstance(value, dict):
+        return Recorded(value)
+    if isinstance(value, list):
+        return [_wrap(v) for v in value]
+    return value
+
+
+def dump(obj: Any) -> Any:
+    """JSON-safe form of SDK/pydantic/langchain objects."""
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if isinstance(obj, Recorded):
+        return obj.model_dump()
+    if hasattr(obj, "model_dump"):
+        try:
+            return obj.model_dump(mode="json")
+        except TypeError:
+            return obj.model_dump()
+    if isinstance(obj, dict):
+        return {str(k): dump(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [dump(v) for v in obj]
+    return str(obj)
+
+
+def request_key(kind: str, request: Any) -> str:
+    """Return a stable hash of a request, used to match it on replay."""
+    raw = json.dumps([kind, dump(request)], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _open_write(path: str):
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Writing .zst cassettes requires the `zstandard` package.")
+        raw = open(path, "ab")
+        writer = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(writer, encoding="utf-8", write_through=True)
+    if path.endswith(".gz"):
+        return gzip.open(path, "at", encoding="utf-8")
+    return open(path, "a", encoding="utf-8")
+
+
+def _read_lines(path: str) -> Iterator[dict]:
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Reading .zst cassettes requires the `zstandard` package.")
+        with open(path, "rb") as raw:
+            reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+            text = io.TextIOWrapper(reader, encoding="utf-8")
+            lines = list(text)
+    elif path.endswith(".gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            lines = list(fh)
+    else:
+        with open(path, encoding="utf-8") as fh:
+            lines = list(fh)
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # A crash while recording can leave a truncated last line.
+            continue
+
+
+class Cassette:
+    """JSONL recording of model interactions, written in record mode and consumed in replay mode."""
+
+    def __init__(self, path: str, mode: str, speed: float = 1.0, loop: bool = False) -> None:
+        """Open `path` for "record" or "replay"; `{pid}` in the path expands to the process id."""
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode!r}")
+        self.path = path.replace("{pid}", str(os.getpid()))
+        self.mode = mode
+        self.speed = max(0.0, float(speed))
+        self.loop = loop
+        self._lock = threading.Lock()
+        self._writer = None
+        self._by_key: dict[tuple[str, str], deque[int]] = defaultdict(deque)
+        self._by_kind: dict[str, deque[int]] = defaultdict(deque)
+        self._entries: list[dict] = []
+        self._played: set[int] = set()
+        self._stats = {"recorded": 0, "replayed": 0, "exact": 0, "misses": 0}
+        if mode == "replay":
+            for entry in _read_lines(self.path):
+                kind = entry.get("kind")
+                if not kind or kind == "meta":
+                    continue
+                idx = len(self._entries)
+                self._entries.append(entry)
+                self._by_key[(kind, str(entry.get("key") or ""))].append(idx)
+                self._by_kind[kind].append(idx)
+
+    @property
+    def replaying(self) -> bool:
+        """Return whether this cassette replays recorded interactions."""
+        return self.mode == "replay"
+
+    # recording -------------------------------------------------------------
+
+    def record(self, entry: dict) -> None:
+        """Append one interaction, writing the meta header on first use."""
+        line = json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._writer is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._writer = _open_write(self.path)
+                self._writer.write(json.dumps({"kind": "meta", "version": CASSETTE_VERSION, "created": time.time()}) + "\n")
+            self._writer.write(line)
+            self._writer.flush()
+            self._stats["recorded"] += 1
+
+    def close(self) -> None:
+        """Flush and close the recording file, if open."""
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    # replay ----------------------------------------------------------------
+
+    def _pop(self, queue: deque[int]) -> int | None:
+        while queue:
+            idx = queue.popleft()
+            if idx not in self._played:
+                return idx
+        return None
+
+    def take(self, kind: str, key: str) -> dict:
+        """Return the next unplayed entry for `key`, else the next of `kind`; raise CassetteMiss."""
+        with self._lock:
+            idx = self._pop(self._by_key.get((kind, key)) or deque())
+            if idx is not None:
+                self._stats["exact"] += 1
+            else:
+                idx = self._pop(self._by_kind.get(kind) or deque())
+            if idx is None and self.loop and self._rewind(kind):
+                idx = self._pop(self._by_kind[kind])
+            if idx is None:
+                self._stats["misses"] += 1
+                raise CassetteMiss(f"No recorded {kind} interaction left in {self.path}.")
+            self._played.add(idx)
+            self._stats["replayed"] += 1
+            return self._entries[idx]
+
+    def _rewind(self, kind: str) -> bool:
+        order = [i for i, entry in enumerate(self._entries) if entry.get("kind") == kind]
+        if not order:
+            return False
+        self._played.difference_update(order)
+        self._by_kind[kind] = deque(order)
+        for i in order:
+            self._by_key[(kind, str(self._entries[i].get("key") or ""))].append(i)
+        return True
+
+    def wait_until(self, started: float, offset: float) -> None:
+        """Sleep until `offset` recorded seconds (scaled by speed) after `started`."""
+        if self.speed <= 0 or offset <= 0:
+            return
+        remaining = started + offset / self.speed - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def stats(self) -> dict[str, Any]:
+        """Return recorded/replayed/exact/miss counters."""
+        with self._lock:
+            return {"path": self.path, "mode": self.mode, "speed": self.speed, "entries": len(self._entries), **self._stats}
+
+
+_active: Cassette | None = None
+
+
+def use_cassette(path: str | None, mode: str = "replay", speed: float = 1.0, loop: bool = False) -> Cassette | None:
+    """Activate (or with path=None, deactivate) the process-wide cassette."""
+    global _active
+    if _active is not None:
+        _active.close()
+    _active = Cassette(path, mode, speed, loop) if path else None
+    return _active
+
+
+def active_cassette() -> Cassette | None:
+    """Return the process-wide cassette, if one is active."""
+    return _active
+
+
+def replaying() -> bool:
+    """Return whether model calls are currently served from a cassette."""
+    return _active is not None and _active.replaying
+
+
+def _configure_from_env() -> None:
+    mode = (os.getenv("CASSETTE_MODE") or "off").strip().lower()
+    path = (os.getenv("CASSETTE_PATH") or "").strip()
+    if mode in ("record", "replay") and path:
+        try:
+            speed = float(os.getenv("CASSETTE_SPEED") or 1.0)
+        except ValueError:
+            speed = 1.0
+        use_cassette(path, mode, speed, loop=os.getenv("CASSETTE_LOOP") == "1")
+
+
+atexit.register(lambda: _active.close() if _active is not None else None)
+
+
+# --------------------------------------------------------------------------- generic calls
+
+
+def record_or_replay(
+    kind: str,
+    request: dict,
+    fn: Callable[[], Any],
+    *,
+    encode: Callable[[Any], Any] = dump,
+    decode: Callable[[Any], Any] = _wrap,
+) -> Any:
+    """Run `fn()` through the active cassette (a plain call when none is active)."""
+    cassette = _active
+    if cassette is None:
+        return fn()
+    key = request_key(kind, request)
+    if cassette.replaying:
+        started = time.perf_counter()
+        entry = cassette.take(kind, key)
+        cassette.wait_until(started, float(entry.get("latency") or 0.0))
+        if entry.get("error"):
+            raise RuntimeError(f"[cassette] {entry['error'].get('type')}: {entry['error'].get('message')}")
+        return decode(entry.get("response"))
+    started = time.perf_counter()
+    entry: dict[str, Any] = {"kind": kind, "key": key, "request": dump(request), "at": time.time()}
+    try:
+        result = fn()
+    except Exception as exc:
+        entry.update(latency=time.perf_counter() - started, error={"type": exc.__class__.__name__, "message": str(exc)})
+        cassette.record(entry)
+        raise
+    entry.update(latency=time.perf_counter() - started, response=encode(result))
+    cassette.record(entry)
+    return result
+
+
+# --------------------------------------------------------------------------- OpenAI client
+
+
+def _openai_error(error: dict) -> Exception:
+    from openai import OpenAIError
+
+    return OpenAIError(f"[cassette] {error.get('type')}: {error.get('message')}")
+
+
+class _RecordingStream:
+    """Pass stream events through while capturing them with their offsets."""
+
+    def __init__(self, cassette: Cassette, entry: dict, stream: Any, started: float) -> None:
+        self._cassette = cassette
+        self._entry = entry
+        self._stream = stream
+        self._started = started
+        self._events: list[list[Any]] = []
+        self._done = False
+
+    def __iter__(self) -> Iterator[Any]:
+        try:
+            for event in self._stream:
+                self._events.append([round(time.perf_counter() - self._started, 6), dump(event)])
+                yield event
+        except Exception as exc:
+            self._entry["stream_error"] = {"type": exc.__class__.__name__, "message": str(exc)}
+            raise
+        finally:
+            self._finish()
+
+    def _finish(self) -> None:
+        if self._done:
+            return
+        self._done = True
+        self._entry.update(latency=time.perf_counter() - self._started, events=self._events)
+        self._cassette.record(self._entry)
+
+    def close(self) -> None:
+        try:
+            close = getattr(self._stream, "close", None)
+            if callable(close):
+                close()
+        finally:
+            self._finish()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+
+def _replay_stream(cassette: Cassette, entry: dict, started: float) -> Iterator[Any]:
+    for offset, event in entry.get("events") or []:
+        cassette.wait_until(started, float(offset))
+        yield _wrap(event)
+    if entry.get("stream_error"):
+        raise _openai_error(entry["stream_error"])
+
+
+class _CassetteEndpoint:
+    def __init__(self, cassette: Cassette, kind: str, create: Callable[..., Any] | None) -> None:
+        self._cassette = cassette
+        self._kind = kind
+        self._create = create
+
+    def create(self, **kwargs: Any) -> Any:
+        cassette = self._cassette
+        key = request_key(self._kind, kwargs)
+        started = time.perf_counter()
+        if cassette.replaying:
+            entry = cassette.take(self._kind, key)
+            if entry.get("error"):
+                cassette.wait_until(started, float(entry.get("latency") or 0.0))
+                raise _openai_error(entry["error"])
+            if "events" in entry:
+                return _replay_stream(cassette, entry, started)
+            cassette.wait_until(started, float(entry.get("latency") or 0.0))
+            return _wrap(entry.get("response"))
+        entry: dict[str, Any] = {"kind": self._kind, "key": key, "request": dump(kwargs), "at": time.time()}
+        try:
+            result = self._create(**kwargs)  # type: ignore[misc]
+        except Exception as exc:
+            entry.update(latency=time.perf_counter() - started, error={"type": exc.__class__.__name__, "message": str(exc)})
+            cassette.record(entry)
+            raise
+        if kwargs.get("stream"):
+            return _RecordingStream(cassette, entry, result, started)
+        entry.update(latency=time.perf_counter() - started, response=dump(result))
+        cassette.record(entry)
+        return result
+
+
+class _Namespace:
+    def __init__(self, **attrs: Any) -> None:
+        self.__dict__.update(attrs)
+
+
+class CassetteOpenAIClient:
+    """OpenAI client stand-in: `responses.create` / `chat.completions.create` go through the cassette."""
+
+    def __init__(self, cassette: Cassette, client: Any | None) -> None:
+        """Route calls through `cassette`; `client` is None while replaying."""
+        self._client = client
+        self.responses = _Namespace(
+            create=_CassetteEndpoint(cassette, KIND_RESPONSES, client.responses.create if client else None).create
+        )
+        self.chat = _Namespace(
+            completions=_Namespace(
+                create=_CassetteEndpoint(cassette, KIND_CHAT, client.chat.completions.create if client else None).create
+            )
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        """Delegate everything else to the real client (unavailable while replaying)."""
+        if self._client is None:
+            raise AttributeError(f"{name!r} is not available while replaying a cassette.")
+        return getattr(self._client, name)
+
+
+def wrap_openai_client(factory: Callable[[], Any]) -> Any:
+    """Return `factory()`, routed through the active cassette; replay never builds a real client."""
+    cassette = _active
+    if cassette is None:
+        return factory()
+    if cassette.replaying:
+        return CassetteOpenAIClient(cassette, None)
+    return CassetteOpenAIClient(cassette, factory())
+
+
+_configure_from_env()
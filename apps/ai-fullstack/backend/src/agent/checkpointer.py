@@ -0,0 +1,478 @@
+"""Durable local checkpointer: SQLite (WAL) with msgpack + zstd serialization.
+
+The container runs `langgraph_api.cli --runtime-edition inmem`, whose built-in saver keeps
+thread state in process memory. That runtime does not accept a custom checkpointer, so
+this saver is for standalone runs of the graph (scripts, workers, a self-hosted server):
+
+    from agent.checkpointer import durable_graph
+
+    graph = durable_graph("/data/checkpoints.sqlite", ttl_seconds=7 * 86400)
+    graph.invoke(state, {"configurable": {"thread_id": "..."}})
+
+Layout follows InMemorySaver: checkpoints hold the channel versions, channel values are
+stored once per (channel, version) in `blobs`, and pending writes live in `writes`. Values
+are encoded by JsonPlusSerializer (msgpack) and payloads above `min_size` bytes are
+zstd-compressed (type tag suffix "+zstd"); without `zstandard` installed they are stored
+uncompressed and still readable.
+
+Threads idle for longer than `ttl_seconds` are deleted by `gc()`, which also runs
+opportunistically from `put` at most once per `gc_interval_seconds`.
+
+Environment (used by `checkpointer_from_env`):
+  CHECKPOINT_DB_PATH       SQLite file (unset: no durable checkpointer)
+  CHECKPOINT_TTL_SECONDS   idle-thread TTL (default 0 = keep forever)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator, Sequence
+from pathlib import Path
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+try:  # optional: compressed payloads
+    import zstandard
+except ImportError:  # pragma: no cover - exercised only without the extra
+    zstandard = None  # type: ignore[assignment]
+
+_ZSTD_SUFFIX = "+zstd"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    blob BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_updated_at ON threads (updated_at);
+"""
+
+
+class CompressedSerializer(SerializerProtocol):
+    """msgpack (JsonPlusSerializer) with zstd compression for payloads >= `min_size` bytes."""
+
+    def __init__(self, inner: SerializerProtocol | None = None, *, level: int = 3, min_size: int = 512) -> None:
+        """Wrap `inner` (default JsonPlusSerializer); compress payloads of at least `min_size` bytes at zstd `level`."""
+        self.inner = inner or JsonPlusSerializer()
+        self.level = level
+        self.min_size = min_size
+        # zstd (de)compressor objects must not be shared across threads.
+        self._local = threading.local()
+
+    def _compressor(self) -> Any:
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = zstandard.ZstdCompressor(level=self.level)
+        return compressor
+
+    def _decompressor(self) -> Any:
+        decompressor = getattr(self._local, "decompressor", None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = zstandard.ZstdDecompressor()
+        return decompressor
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        """Serialize `obj`, compressing large payloads (the type gets a zstd suffix)."""
+        type_, data = self.inner.dumps_typed(obj)
+        if zstandard is None or len(data) < self.min_size:
+            return type_, data
+        return type_ + _ZSTD_SUFFIX, self._compressor().compress(data)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        """Deserialize, decompressing zstd-suffixed payloads first."""
+        type_, payload = data
+        if type_.endswith(_ZSTD_SUFFIX):
+            if zstandard is None:
+                raise RuntimeError("Reading compressed checkpoints requires the `zstandard` package.")
+            type_, payload = type_[: -len(_ZSTD_SUFFIX)], self._decompressor().decompress(payload)
+        return self.inner.loads_typed((type_, payload))
+
+
+class SqliteSaver(BaseCheckpointSaver[str]):
+    """Checkpoint saver backed by one SQLite file in WAL mode."""
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        *,
+        serde: SerializerProtocol | None = None,
+        ttl_seconds: float = 0,
+        gc_interval_seconds: float = 300,
+    ) -> None:
+        """Open (or create) the database at `path`; threads idle past `ttl_seconds` are collected (0 disables)."""
+        super().__init__(serde=serde or CompressedSerializer())
+        self.path = str(path)
+        self.ttl_seconds = max(0.0, float(ttl_seconds or 0))
+        self.gc_interval_seconds = max(0.0, float(gc_interval_seconds or 0))
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: durable across process crashes; only an OS crash can lose the last commits.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(_SCHEMA)
+        self._last_gc = time.time()
+
+    def close(self) -> None:
+        """Close the SQLite connection."""
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------ helpers
+
+    def _load_blobs(self, cur: sqlite3.Cursor, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> dict[str, Any]:
+        channel_values: dict[str, Any] = {}
+        for channel, version in versions.items():
+            row = cur.execute(
+                "SELECT type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row and row[0] != "empty":
+                channel_values[channel] = self.serde.loads_typed((row[0], row[1]))
+        return channel_values
+
+    def _tuple_from_row(self, cur: sqlite3.Cursor, row: tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, checkpoint_b, metadata_type, metadata_b = row
+        checkpoint: Checkpoint = self.serde.loads_typed((type_, checkpoint_b))
+        writes = cur.execute(
+            "SELECT task_id, channel, type, blob FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_blobs(cur, thread_id, checkpoint_ns, checkpoint["channel_versions"]),
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata_b)),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, b))) for task_id, channel, t, b in writes],
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id
+                else None
+            ),
+        )
+
+    def _touch(self, cur: sqlite3.Cursor, thread_id: str, now: float) -> None:
+        cur.execute(
+            "INSERT INTO threads (thread_id, updated_at) VALUES (?, ?)"
+            " ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+            (thread_id, now),
+        )
+
+    def _delete_threads(self, cur: sqlite3.Cursor, thread_ids: Sequence[str]) -> None:
+        for table in ("checkpoints", "blobs", "writes", "threads"):
+            cur.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in thread_ids])
+
+    # --------------------------------------------------------------- sync API
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        """Return the checkpoint for `config` (the latest one without a checkpoint_id), or None."""
+        configurable = config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        columns = "thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            cur = self._conn.cursor()
+            if checkpoint_id := get_checkpoint_id(config):
+                row = cur.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = cur.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._tuple_from_row(cur, row) if row else None
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        """Yield checkpoints (newest first per thread) filtered by config, metadata, `before` and `limit`."""
+        clauses: list[str] = []
+        params: list[Any] = []
+        configurable = (config or {}).get("configurable") or {}
+        if configurable.get("thread_id") is not None:
+            clauses.append("thread_id = ?")
+            params.append(str(configurable["thread_id"]))
+        if configurable.get("checkpoint_ns") is not None:
+            clauses.append("checkpoint_ns = ?")
+            params.append(configurable["checkpoint_ns"])
+        if config and (checkpoint_id := get_checkpoint_id(config)):
+            clauses.append("checkpoint_id = ?")
+            params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+            f" FROM checkpoints{where} ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC"
+        )
+        with self._lock:
+            cur = self._conn.cursor()
+            rows = cur.execute(query, params).fetchall()
+            results: list[CheckpointTuple] = []
+            for row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                if filter:
+                    metadata = self.serde.loads_typed((row[6], row[7]))
+                    if not all(metadata.get(k) == v for k, v in filter.items()):
+                        continue
+                results.append(self._tuple_from_row(cur, row))
+        yield from results
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Store a checkpoint and the channel blobs in `new_versions` in one transaction."""
+        configurable = config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        values: dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+        # Serialize outside the lock; only the SQLite transaction is serialized.
+        blob_rows = []
+        for channel, version in new_versions.items():
+            type_, blob = self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")
+            blob_rows.append((thread_id, checkpoint_ns, channel, str(version), type_, blob))
+        type_, checkpoint_b = self.serde.dumps_typed(c)
+        metadata_type, metadata_b = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        now = time.time()
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blob_rows)
+                cur.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        configurable.get("checkpoint_id"),
+                        type_,
+                        checkpoint_b,
+                        metadata_type,
+                        metadata_b,
+                    ),
+                )
+                self._touch(cur, thread_id, now)
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+        self._maybe_gc(now)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Store a task's pending writes for the checkpoint in `config`."""
+        configurable = config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        checkpoint_id = configurable["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel, type_, blob, task_path))
+        # Special channels (errors, interrupts, ...) overwrite; regular writes are idempotent.
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete every checkpoint, blob and write of a thread."""
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete_threads(cur, [str(thread_id)])
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+
+    def gc(self, now: float | None = None) -> int:
+        """Delete threads idle for longer than ttl_seconds; return how many were removed."""
+        if self.ttl_seconds <= 0:
+            return 0
+        now = time.time() if now is None else now
+        with self._lock:
+            self._last_gc = now
+            cur = self._conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                expired = [r[0] for r in cur.execute("SELECT thread_id FROM threads WHERE updated_at < ?", (now - self.ttl_seconds,))]
+                if expired:
+                    self._delete_threads(cur, expired)
+                cur.execute("COMMIT")
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+        return len(expired)
+
+    def _maybe_gc(self, now: float) -> None:
+        if self.ttl_seconds <= 0 or now - self._last_gc < self.gc_interval_seconds:
+            return
+        try:
+            self.gc(now)
+        except sqlite3.Error:
+            # best-effort; the next interval retries
+            pass
+
+    def get_next_version(self, current: str | None, channel: None) -> str:
+        """Return the next channel version (monotonic counter plus a random suffix)."""
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # -------------------------------------------------------------- async API
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        """Async `get_tuple`, run in a worker thread."""
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Async `list`, run in a worker thread."""
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Async `put`, run in a worker thread."""
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Async `put_writes`, run in a worker thread."""
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Async `delete_thread`, run in a worker thread."""
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def checkpointer_from_env() -> SqliteSaver | None:
+    """SqliteSaver configured from CHECKPOINT_DB_PATH / CHECKPOINT_TTL_SECONDS, or None."""
+    path = (os.getenv("CHECKPOINT_DB_PATH") or "").strip()
+    if not path:
+        return None
+    try:
+        ttl = float(os.getenv("CHECKPOINT_TTL_SECONDS") or 0)
+    except ValueError:
+        ttl = 0.0
+    return SqliteSaver(path, ttl_seconds=ttl)
+
+
+def durable_graph(path: str | os.PathLike[str] | None = None, *, ttl_seconds: float | None = None):
+    """Compile the agent graph with a SqliteSaver (path defaults to CHECKPOINT_DB_PATH)."""
+    from agent.graph import builder
+
+    if path is None:
+        saver = checkpointer_from_env()
+        if saver is None:
+            raise ValueError("CHECKPOINT_DB_PATH is not set; pass a path to durable_graph().")
+        if ttl_seconds is not None:
+            saver.ttl_seconds = max(0.0, float(ttl_seconds))
+    else:
+        saver = SqliteSaver(path, ttl_seconds=ttl_seconds or 0)
+    return builder.compile(checkpointer=saver, name="animation-agent")
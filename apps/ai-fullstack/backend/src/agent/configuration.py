@@ -1,13 +1,26 @@
 import os
-from pydantic import BaseModel, Field
-from typing import Any, Optional
+import threading
+from collections import OrderedDict
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Any, Hashable, Optional
 
 from langchain_core.runnables import RunnableConfig
 
+# Resolved configurations keyed by (env version, configurable field values). Every node
+# of a run resolves the same key, so a run validates once and shares one frozen object.
+_RESOLVED_MAX_ENTRIES = 256
+_resolved: "OrderedDict[Hashable, Configuration]" = OrderedDict()
+_resolved_lock = threading.Lock()
+# Environment values the resolution depends on, captured once per version; see reload().
+_env_version = 0
+_env_snapshot: dict[str, str] | None = None
+
 
 class Configuration(BaseModel):
     """The configuration for the agent."""
 
+    model_config = ConfigDict(frozen=True)
+
     query_generator_model: str = Field(
         default="gemini-2.0-flash",
         metadata={
@@ -66,10 +79,27 @@ class Configuration(BaseModel):
     search_provider: str = Field(
         default="disabled",
         metadata={
-            "description": "Knowledge/search provider to use. Options: 'google', 'openai', 'autorag', or 'disabled'."
+            "description": "Knowledge/search provider to use. Options: 'google', 'openai', 'autorag', 'local', or 'disabled'."
+        },
+    )
+
+    local_index_path: str = Field(
+        default="",
+        metadata={
+            "description": "Directory of a prebuilt local vector index (python -m agent.local_index build), used when search_provider='local'.",
         },
     )
 
+    local_index_top_k: int = Field(
+        default=8,
+        metadata={"description": "Number of chunks returned by the local index per query."},
+    )
+
+    local_index_nprobe: int = Field(
+        default=4,
+        metadata={"description": "IVF lists probed per query (ignored for brute-force indexes)."},
+    )
+
     search_model: str = Field(
         default="gemini-2.0-flash",
         metadata={"description": "Model to use for the search step (Gemini or GPT depending on provider)."},
@@ -94,22 +124,174 @@ class Configuration(BaseModel):
         metadata={"description": "Cloudflare AutoRAG deployment id (passed to env.AI.autorag(id))."},
     )
 
+    autorag_connect_timeout_seconds: float = Field(
+        default=5.0,
+        metadata={"description": "Connect timeout (seconds) for AutoRAG proxy calls over the pooled HTTP client."},
+    )
+
+    autorag_read_timeout_seconds: float = Field(
+        default=20.0,
+        metadata={"description": "Read timeout (seconds) for AutoRAG proxy calls."},
+    )
+
+    autorag_max_response_bytes: int = Field(
+        default=2_000_000,
+        metadata={"description": "Reject AutoRAG responses larger than this many bytes (0 disables the limit)."},
+    )
+
+    rag_query_variants: int = Field(
+        default=3,
+        metadata={"description": "Number of retrieval query variants fanned out concurrently and merged with reciprocal-rank fusion (1 disables fan-out)."},
+    )
+
+    rag_retrieval_workers: int = Field(
+        default=8,
+        metadata={"description": "Size of the process-wide thread pool that runs retrieval query variants concurrently."},
+    )
+
+    rag_snippet_token_budget: int = Field(
+        default=1500,
+        metadata={"description": "Approximate token budget for retrieved snippets sent to the answer model (0 disables selection)."},
+    )
+
+    rag_mmr_lambda: float = Field(
+        default=0.7,
+        metadata={"description": "MMR trade-off between query relevance (1.0) and diversity (0.0) when selecting snippets."},
+    )
+
+    rag_dedup_threshold: float = Field(
+        default=0.9,
+        metadata={"description": "Cosine similarity at or above which a snippet counts as a near-duplicate and is dropped."},
+    )
+
+    rag_cache_ttl_seconds: float = Field(
+        default=300.0,
+        metadata={"description": "Seconds a cached retrieval result is served as fresh."},
+    )
+
+    rag_cache_stale_seconds: float = Field(
+        default=1800.0,
+        metadata={"description": "Extra seconds a cached result may be served stale while it refreshes in the background."},
+    )
+
+    rag_cache_max_bytes: int = Field(
+        default=8_000_000,
+        metadata={"description": "Total byte budget for the retrieval cache (0 disables caching)."},
+    )
+
+    sanitizer_rules_path: str = Field(
+        default="",
+        metadata={"description": "Optional JSON file with sanitizer rule tables ({\"sexual\": {term: replacement}, \"violent\": {...}}) merged over the built-in PG-13 rules."},
+    )
+
+    memory_trim_max_messages: int = Field(
+        default=0,
+        metadata={"description": "When > 0, summarize once the thread holds more messages than this and remove the folded messages from the checkpoint (keeping the last 16 and the latest style-lock message). Values below 24 act as 24 so a trim is not repeated every turn. 0 keeps the full history."},
+    )
+
+    memory_archive_dir: str = Field(
+        default="",
+        metadata={"description": "Optional directory where trimmed messages are appended to <thread_id>.jsonl before removal."},
+    )
+
+    openai_prompt_cache_key: bool = Field(
+        default=False,
+        metadata={"description": "Send a prompt_cache_key derived from the content hash of the static tool/schema assets on OpenAI Responses calls (disable for proxies that reject unknown fields)."},
+    )
+
+    profile_run: bool = Field(
+        default=False,
+        metadata={"description": "Sample this run's node stacks and write folded stacks plus a top-N summary under profile_dir/<thread_id>/<run_id>/ (also enabled by the x-tapcanvas-profile header)."},
+    )
+
+    profile_dir: str = Field(
+        default=".profiles",
+        metadata={"description": "Directory for on-demand run profiles."},
+    )
+
+    answer_cache_enabled: bool = Field(
+        default=False,
+        metadata={"description": "Reuse final answers for semantically repeated questions (first chat-only turns of a thread without history, summary, tools, RAG or canvas references; shared across threads)."},
+    )
+
+    answer_cache_threshold: float = Field(
+        default=0.92,
+        metadata={"description": "Minimum cosine similarity between normalized questions for an answer cache hit."},
+    )
+
+    answer_cache_ttl_seconds: float = Field(
+        default=3600.0,
+        metadata={"description": "Seconds a cached answer stays valid."},
+    )
+
+    answer_cache_max_entries: int = Field(
+        default=512,
+        metadata={"description": "Maximum cached answers per (role, interaction_mode) scope."},
+    )
+
+    @classmethod
+    def reload(cls) -> int:
+        """Re-read the environment on the next resolution and drop memoized configs."""
+        global _env_version, _env_snapshot
+        with _resolved_lock:
+            _env_version += 1
+            _env_snapshot = None
+            _resolved.clear()
+            return _env_version
+
+    @classmethod
+    def _env(cls) -> tuple[int, dict[str, str]]:
+        global _env_snapshot
+        with _resolved_lock:
+            if _env_snapshot is None:
+                names = [name.upper() for name in cls.model_fields] + ["OPENAI_API_KEY"]
+                _env_snapshot = {name: os.environ[name] for name in names if name in os.environ}
+            return _env_version, _env_snapshot
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
     ) -> "Configuration":
-        """Create a Configuration instance from a RunnableConfig."""
+        """Create a Configuration instance from a RunnableConfig.
+
+        Results are memoized per configurable field values and environment version, so
+        repeated calls within a run return the same frozen instance. Environment changes
+        are only picked up after Configuration.reload().
+        """
         configurable = (
             config["configurable"] if config and "configurable" in config else {}
         )
+        version, env = cls._env()
+        key: Hashable = (
+            version,
+            tuple((name, value) for name in cls.model_fields if (value := configurable.get(name)) is not None),
+        )
+        try:
+            hash(key)
+        except TypeError:
+            key = (version, repr(key[1]))
+        with _resolved_lock:
+            resolved = _resolved.get(key)
+            if resolved is not None:
+                _resolved.move_to_end(key)
+                return resolved
+        resolved = cls._resolve(configurable, env)
+        with _resolved_lock:
+            resolved = _resolved.setdefault(key, resolved)
+            _resolved.move_to_end(key)
+            while len(_resolved) > _RESOLVED_MAX_ENTRIES:
+                _resolved.popitem(last=False)
+        return resolved
 
+    @classmethod
+    def _resolve(cls, configurable: dict[str, Any], env: dict[str, str]) -> "Configuration":
         def _default(field: str) -> Any:
             return cls.model_fields[field].default
 
         # Get raw values from environment or config
         raw_values: dict[str, Any] = {}
         for name in cls.model_fields.keys():
-            env_val = os.environ.get(name.upper())
+            env_val = env.get(name.upper())
             cfg_val = configurable.get(name)
             raw_values[name] = env_val if env_val is not None else cfg_val
 
@@ -119,8 +301,7 @@ class Configuration(BaseModel):
         llm_provider = values.get("llm_provider", _default("llm_provider"))
         llm_provider = str(llm_provider).lower().strip()
         if llm_provider == "auto":
-            llm_provider = "openai" if os.environ.get("OPENAI_API_KEY") else "gemini"
-
+            llm_provider = "openai" if env.get("OPENAI_API_KEY") else "gemini"
         # If using OpenAI provider and models are missing/invalid, default to gpt-5.2
         if llm_provider == "openai":
             for field in (
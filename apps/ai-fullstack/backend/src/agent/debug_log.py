@@ -0,0 +1,248 @@
+"""Non-blocking, sampled diagnostics for model/RAG calls.
+
+`debug_event()` is a no-op unless DEBUG_OPENAI_RESPONSES=1. When enabled, the calling
+thread only checks the sampling rate and enqueues the raw fields; repr(), truncation,
+redaction and JSON encoding happen on a background QueueListener thread. When the
+queue is full, events are dropped (and counted) instead of blocking generation.
+
+Environment:
+  DEBUG_OPENAI_RESPONSES=1   enable diagnostics
+  DEBUG_LOG_SAMPLE           per-event sample rates, longest prefix wins, e.g.
+                             "openai.stream=0.05,openai.stream.response.completed=1"
+  DEBUG_LOG_MAX_CHARS        truncate each field repr to this many chars (default 2000)
+  DEBUG_LOG_FILE             write JSON lines here instead of stderr
+  DEBUG_LOG_QUEUE_SIZE       max pending events before dropping (default 10000)
+"""
+
+from __future__ import annotations
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+# Text deltas dominate stream volume; keep a small sample of them by default.
+DEFAULT_SAMPLE_RATES = {
+    "openai.stream.response.output_text.delta": 0.02,
+    "openai.stream.response.function_call_arguments.delta": 0.02,
+}
+DEFAULT_MAX_CHARS = 2000
+DEFAULT_QUEUE_SIZE = 10_000
+
+_SECRET_KEYS = re.compile(r"(authorization|api[_-]?key|token|secret|password|cookie)", re.IGNORECASE)
+_SECRET_PATTERNS = (
+    (re.compile(r"\bsk-[A-Za-z0-9_\-]{8,}"), "sk-***"),
+    (re.compile(r"\bAIza[0-9A-Za-z_\-]{20,}"), "AIza***"),
+    (re.compile(r"(?i)\bbearer\s+[A-Za-z0-9._\-]{8,}"), "Bearer ***"),
+    (re.compile(r"(?i)((?:api[_-]?key|token|secret|password)['\"]?\s*[:=]\s*['\"]?)[^'\"\s,}]{4,}"), r"\1***"),
+)
+
+logger = logging.getLogger("agent.debug")
+logger.propagate = False
+
+_context: contextvars.ContextVar[dict[str, str]] = contextvars.ContextVar("tapcanvas_debug_context", default={})
+_enabled = False
+_sample_rates: dict[str, float] = {}
+_sample_prefixes: tuple[str, ...] = ()
+_max_chars = DEFAULT_MAX_CHARS
+_listener: logging.handlers.QueueListener | None = None
+_lock = threading.Lock()
+_stats = {"emitted": 0, "sampled_out": 0, "dropped": 0}
+_stats_lock = threading.Lock()
+# Field values of these types are shallow-copied at enqueue time, so a caller that keeps
+# mutating them (e.g. an accumulating chunk list) does not change what gets logged later.
+_MUTABLE_FIELD_TYPES = (dict, list, set, bytearray)
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def redact(text: str) -> str:
+    """Mask API keys, bearer tokens and similar secrets in `text`."""
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _truncate(text: str, limit: int) -> str:
+    if limit > 0 and len(text) > limit:
+        return text[:limit] + f"…(+{len(text) - limit} chars)"
+    return text
+
+
+def _render_value(value: Any, limit: int) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, dict):
+        return {
+            str(k): ("***" if _SECRET_KEYS.search(str(k)) else _render_value(v, limit))
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [_render_value(v, limit) for v in value[:50]]
+    text = value if isinstance(value, str) else repr(value)
+    return _truncate(redact(text), limit)
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Render a debug record as one JSON line (runs on the listener thread)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Merge correlation ids and redacted, truncated fields into one JSON line."""
+        payload: dict[str, Any] = {
+            "ts": round(record.created, 6),
+            "event": record.getMessage(),
+        }
+        payload.update(getattr(record, "correlation", None) or {})
+        fields = getattr(record, "fields", None) or {}
+        try:
+            payload.update(_render_value(fields, _max_chars))
+        except Exception as exc:  # pragma: no cover
+            payload["render_error"] = repr(exc)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that neither formats in the caller thread nor blocks when full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _count("dropped")
+
+
+def _parse_sample_rates(raw: str) -> dict[str, float]:
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    for item in (raw or "").split(","):
+        key, sep, value = item.partition("=")
+        if not sep or not key.strip():
+            continue
+        try:
+            rates[key.strip()] = min(1.0, max(0.0, float(value)))
+        except ValueError:
+            continue
+    return rates
+
+
+def configure(force: bool = False) -> None:
+    """(Re)read the environment and start the background listener when enabled."""
+    global _enabled, _sample_rates, _sample_prefixes, _max_chars, _listener
+    with _lock:
+        if _listener is not None and not force:
+            return
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        _enabled = os.getenv("DEBUG_OPENAI_RESPONSES") == "1"
+        _sample_rates = _parse_sample_rates(os.getenv("DEBUG_LOG_SAMPLE", ""))
+        _sample_prefixes = tuple(sorted(_sample_rates, key=len, reverse=True))
+        try:
+            _max_chars = int(os.getenv("DEBUG_LOG_MAX_CHARS", "") or DEFAULT_MAX_CHARS)
+        except ValueError:
+            _max_chars = DEFAULT_MAX_CHARS
+        if not _enabled:
+            return
+        try:
+            queue_size = int(os.getenv("DEBUG_LOG_QUEUE_SIZE", "") or DEFAULT_QUEUE_SIZE)
+        except ValueError:
+            queue_size = DEFAULT_QUEUE_SIZE
+        path = os.getenv("DEBUG_LOG_FILE", "").strip()
+        sink: logging.Handler = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler(sys.stderr)
+        sink.setFormatter(JsonLineFormatter())
+        events: queue.Queue = queue.Queue(maxsize=max(1, queue_size))
+        logger.addHandler(_DroppingQueueHandler(events))
+        logger.setLevel(logging.DEBUG)
+        _listener = logging.handlers.QueueListener(events, sink)
+        _listener.start()
+
+
+def shutdown() -> None:
+    """Flush pending events and stop the listener thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown)
+
+
+def enabled() -> bool:
+    """Return whether debug events are being recorded."""
+    return _enabled
+
+
+def _sample_rate(key: str) -> float:
+    for prefix in _sample_prefixes:
+        if key.startswith(prefix):
+            return _sample_rates[prefix]
+    return 1.0
+
+
+def debug_event(event: str, /, *, sample_as: str | None = None, **fields: Any) -> None:
+    """Queue one diagnostic event; `sample_as` refines the sampling key (`event.sample_as`).
+
+    Top-level dict/list/set values are copied before queueing; objects nested inside them
+    are rendered later on the listener thread, so callers must not mutate those.
+    """
+    if not _enabled:
+        return
+    rate = _sample_rate(f"{event}.{sample_as}" if sample_as else event)
+    if rate < 1.0 and random.random() >= rate:
+        _count("sampled_out")
+        return
+    _count("emitted")
+    fields = {k: copy.copy(v) if isinstance(v, _MUTABLE_FIELD_TYPES) else v for k, v in fields.items()}
+    if rate < 1.0:
+        fields["sample_rate"] = rate
+    logger.handle(
+        logger.makeRecord(
+            logger.name,
+            logging.DEBUG,
+            "",
+            0,
+            event,
+            None,
+            None,
+            extra={"fields": fields, "correlation": _context.get()},
+        )
+    )
+
+
+@contextmanager
+def correlation(**ids: Any) -> Iterator[None]:
+    """Attach correlation ids (thread_id, run_id, node) to events emitted in this context."""
+    merged = {**_context.get(), **{k: str(v) for k, v in ids.items() if v}}
+    token = _context.set(merged)
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def debug_stats() -> dict[str, Any]:
+    """Return pipeline counters (emitted, sampled out, dropped on a full queue)."""
+    with _stats_lock:
+        return {"enabled": _enabled, **_stats}
+
+
+configure()
@@ -0,0 +1,60 @@
+"""Dependency-free text embeddings shared by local retrieval, snippet selection and caches."""
+
+from __future__ import annotations
+
+import math
+import re
+import zlib
+
+import numpy as np
+
+DEFAULT_DIM = 1024
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[㐀-鿿]+")
+
+
+def _features(text: str) -> dict[str, int]:
+    counts: dict[str, int] = {}
+    for tok in _TOKEN_RE.findall(text.lower()):
+        if tok.isascii():
+            counts[tok] = counts.get(tok, 0) + 1
+            continue
+        for i, ch in enumerate(tok):
+            counts[ch] = counts.get(ch, 0) + 1
+            if i + 1 < len(tok):
+                bigram = tok[i : i + 2]
+                counts[bigram] = counts.get(bigram, 0) + 1
+    return counts
+
+
+class HashingEmbedder:
+    """Stable signed feature-hashing embedder producing L2-normalized float32 vectors."""
+
+    name = "hashing-v1"
+
+    def __init__(self, dim: int = DEFAULT_DIM) -> None:
+        """Create an embedder producing `dim`-dimensional vectors."""
+        self.dim = int(dim)
+
+    def embed_into(self, text: str, out: np.ndarray) -> None:
+        """Accumulate the features of `text` into the zeroed row `out`, then normalize it."""
+        for feat, count in _features(text).items():
+            h = zlib.crc32(feat.encode("utf-8"))
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            out[h % self.dim] += sign * (1.0 + math.log(count))
+        norm = float(np.linalg.norm(out))
+        if norm > 0:
+            out /= norm
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed one text."""
+        vec = np.zeros(self.dim, dtype=np.float32)
+        self.embed_into(text or "", vec)
+        return vec
+
+    def embed_many(self, texts: list[str]) -> np.ndarray:
+        """Embed many texts into one (len(texts), dim) matrix."""
+        mat = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            self.embed_into(text or "", mat[i])
+        return mat
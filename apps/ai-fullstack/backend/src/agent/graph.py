@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import contextvars
 import os
 import json
 import time
-import urllib.request
-import urllib.error
+import threading
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable
 
 from agent.tools_and_schemas import (
     RoleDecision,
@@ -13,7 +15,6 @@ from agent.tools_and_schemas import (
     CharacterExtraction,
 )
 from dotenv import load_dotenv
-from openai import OpenAI, APIConnectionError, OpenAIError
 from langchain_core.messages import AIMessage
 from langgraph.graph import StateGraph
 from langgraph.graph import START, END
@@ -24,35 +25,41 @@ from agent.state import (
     OverallState,
 )
 from agent.configuration import Configuration
+from agent.http_client import post_json
+from agent.metrics import instrument_node, llm_call
+from agent.usage import turn_usage_summary
+from agent.debug_log import debug_event, enabled as debug_enabled
+from agent.cassette import record_or_replay, replaying as cassette_replaying, wrap_openai_client
+from agent.answer_cache import get_answer_cache
+from agent.rag_cache import get_rag_cache, normalize_rag_query
+from agent.snippet_selection import select_snippets
 from agent.prompts import (
     role_router_instructions,
     get_current_date,
     answer_instructions,
 )
-from langchain_google_genai import ChatGoogleGenerativeAI
 from agent.utils import (
+    ShortUrlStreamResolver,
     format_messages_for_prompt,
     get_research_topic,
+    kb_short_url,
+    resolve_short_urls,
 )
 from agent.roles import DEFAULT_ROLE_ID, normalize_role_id, role_map, roles_prompt_block
+from agent.prompt_assets import ROLE_ALLOWED_CANVAS_TOOLS, role_tool_set, structured_schema
+from agent.intent_features import intent_features
+from agent.sanitizer import sanitizer_engines
+from agent.memory_trim import STYLE_LOCK_KEYS, trim_folded_messages
+from agent.actions_stream import ActionsStreamExtractor, normalize_actions
+
+if TYPE_CHECKING:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from openai import OpenAI
 
 load_dotenv()
 
 REQUEST_TIMEOUT_SECONDS = 600
 
-ROLE_ALLOWED_CANVAS_TOOLS: dict[str, set[str]] = {
-    # Creative operators
-    "storyboard_artist": {"createNode", "updateNode", "connectNodes", "runNode"},
-    "character_designer": {"createNode", "updateNode", "connectNodes", "runNode"},
-    "scene_designer": {"createNode", "updateNode", "connectNodes", "runNode"},
-    # Governance / writing-only roles
-    "art_director": set(),
-    "screenwriter": set(),
-    "product_designer": set(),
-    "music_director": set(),
-    # Safety rewrite role: should not mutate canvas unless explicitly requested/confirmed
-    "magician": set(),
-}
 
 def _render_canvas_context_for_prompt(canvas_context: dict | None) -> str:
     """Render a compact, safe canvas context summary for prompts.
@@ -174,8 +181,10 @@ def _autorag_normalize_result(result: dict) -> tuple[list[str], list[dict]]:
             line_bits: list[str] = []
             if isinstance(title, str) and title.strip():
                 line_bits.append(title.strip())
-            if isinstance(url, str) and url.strip():
-                line_bits.append(url.strip())
+            # Show the model a compact stable short url; finalize_answer maps it back.
+            short_url = kb_short_url(url.strip()) if isinstance(url, str) and url.strip() else ""
+            if short_url:
+                line_bits.append(short_url)
             if score is not None:
                 try:
                     line_bits.append(f"score={float(score):.3f}")
@@ -185,8 +194,8 @@ def _autorag_normalize_result(result: dict) -> tuple[list[str], list[dict]]:
             body = text.strip() if isinstance(text, str) else ""
             if body:
                 snippets.append(f"[{idx}] {header}\n{body}" if header else f"[{idx}]\n{body}")
-            if isinstance(url, str) and url.strip():
-                sources.append({"label": title if isinstance(title, str) else f"KB#{idx}", "value": url, "short_url": url})
+            if short_url:
+                sources.append({"label": title if isinstance(title, str) else f"KB#{idx}", "value": url, "short_url": short_url})
 
     if not snippets:
         try:
@@ -196,61 +205,220 @@ def _autorag_normalize_result(result: dict) -> tuple[list[str], list[dict]]:
     return snippets, sources
 
 
-def _call_autorag_search(configurable: Configuration, query: str) -> tuple[list[str], list[dict]]:
-    """Call Worker-side AutoRAG proxy and return (web_research_result, sources_gathered)."""
+def _fetch_autorag_result(configurable: Configuration, query: str) -> tuple[dict | None, str]:
+    """Call the Worker-side AutoRAG proxy and return (raw result, error snippet)."""
+    return record_or_replay(
+        "autorag",
+        {"rag_id": (configurable.autorag_id or "").strip(), "query": query},
+        lambda: _fetch_autorag_result_live(configurable, query),
+        encode=list,
+        decode=tuple,
+    )
+
+
+def _fetch_autorag_result_live(configurable: Configuration, query: str) -> tuple[dict | None, str]:
     endpoint = (configurable.autorag_endpoint or "").strip()
     rag_id = (configurable.autorag_id or "").strip()
     secret = (os.getenv("INTERNAL_API_SECRET") or "").strip()
     if not endpoint or not rag_id or not query.strip():
-        return [], []
+        return None, ""
 
     payload = json.dumps({"ragId": rag_id, "query": query}).encode("utf-8")
-    headers = {"content-type": "application/json"}
+    headers: dict[str, str] = {}
     if secret:
         headers["x-internal-secret"] = secret
-    req = urllib.request.Request(
-        endpoint,
-        method="POST",
-        data=payload,
-        headers=headers,
-    )
     try:
-        with urllib.request.urlopen(req, timeout=20) as resp:
-            body = resp.read().decode("utf-8", errors="replace")
-    except urllib.error.HTTPError as exc:
-        try:
-            body = exc.read().decode("utf-8", errors="replace")
-        except Exception:
-            body = str(exc)
-        return [f"[AutoRAG] HTTP {exc.code}: {body[:2000]}"], []
+        # Pooled keep-alive client: avoids a fresh TCP+TLS handshake per retrieval.
+        resp = post_json(
+            endpoint,
+            payload,
+            headers=headers,
+            connect_timeout=float(configurable.autorag_connect_timeout_seconds),
+            read_timeout=float(configurable.autorag_read_timeout_seconds),
+            max_response_bytes=int(configurable.autorag_max_response_bytes),
+        )
     except Exception as exc:
-        return [f"[AutoRAG] 请求失败: {exc}"], []
+        return None, f"[AutoRAG] 请求失败: {exc}"
+    body = resp.text()
+    if not resp.ok:
+        return None, f"[AutoRAG] HTTP {resp.status_code}: {body[:2000]}"
 
     try:
         decoded = json.loads(body)
     except Exception:
-        return [f"[AutoRAG] 非 JSON 响应: {body[:2000]}"], []
+        return None, f"[AutoRAG] 非 JSON 响应: {body[:2000]}"
 
     result = decoded.get("result") if isinstance(decoded, dict) else decoded
-    snippets, sources = _autorag_normalize_result(result if isinstance(result, dict) else {"result": result})
-    if os.getenv("DEBUG_OPENAI_RESPONSES") == "1":
-        try:
-            print(
-                "[AUTORAG] ok",
-                f"rag_id={rag_id}",
-                f"query={query[:160]}",
-                f"snippets={len(snippets)}",
-                f"sources={len(sources)}",
-            )
-            if snippets:
-                print("[AUTORAG] snippet0:", (snippets[0] or "")[:500])
-        except Exception:
-            pass
+    return (result if isinstance(result, dict) else {"result": result}), ""
+
+
+def _call_autorag_search(configurable: Configuration, query: str) -> tuple[list[str], list[dict]]:
+    """Call Worker-side AutoRAG proxy and return (web_research_result, sources_gathered)."""
+    result, error = _fetch_autorag_result(configurable, query)
+    if result is None:
+        return ([error] if error else []), []
+    snippets, sources = _autorag_normalize_result(result)
+    if debug_enabled():
+        debug_event(
+            "autorag.ok",
+            rag_id=configurable.autorag_id,
+            query=query[:160],
+            snippets=len(snippets),
+            sources=len(sources),
+            snippet0=(snippets[0] or "")[:500] if snippets else None,
+        )
     return snippets, sources
 
 
+def _cached_autorag_result(configurable: Configuration, query: str) -> tuple[dict | None, str]:
+    """`_fetch_autorag_result` behind the process-wide LRU/TTL cache (stale-while-revalidate)."""
+    max_bytes = int(configurable.rag_cache_max_bytes or 0)
+    if max_bytes <= 0:
+        return _fetch_autorag_result(configurable, query)
+    rag_id = (configurable.autorag_id or "").strip()
+    key = ("autorag", rag_id, normalize_rag_query(query))
+    cache = get_rag_cache(max_bytes)
+    result, error = cache.get_or_load(
+        key,
+        lambda: _fetch_autorag_result(configurable, query),
+        ttl_seconds=float(configurable.rag_cache_ttl_seconds),
+        stale_seconds=float(configurable.rag_cache_stale_seconds),
+        # Only cache real retrievals, never transport/HTTP errors.
+        cacheable=lambda r: r[0] is not None,
+    )
+    if debug_enabled():
+        debug_event("autorag.cache", **cache.stats())
+    return result, error
+
+
+def _fetch_local_result(configurable: Configuration, query: str) -> tuple[dict | None, str]:
+    """Search the local embedded index (search_provider='local') and return (raw result, error)."""
+    index_path = (configurable.local_index_path or "").strip()
+    if not index_path or not query.strip():
+        return None, ""
+    try:
+        # Imported lazily: the index loader is only needed when the local provider is enabled.
+        from agent.local_index import search_local_index
+
+        result = search_local_index(
+            index_path,
+            query,
+            top_k=int(configurable.local_index_top_k),
+            nprobe=int(configurable.local_index_nprobe),
+        )
+    except Exception as exc:
+        return None, f"[LocalIndex] 检索失败: {exc}"
+    return result, ""
+
+
+def _fetch_retrieval_result(configurable: Configuration, provider: str, query: str) -> tuple[dict | None, str]:
+    if provider == "local":
+        # In-process index: no network hop, so no result cache either.
+        return _fetch_local_result(configurable, query)
+    return _cached_autorag_result(configurable, query)
+
+
+def _retrieval_items(result: dict) -> list[dict]:
+    raw = result.get("sources") or result.get("results") or result.get("documents") or []
+    return [item for item in raw if isinstance(item, dict)] if isinstance(raw, list) else []
+
+
+def _retrieval_item_key(item: dict) -> str:
+    url = item.get("url") or item.get("source_url") or item.get("source") or ""
+    if isinstance(url, str) and url.strip():
+        return url.strip()
+    title = item.get("title") or item.get("label") or item.get("name") or ""
+    text = item.get("text") or item.get("content") or item.get("snippet") or ""
+    return f"{title}\n{str(text)[:200]}"
+
+
+def _fuse_retrieval_results(results: list[dict], *, k: int = 60) -> dict:
+    """Merge ranked result lists with reciprocal-rank fusion, de-duplicated by source URL."""
+    if len(results) == 1:
+        return results[0]
+    fused: dict[str, float] = {}
+    first_seen: dict[str, dict] = {}
+    answer = None
+    for result in results:
+        if answer is None:
+            candidate = result.get("answer") or result.get("output") or result.get("response")
+            if isinstance(candidate, str) and candidate.strip():
+                answer = candidate
+        for rank, item in enumerate(_retrieval_items(result), start=1):
+            key = _retrieval_item_key(item)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+            first_seen.setdefault(key, item)
+    ordered = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
+    # Keep the provider's relevance `score` (shown to the model); the fusion score is separate.
+    merged: dict = {"sources": [{**first_seen[key], "rrf_score": score} for key, score in ordered]}
+    if answer is not None:
+        merged["answer"] = answer
+    return merged
+
+
+# Shared pool for concurrent retrieval fan-out (variants run in parallel, not back-to-back).
+# Sized by Configuration.rag_retrieval_workers; rebuilt when that setting changes.
+_retrieval_executor: ThreadPoolExecutor | None = None
+_retrieval_executor_workers = 0
+_retrieval_executor_lock = threading.Lock()
+
+
+def _get_retrieval_executor(workers: int) -> ThreadPoolExecutor:
+    global _retrieval_executor, _retrieval_executor_workers
+    workers = max(1, int(workers or 1))
+    with _retrieval_executor_lock:
+        if _retrieval_executor is None or _retrieval_executor_workers != workers:
+            previous = _retrieval_executor
+            _retrieval_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kb-retrieve")
+            _retrieval_executor_workers = workers
+            if previous is not None:
+                # Lets in-flight retrievals finish; new work goes to the resized pool.
+                previous.shutdown(wait=False)
+        return _retrieval_executor
+
+
+def _sources_in_snippets(sources: list[dict], snippets: list[str]) -> list[dict]:
+    """Keep the sources whose (short) url appears in one of the selected snippets."""
+    if not sources:
+        return []
+    shown = "\n".join(s for s in snippets if isinstance(s, str))
+    return [
+        src
+        for src in sources
+        if isinstance(src, dict) and any(isinstance(u, str) and u and u in shown for u in (src.get("short_url"), src.get("value")))
+    ]
+
+
+def _retrieve_fused(configurable: Configuration, provider: str, queries: list[str]) -> tuple[list[str], list[dict]]:
+    """Run every query variant concurrently and return normalized (snippets, sources)."""
+    if len(queries) == 1:
+        outcomes = [_fetch_retrieval_result(configurable, provider, queries[0])]
+    else:
+        executor = _get_retrieval_executor(configurable.rag_retrieval_workers)
+        futures = [executor.submit(_fetch_retrieval_result, configurable, provider, q) for q in queries]
+        outcomes = []
+        for fut in futures:
+            try:
+                outcomes.append(fut.result())
+            except Exception as exc:
+                outcomes.append((None, f"[KB] 检索失败: {exc}"))
+    results = [r for r, _ in outcomes if isinstance(r, dict)]
+    if not results:
+        errors = [e for _, e in outcomes if e]
+        return errors[:1], []
+    fused = _fuse_retrieval_results(results)
+    if not _retrieval_items(fused):
+        if provider == "local":
+            return [], []
+        # Unrecognized result shape: fall back to the first variant's raw result.
+        fused = results[0]
+    return _autorag_normalize_result(fused)
+
+
 def require_gemini_key() -> None:
     """Ensure a Gemini key is available before using Gemini models."""
+    if cassette_replaying():
+        return
     if (os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")) is None:
         raise ValueError(
             "Gemini API key is not set; provide GEMINI_API_KEY or GOOGLE_API_KEY."
@@ -259,6 +427,8 @@ def require_gemini_key() -> None:
 
 def get_gemini_api_key() -> str:
     key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+    if key is None and cassette_replaying():
+        return "cassette-replay"
     if key is None:
         require_gemini_key()
         raise ValueError("Gemini API key is missing.")
@@ -281,7 +451,18 @@ def resolve_llm_provider(raw: str | None) -> str:
 
 
 def get_openai_client() -> OpenAI:
-    """Return an OpenAI client configured with optional custom base URL."""
+    """Return an OpenAI client configured with optional custom base URL.
+
+    When a cassette is active (CASSETTE_MODE=record|replay) calls go through it.
+    """
+    return wrap_openai_client(_build_openai_client)
+
+
+def _build_openai_client() -> OpenAI:
+    # Provider SDKs are imported on first use so OpenAI-only (or Gemini-only) deployments
+    # don't pay for the other SDK at cold start.
+    from openai import OpenAI
+
     api_key = os.getenv("OPENAI_API_KEY")
     if api_key is None:
         raise ValueError("OPENAI_API_KEY is not set; required for OpenAI-based steps.")
@@ -299,14 +480,34 @@ def get_openai_client() -> OpenAI:
     return OpenAI(api_key=api_key, base_url=base_url)
 
 
+def _openai_errors() -> tuple[type[Exception], ...]:
+    """OpenAI SDK error types for `except` clauses, imported on first use."""
+    from openai import APIConnectionError, OpenAIError
+
+    return (APIConnectionError, OpenAIError)
+
+
+def _gemini_chat_model(**kwargs) -> ChatGoogleGenerativeAI:
+    """Build a Gemini chat model; langchain_google_genai is imported on first use."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(**kwargs)
+
+
+def _dump_gemini_message(message) -> dict | None:
+    """JSON form of a LangChain AIMessage for cassettes."""
+    return message.model_dump(mode="json") if message is not None else None
+
+
+def _load_gemini_message(data: dict | None) -> AIMessage | None:
+    if not isinstance(data, dict):
+        return None
+    return AIMessage(**{k: v for k, v in data.items() if k != "type"})
+
+
 def debug_openai_response(prefix: str, response) -> None:
-    """Print limited OpenAI response info when DEBUG_OPENAI_RESPONSES=1."""
-    if os.getenv("DEBUG_OPENAI_RESPONSES") != "1":
-        return
-    try:
-        print(f"[DEBUG_OPENAI] {prefix} raw={response!r}")
-    except Exception as exc:  # pragma: no cover
-        print(f"[DEBUG_OPENAI] {prefix} debug error: {exc}")
+    """Log limited OpenAI response info when DEBUG_OPENAI_RESPONSES=1 (truncated, redacted)."""
+    debug_event("openai.response", prefix=prefix, raw=response)
 
 
 def _format_openai_error(exc: Exception) -> dict:
@@ -362,13 +563,13 @@ def _summarize_openai_error(payload: dict) -> str:
 
 
 def debug_openai_error(prefix: str, exc: Exception) -> None:
-    """Print OpenAI error details when DEBUG_OPENAI_RESPONSES=1."""
-    if os.getenv("DEBUG_OPENAI_RESPONSES") != "1":
+    """Log OpenAI error details when DEBUG_OPENAI_RESPONSES=1."""
+    if not debug_enabled():
         return
     try:
-        print(f"[DEBUG_OPENAI_ERROR] {prefix} {_format_openai_error(exc)}")
+        debug_event("openai.error", prefix=prefix, error=_format_openai_error(exc))
     except Exception as inner_exc:  # pragma: no cover
-        print(f"[DEBUG_OPENAI_ERROR] {prefix} debug error: {inner_exc}")
+        debug_event("openai.error", prefix=prefix, debug_error=inner_exc)
 
 
 def _fallback_text_from_tool_calls(tool_calls: list[dict]) -> str:
@@ -496,13 +697,9 @@ def _collect_stream_text(stream) -> str:
     parts: list[str] = []
     try:
         for chunk in stream:
-            if os.getenv("DEBUG_OPENAI_RESPONSES") == "1":
-                try:
-                    print(f"[DEBUG_OPENAI_STREAM] {chunk!r}")
-                except Exception:
-                    pass
             # Responses API streaming events
             ev_type = getattr(chunk, "type", None)
+            debug_event("openai.stream", sample_as=ev_type if isinstance(ev_type, str) else None, chunk=chunk)
             if ev_type and isinstance(ev_type, str) and "output_text.delta" in ev_type:
                 delta = getattr(chunk, "delta", None)
                 if delta:
@@ -559,8 +756,12 @@ def _collect_stream_text_and_tools(
     stream,
     *,
     max_seconds: int | None = None,
+    on_text: Callable[[str], object] | None = None,
 ) -> tuple[str, list[dict], bool]:
-    """Collect text and any tool calls from streaming Responses API iterator."""
+    """Collect text and any tool calls from streaming Responses API iterator.
+
+    `on_text` is called with each text delta as it arrives (e.g. to stream it to clients).
+    """
     parts: list[str] = []
     tool_calls_by_id: dict[str, dict] = {}
     alias_to_call_id: dict[str, str] = {}
@@ -625,6 +826,12 @@ def _collect_stream_text_and_tools(
                 delta = getattr(chunk, "delta", None)
                 if delta:
                     parts.append(str(delta))
+                    if on_text is not None:
+                        try:
+                            on_text(parts[-1])
+                        except Exception:
+                            # Streaming to clients is best-effort; never lose the answer over it.
+                            on_text = None
                     continue
                 data = getattr(chunk, "data", None) or getattr(chunk, "output_text", None)
                 if data:
@@ -684,32 +891,6 @@ def _collect_stream_text_and_tools(
     return "".join(parts), tool_calls, timed_out
 
 
-def _to_chat_completions_tools(response_api_tools: list[dict] | None) -> list[dict]:
-    """Convert Responses-API style tools to Chat Completions tool schema."""
-    if not isinstance(response_api_tools, list) or not response_api_tools:
-        return []
-    out: list[dict] = []
-    for t in response_api_tools:
-        if not isinstance(t, dict):
-            continue
-        if t.get("type") != "function":
-            continue
-        name = t.get("name")
-        if not isinstance(name, str) or not name.strip():
-            continue
-        out.append(
-            {
-                "type": "function",
-                "function": {
-                    "name": name,
-                    "description": t.get("description") or "",
-                    "parameters": t.get("parameters") or {"type": "object", "properties": {}},
-                },
-            }
-        )
-    return out
-
-
 def _parse_chat_completions_tool_calls(message) -> list[dict]:
     """Parse tool calls from Chat Completions message object."""
     calls = getattr(message, "tool_calls", None) or []
@@ -781,25 +962,11 @@ def _looks_like_story_request(text: str) -> bool:
     if not long_form:
         return False
 
-    # Intent hints (strong positive).
-    intent = any(
-        k in t
-        for k in (
-            "分镜",
-            "九宫格",
-            "故事板",
-            "动画",
-            "短片",
-            "成片",
-            "视频",
-            "日漫",
-            "2d",
-            "2D",
-        )
-    )
-
-    # Narrative cues (weaker positive): dialogues, pronouns, scene/action verbs.
-    narrative = any(k in t for k in ("“", "”", "他", "她", "他们", "忽然", "转身", "抬头", "回头", "是夜"))
+    # Intent hints (strong positive) and narrative cues (weaker positive): dialogues,
+    # pronouns, scene/action verbs. See intent_features.INTENT_KEYWORDS.
+    features = intent_features(text)
+    intent = features.has("story_intent")
+    narrative = features.has("story_narrative")
     return intent or narrative
 
 
@@ -838,6 +1005,69 @@ def _build_autorag_query(state: OverallState) -> str:
     return _compress_autorag_text(query, 1200)
 
 
+def _canvas_entity_terms(canvas_context_obj: dict | None, limit: int = 8) -> list[str]:
+    """Character / node labels from canvas_context, used to focus retrieval on canvas entities."""
+    if not isinstance(canvas_context_obj, dict):
+        return []
+    terms: list[str] = []
+    for key in ("characters", "nodes"):
+        items = canvas_context_obj.get(key)
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            label = item.get("label") or item.get("username")
+            if isinstance(label, str) and label.strip() and label.strip() not in terms:
+                terms.append(label.strip()[:40])
+            if len(terms) >= limit:
+                return terms
+    return terms
+
+
+def _build_autorag_query_variants(state: OverallState, limit: int = 3) -> list[str]:
+    """Return up to `limit` distinct retrieval queries for concurrent fan-out.
+
+    Order: user question only, summary-focused, canvas-entity focused, then the
+    combined summary+question query from `_build_autorag_query` as a fallback.
+    """
+    combined = _build_autorag_query(state).strip()
+    if limit <= 1:
+        return [combined] if combined else []
+    summary = state.get("conversation_summary")
+    summary = summary.strip() if isinstance(summary, str) else ""
+    last_user = _get_last_user_text(state)
+    last_user = last_user.strip() if isinstance(last_user, str) else ""
+
+    candidates: list[str] = []
+    if last_user:
+        candidates.append(_compress_autorag_text(last_user, 400))
+    if summary:
+        focus = f"摘要: {_compress_autorag_text(summary, 600)}"
+        if last_user:
+            focus += f"\n关注: {_compress_autorag_text(last_user, 120)}"
+        candidates.append(focus)
+    entities = _canvas_entity_terms(state.get("canvas_context"))
+    if entities:
+        entity_query = "画布实体: " + "、".join(entities)
+        if last_user:
+            entity_query += f"\n用户问题: {_compress_autorag_text(last_user, 200)}"
+        candidates.append(entity_query)
+    if combined:
+        candidates.append(combined)
+
+    variants: list[str] = []
+    seen: set[str] = set()
+    for q in candidates:
+        key = normalize_rag_query(q)
+        if key and key not in seen:
+            seen.add(key)
+            variants.append(q)
+        if len(variants) >= limit:
+            break
+    return variants
+
+
 def _canvas_label_index(canvas_context_obj: dict | None) -> dict[str, dict]:
     """Return {label: node_dict} index for nodes in canvas_context."""
     if not isinstance(canvas_context_obj, dict):
@@ -935,7 +1165,7 @@ def _synthesize_story_pipeline_tool_calls(
     if "15" in (story_text or "") or "15秒" in (story_text or ""):
         duration_seconds = 15
 
-    wants_video = any(k in (story_text or "") for k in ("视频", "动画", "短片", "成片", "生成"))
+    wants_video = intent_features(story_text).has("story_wants_video")
     auto_run_video = interaction_mode == "agent_max" or wants_video
 
     tool_calls: list[dict] = []
@@ -1020,7 +1250,7 @@ def _synthesize_story_pipeline_tool_calls(
         ref_labels.append(label)
 
     # 2) Prop sheet when explicitly present in story
-    if any(k in (story_text or "") for k in ("线装书", "恶鬼", "画像")):
+    if intent_features(story_text).has("story_prop_sheet"):
         prop_label = "道具设定-线装书与恶鬼画像"
         ensure_image_node(
             prop_label,
@@ -1142,7 +1372,9 @@ def _extract_characters_from_story(
             f"STORY_TEXT:\n{excerpt}\n"
         )
         model = getattr(configurable, "role_selector_model", None) or configurable.answer_model
-        result = _call_openai_structured(model, prompt, CharacterExtraction)
+        result = _call_openai_structured(
+            model, prompt, CharacterExtraction, prompt_cache_key=configurable.openai_prompt_cache_key
+        )
         mains = [n for n in (result.main_characters or []) if isinstance(n, str) and n.strip()]
         if not mains:
             mains = [c.name for c in (result.characters or []) if getattr(c, "is_main", False) and c.name]
@@ -1192,8 +1424,9 @@ def _build_storyboard_prompt(story_text: str, *, style: str, duration_seconds: i
 
 
 @traceable(run_type="llm")
-def _call_openai_structured(model: str, prompt: str, schema_model):
+def _call_openai_structured(model: str, prompt: str, schema_model, *, prompt_cache_key: bool = False):
     """Call OpenAI Responses API and parse into Pydantic model."""
+    schema = structured_schema(schema_model)
     client: OpenAI | None = None
     text = ""
     first_exc: Exception | None = None
@@ -1203,45 +1436,50 @@ def _call_openai_structured(model: str, prompt: str, schema_model):
         first_exc = exc
         debug_openai_error(f"{schema_model.__name__} client_init", exc)
     # Preferred: Responses API (best quality for structured JSON). Fallback: Chat Completions for proxy compatibility.
-    try:
-        if client is None:
-            raise first_exc or ValueError("OpenAI client is unavailable.")
-        response = client.responses.create(
-            model=model,
-            input=[{"role": "user", "content": [{"type": "input_text", "text": prompt}]}],
-            text={
-                "format": {
-                    "type": "json_schema",
-                    "name": schema_model.__name__,
-                    "schema": schema_model.model_json_schema(),
-                    "strict": True,
-                }
-            },
-            stream=True,
-        )
-        debug_openai_response(f"{schema_model.__name__}", response)
-        text = _collect_stream_text(response)
-    except Exception as exc:
-        first_exc = exc
-        debug_openai_error(f"{schema_model.__name__} responses", exc)
+    with llm_call(schema_model.__name__, model, "openai") as rec:
         try:
             if client is None:
                 raise first_exc or ValueError("OpenAI client is unavailable.")
-            forced = (
-                prompt.strip()
-                + "\n\nIMPORTANT: Return ONLY a single JSON object matching this schema:\n"
-                + json.dumps(schema_model.model_json_schema(), ensure_ascii=False)
-            )
-            chat = client.chat.completions.create(
+            response = client.responses.create(
                 model=model,
-                messages=[{"role": "user", "content": forced}],
-                temperature=0,
+                input=[{"role": "user", "content": [{"type": "input_text", "text": prompt}]}],
+                text={
+                    "format": {
+                        "type": "json_schema",
+                        "name": schema_model.__name__,
+                        "schema": schema.schema,
+                        "strict": True,
+                    }
+                },
+                stream=True,
+                **({"extra_body": {"prompt_cache_key": schema.cache_key()}} if prompt_cache_key else {}),
             )
-            msg = chat.choices[0].message
-            text = str(getattr(msg, "content", "") or "")
-        except Exception as exc2:
-            debug_openai_error(f"{schema_model.__name__} chat_fallback", exc2)
-            text = ""
+            debug_openai_response(f"{schema_model.__name__}", response)
+            text = _collect_stream_text(rec.wrap_stream(response))
+        except Exception as exc:
+            first_exc = exc
+            debug_openai_error(f"{schema_model.__name__} responses", exc)
+            rec.path = "chat_fallback"
+            try:
+                if client is None:
+                    raise first_exc or ValueError("OpenAI client is unavailable.")
+                forced = (
+                    prompt.strip()
+                    + "\n\nIMPORTANT: Return ONLY a single JSON object matching this schema:\n"
+                    + schema.schema_json
+                )
+                chat = client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": forced}],
+                    temperature=0,
+                )
+                rec.record_response(chat)
+                msg = chat.choices[0].message
+                text = str(getattr(msg, "content", "") or "")
+            except Exception as exc2:
+                debug_openai_error(f"{schema_model.__name__} chat_fallback", exc2)
+                rec.outcome = "error"
+                text = ""
     try:
         return schema_model.model_validate_json(text)
     except Exception as exc:
@@ -1296,138 +1534,6 @@ def _extract_openai_text(response) -> str:
     return ""
 
 
-def _tool_definitions_for_canvas() -> list[dict]:
-    """Expose canvas tools to the LLM for function calling (frontends will execute).
-
-    NOTE: Responses API expects function tools in the flat shape:
-    {type: 'function', name, description?, parameters, strict?}
-    """
-    config_schema = {
-        "type": "object",
-        "description": "节点 data 配置（会写入 node.data）。常用字段：kind、prompt、negativePrompt、systemPrompt、keywords、imageModel/videoModel 等。",
-        "properties": {
-            "kind": {
-                "type": "string",
-                "description": "任务类型（通常由 type 推导），例如 image/textToImage/composeVideo/video。",
-            },
-            "prompt": {"type": "string", "description": "主提示词"},
-            "negativePrompt": {"type": "string", "description": "负面提示词"},
-            "systemPrompt": {"type": "string", "description": "系统提示词/风格基准"},
-            "keywords": {
-                "type": ["string", "array"],
-                "items": {"type": "string"},
-                "description": "关键词（可用逗号分隔字符串或数组）",
-            },
-            "imageModel": {"type": "string", "description": "图像模型（可选）"},
-            "videoModel": {"type": "string", "description": "视频模型（可选）"},
-        },
-        "additionalProperties": True,
-    }
-    return [
-        {
-            "type": "function",
-            "name": "createNode",
-            "description": "创建画布节点（仅支持 image/textToImage/composeVideo/video）。config 会写入 node.data。",
-            "strict": False,
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "type": {
-                        "type": "string",
-                        "enum": ["image", "textToImage", "composeVideo", "video"],
-                        "description": "逻辑节点类型（前端会映射成 taskNode.kind）",
-                    },
-                    "label": {"type": "string", "description": "可选：节点标签"},
-                    "config": config_schema,
-                    "remixFromNodeId": {
-                        "type": "string",
-                        "description": "可选：基于已有视频节点做 Remix（传入源节点 ID）",
-                    },
-                    "position": {
-                        "type": "object",
-                        "properties": {"x": {"type": "number"}, "y": {"type": "number"}},
-                        "required": ["x", "y"],
-                        "additionalProperties": False,
-                        "description": "可选：节点位置",
-                    },
-                },
-                "required": ["type"],
-                "additionalProperties": False,
-            },
-        },
-        {
-            "type": "function",
-            "name": "updateNode",
-            "description": "更新已存在节点的配置或标签，通常用于写入/修改 prompt。",
-            "strict": False,
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "nodeId": {
-                        "type": "string",
-                        "description": "节点 ID（也可直接传节点 label；前端会按 label 解析）",
-                    },
-                    "label": {"type": "string", "description": "可选：新标签"},
-                    "config": config_schema,
-                },
-                "required": ["nodeId"],
-                "additionalProperties": False,
-            },
-        },
-        {
-            "type": "function",
-            "name": "connectNodes",
-            "description": "连接两个节点，source -> target。",
-            "strict": False,
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "sourceNodeId": {
-                        "type": "string",
-                        "description": "源节点 ID（也可直接传节点 label；前端会按 label 解析）",
-                    },
-                    "targetNodeId": {
-                        "type": "string",
-                        "description": "目标节点 ID（也可直接传节点 label；前端会按 label 解析）",
-                    },
-                    "sourceHandle": {"type": "string", "description": "可选：源手柄"},
-                    "targetHandle": {"type": "string", "description": "可选：目标手柄"},
-                },
-                "required": ["sourceNodeId", "targetNodeId"],
-                "additionalProperties": False,
-            },
-        },
-        {
-            "type": "function",
-            "name": "runNode",
-            "description": "执行一个节点（例如 composeVideo/image），前端自行处理执行细节。",
-            "strict": False,
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "nodeId": {
-                        "type": "string",
-                        "description": "节点 ID（也可直接传节点 label；前端会按 label 解析）",
-                    },
-                },
-                "required": ["nodeId"],
-                "additionalProperties": False,
-            },
-        },
-    ]
-
-
-def _tool_definitions_for_role(role_id: str, allow_canvas_tools: bool) -> list[dict]:
-    """Return tool definitions filtered by role permissions and the decision-layer gate."""
-    if not allow_canvas_tools:
-        return []
-    resolved_id = normalize_role_id(role_id or DEFAULT_ROLE_ID)
-    allowed = ROLE_ALLOWED_CANVAS_TOOLS.get(resolved_id, set())
-    if not allowed:
-        return []
-    return [t for t in _tool_definitions_for_canvas() if t.get("name") in allowed]
-
-
 def _filter_tool_calls_by_role(tool_calls: list[dict], role_id: str, allow_canvas_tools: bool) -> list[dict]:
     if not allow_canvas_tools:
         return []
@@ -1515,16 +1621,36 @@ def select_role(state: OverallState, config: RunnableConfig) -> OverallState:
             configurable.role_selector_model,
             prompt,
             RoleDecision,
+            prompt_cache_key=configurable.openai_prompt_cache_key,
         )
     else:
         require_gemini_key()
-        llm = ChatGoogleGenerativeAI(
+        llm = _gemini_chat_model(
             model=configurable.role_selector_model,
             temperature=0,
             max_retries=2,
             api_key=get_gemini_api_key(),
         )
-        result = llm.with_structured_output(RoleDecision).invoke(prompt)
+        with llm_call("RoleDecision", configurable.role_selector_model, "gemini") as rec:
+            raw_result = record_or_replay(
+                "gemini",
+                {"call": "RoleDecision", "model": configurable.role_selector_model, "prompt": prompt},
+                lambda: llm.with_structured_output(RoleDecision, include_raw=True).invoke(prompt),
+                encode=lambda r: {
+                    "raw": _dump_gemini_message(r.get("raw")),
+                    "parsed": r["parsed"].model_dump() if r.get("parsed") is not None else None,
+                    "parsing_error": str(r["parsing_error"]) if r.get("parsing_error") is not None else None,
+                },
+                decode=lambda d: {
+                    "raw": _load_gemini_message(d.get("raw")),
+                    "parsed": RoleDecision.model_validate(d["parsed"]) if d.get("parsed") is not None else None,
+                    "parsing_error": ValueError(d["parsing_error"]) if d.get("parsing_error") else None,
+                },
+            )
+            rec.record_response(raw_result.get("raw"))
+        if raw_result.get("parsing_error") is not None or raw_result.get("parsed") is None:
+            raise raw_result.get("parsing_error") or ValueError("RoleDecision could not be parsed.")
+        result = raw_result["parsed"]
 
     resolved_id, profile = _resolve_role(result.role_id)
     reason = result.reason or "基于对话意图的默认选择。"
@@ -1570,48 +1696,20 @@ def select_role(state: OverallState, config: RunnableConfig) -> OverallState:
         t = (last_user_text or "").strip()
         # Collapse whitespace
         t_compact = " ".join(t.split())
+        compact_features = intent_features(t_compact)
 
         if interaction_mode == "plan" and allow_canvas_tools:
-            explicit_execute_hints = (
-                "不用确认",
-                "不必确认",
-                "别问",
-                "直接执行",
-                "直接生成",
-                "自动执行",
-                "自执行",
-                "run",
-                "tool",
-            )
-            if not any(k in t_compact for k in explicit_execute_hints):
+            if not compact_features.has("explicit_execute"):
                 allow_canvas_tools = False
                 allow_canvas_tools_reason = "Plan 模式：按步骤询问确认，本轮不自动执行画布工具。"
                 tool_tier = "none"
 
-        creation_hints = (
-            "生成",
-            "创建",
-            "画",
-            "做",
-            "帮",
-            "续写",
-            "分镜",
-            "故事板",
-            "九宫格",
-            "视频",
-            "图片",
-            "改",
-            "调整",
-            "修改",
-            "连接",
-            "运行",
-        )
         if (
             interaction_mode == "plan"
             and allow_canvas_tools
             and t_compact
             and len(t_compact) <= 8
-            and not any(k in t_compact for k in creation_hints)
+            and not compact_features.has("creation")
         ):
             allow_canvas_tools = False
             allow_canvas_tools_reason = "用户输入过短且未表达明确创作动作，先用选项确认下一步。"
@@ -1642,8 +1740,193 @@ def select_role(state: OverallState, config: RunnableConfig) -> OverallState:
     }
 
 
+# Questions mentioning these depend on the current canvas/thread, so their answers are not reusable.
+_ANSWER_CACHE_CONTEXT_KEYWORDS = (
+    "画布",
+    "节点",
+    "当前",
+    "这个",
+    "这张",
+    "这段",
+    "刚才",
+    "刚生成",
+    "上面",
+    "上一",
+    "之前",
+    "继续",
+)
+
+
+def _has_prior_conversation(state: OverallState) -> bool:
+    """Whether the turn carries thread context beyond the latest user message."""
+    summary = state.get("conversation_summary")
+    if isinstance(summary, str) and summary.strip():
+        return True
+    messages = state.get("messages") or []
+    if not isinstance(messages, list):
+        return False
+    for m in reversed(messages):
+        if getattr(m, "type", None) == "human" or getattr(m, "role", None) == "user":
+            return m is not messages[0]
+    return bool(messages)
+
+
+def _answer_cache_question(state: OverallState, role_tools: list[dict]) -> str:
+    """Return the question to key the semantic answer cache on, or "" when the turn must bypass it."""
+    if role_tools or bool(state.get("allow_canvas_tools", True)):
+        return ""
+    if (state.get("active_tool_tier") or "none").strip().lower() != "none":
+        return ""
+    if any(isinstance(s, str) and s.strip() for s in (state.get("web_research_result") or [])):
+        return ""
+    # The cache is shared by every thread: only answers that depend on nothing but the
+    # question (no earlier turns, summary or style lock of this thread) may be reused.
+    if _has_prior_conversation(state):
+        return ""
+    question = (_get_last_user_text(state) or "").strip()
+    if not question or len(question) > 200:
+        return ""
+    if any(k in question for k in _ANSWER_CACHE_CONTEXT_KEYWORDS):
+        return ""
+    if any(term in question for term in _canvas_entity_terms(state.get("canvas_context"), limit=64)):
+        return ""
+    return question
+
+
+def _extract_tapcanvas_actions(text: str) -> tuple[str, list[dict] | None]:
+    if not isinstance(text, str):
+        return text, None
+
+    def _extract_json_object(s: str, start_index: int) -> tuple[str, int] | None:
+        """Return (json_text, end_index_exclusive) for a JSON object starting at/after start_index."""
+        start = s.find("{", start_index)
+        if start < 0:
+            return None
+        depth = 0
+        in_string = False
+        quote = ""
+        i = start
+        while i < len(s):
+            ch = s[i]
+            if in_string:
+                if ch == "\\":
+                    i += 2
+                    continue
+                if ch == quote:
+                    in_string = False
+                    quote = ""
+                i += 1
+                continue
+            if ch in ('"', "'"):
+                in_string = True
+                quote = ch
+                i += 1
+                continue
+            if ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    return s[start : i + 1].strip(), i + 1
+            i += 1
+        return None
+
+    cleaned = text
+    obj: object | None = None
+
+    # Preferred: fenced block (per prompt convention).
+    marker = "```tapcanvas_actions"
+    start = text.find(marker)
+    if start >= 0:
+        start_payload = text.find("\n", start + len(marker))
+        if start_payload >= 0:
+            start_payload += 1
+            end_fence = text.find("```", start_payload)
+            if end_fence >= 0:
+                payload_raw = text[start_payload:end_fence].strip()
+                cleaned = (text[:start] + text[end_fence + 3 :]).strip()
+                try:
+                    obj = json.loads(payload_raw)
+                except Exception:
+                    obj = None
+
+    # Fallback: plain marker + JSON (some models omit the code fence and may append extra text after JSON).
+    if obj is None and "tapcanvas_actions" in text:
+        token = "tapcanvas_actions"
+        token_idx = text.find(token)
+        while token_idx >= 0:
+            if token_idx == 0 or text[token_idx - 1] == "\n":
+                break
+            token_idx = text.find(token, token_idx + len(token))
+        if token_idx >= 0:
+            extracted = _extract_json_object(text, token_idx + len(token))
+            if extracted:
+                payload_raw, end_index = extracted
+                remove_start = token_idx - 1 if token_idx > 0 and text[token_idx - 1] == "\n" else token_idx
+                cleaned = (text[:remove_start] + text[end_index:]).strip()
+                try:
+                    obj = json.loads(payload_raw)
+                except Exception:
+                    obj = None
+
+    if obj is None:
+        return cleaned, None
+
+    normalized = normalize_actions(obj)
+    return cleaned, normalized
+
+
 # Nodes
 @traceable
+# Always-on "magician" content safety:
+# - Safety classification should be decided by an LLM (not brittle keyword lists).
+# - We only use lightweight sanitization transforms AFTER classification.
+def _classify_safety(configurable: Configuration, user_text: str, planned_prompts: str) -> SafetyDecision:
+    model = getattr(configurable, "safety_classifier_model", None) or configurable.role_selector_model
+    payload = (
+        "You are a strict-but-practical content safety classifier for a public creative tool.\n"
+        "Task: judge whether the request/planned prompts contain explicit sexual content, explicit nudity, graphic gore, or explicit violence.\n"
+        "Rules:\n"
+        "- sexual=true only for explicit sexual acts/pornographic intent.\n"
+        "- nudity=true if explicit nudity is requested or described for output.\n"
+        "- gore=true only for graphic body harm/viscera/dismemberment close-ups.\n"
+        "- violence=true for explicit harm descriptions that should be softened to PG-13 cinematic implication.\n"
+        "- should_block=true if the assistant must refuse direct generation and ask to rewrite first (typically sexual/porn; or extreme gore).\n"
+        "- should_sanitize=true if output should be rewritten/softened (PG-13) before proceeding.\n"
+        "Return a JSON object matching the provided schema.\n\n"
+        "USER_TEXT:\n"
+        f"{(user_text or '').strip()}\n\n"
+        "PLANNED_PROMPTS (may be empty):\n"
+        f"{(planned_prompts or '').strip()}\n"
+    )
+    try:
+        return _call_openai_structured(
+            model, payload, SafetyDecision, prompt_cache_key=configurable.openai_prompt_cache_key
+        )
+    except Exception:
+        # Fallback: assume safe but keep sanitization enabled in prompts via negativePrompt.
+        return SafetyDecision(
+            sexual=False,
+            nudity=False,
+            gore=False,
+            violence=False,
+            should_block=False,
+            should_sanitize=True,
+            reason="Fallback: classifier unavailable.",
+        )
+
+
+def _safety_flagged(decision: SafetyDecision) -> bool:
+    """Whether the decision asks to block or soften the turn (the classifier fallback does not)."""
+    return decision.should_block or (
+        decision.should_sanitize and (decision.sexual or decision.nudity or decision.gore or decision.violence)
+    )
+
+
+# The user turn is classified next to answer generation, so a clean turn can stream live.
+_safety_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="safety-classify")
+
+
 def finalize_answer(state: OverallState, config: RunnableConfig):
     """LangGraph node that finalizes the research summary.
 
@@ -1694,6 +1977,8 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
     tool_calls_payload: list[dict] = []
     llm_error_payload: dict | None = None
     quick_replies_payload: list[dict] | None = None
+    actions_stream: ActionsStreamExtractor | None = None
+    streamed_text: str | None = None
 
     def _apply_timeout_fallback(text: str) -> str:
         base = (text or "").strip()
@@ -1724,109 +2009,9 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
             )
         return "结论：生成超时，先给结论。当前信息不足，建议拆分问题或补充关键细节后继续。"
 
-    def _extract_tapcanvas_actions(text: str) -> tuple[str, list[dict] | None]:
-        if not isinstance(text, str):
-            return text, None
-
-        def _normalize_actions(obj: object) -> list[dict] | None:
-            actions = obj.get("actions") if isinstance(obj, dict) else None
-            if not isinstance(actions, list):
-                return None
-            normalized: list[dict] = []
-            for item in actions:
-                if not isinstance(item, dict):
-                    continue
-                label = item.get("label")
-                input_text = item.get("input")
-                if not isinstance(label, str) or not label.strip():
-                    continue
-                if not isinstance(input_text, str) or not input_text.strip():
-                    continue
-                normalized.append({"label": label.strip(), "input": input_text})
-                if len(normalized) >= 6:
-                    break
-            return normalized or None
-
-        def _extract_json_object(s: str, start_index: int) -> tuple[str, int] | None:
-            """Return (json_text, end_index_exclusive) for a JSON object starting at/after start_index."""
-            start = s.find("{", start_index)
-            if start < 0:
-                return None
-            depth = 0
-            in_string = False
-            quote = ""
-            i = start
-            while i < len(s):
-                ch = s[i]
-                if in_string:
-                    if ch == "\\":
-                        i += 2
-                        continue
-                    if ch == quote:
-                        in_string = False
-                        quote = ""
-                    i += 1
-                    continue
-                if ch in ('"', "'"):
-                    in_string = True
-                    quote = ch
-                    i += 1
-                    continue
-                if ch == "{":
-                    depth += 1
-                elif ch == "}":
-                    depth -= 1
-                    if depth == 0:
-                        return s[start : i + 1].strip(), i + 1
-                i += 1
-            return None
-
-        cleaned = text
-        obj: object | None = None
-
-        # Preferred: fenced block (per prompt convention).
-        marker = "```tapcanvas_actions"
-        start = text.find(marker)
-        if start >= 0:
-            start_payload = text.find("\n", start + len(marker))
-            if start_payload >= 0:
-                start_payload += 1
-                end_fence = text.find("```", start_payload)
-                if end_fence >= 0:
-                    payload_raw = text[start_payload:end_fence].strip()
-                    cleaned = (text[:start] + text[end_fence + 3 :]).strip()
-                    try:
-                        obj = json.loads(payload_raw)
-                    except Exception:
-                        obj = None
-
-        # Fallback: plain marker + JSON (some models omit the code fence and may append extra text after JSON).
-        if obj is None and "tapcanvas_actions" in text:
-            token = "tapcanvas_actions"
-            token_idx = text.find(token)
-            while token_idx >= 0:
-                if token_idx == 0 or text[token_idx - 1] == "\n":
-                    break
-                token_idx = text.find(token, token_idx + len(token))
-            if token_idx >= 0:
-                extracted = _extract_json_object(text, token_idx + len(token))
-                if extracted:
-                    payload_raw, end_index = extracted
-                    remove_start = token_idx - 1 if token_idx > 0 and text[token_idx - 1] == "\n" else token_idx
-                    cleaned = (text[:remove_start] + text[end_index:]).strip()
-                    try:
-                        obj = json.loads(payload_raw)
-                    except Exception:
-                        obj = None
-
-        if obj is None:
-            return cleaned, None
-
-        normalized = _normalize_actions(obj)
-        return cleaned, normalized
-
     allow_canvas_tools = bool(state.get("allow_canvas_tools", True))
-    role_tools = _tool_definitions_for_role(resolved_id, allow_canvas_tools)
+    tool_set = role_tool_set(resolved_id, allow_canvas_tools)
+    role_tools = list(tool_set.responses_tools)
 
     # Fast path: when user pastes a long story in Agent/Agent Max, deterministically run
     # the character->storyboard->video pipeline instead of relying on the LLM to emit tool calls.
@@ -1837,17 +2022,7 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
             allow_canvas_tools
             and interaction_mode in ("agent", "agent_max")
             and _looks_like_story_request(last_user_text)
-            and not any(
-                k in (last_user_text or "")
-                for k in (
-                    "先不操作画布",
-                    "不要操作画布",
-                    "只聊",
-                    "只写",
-                    "不要生成",
-                    "不生成",
-                )
-            )
+            and not intent_features(last_user_text).has("story_opt_out")
         ):
             tool_calls_payload, content = _synthesize_story_pipeline_tool_calls(
                 state,
@@ -1864,6 +2039,7 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
                 "allow_canvas_tools": True,
                 "allow_canvas_tools_reason": state.get("allow_canvas_tools_reason", ""),
                 "tool_calls": tool_calls_payload,
+                "usage": turn_usage_summary(state),
             }
             return {
                 "messages": [AIMessage(content=content, additional_kwargs=message_kwargs)],
@@ -1878,6 +2054,49 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
     except Exception:
         pass
 
+    # Semantic answer cache (opt-in): repeated how-to questions in chat-only turns.
+    answer_cache = None
+    answer_cache_scope = (resolved_id, interaction_mode, "none")
+    answer_cache_question = ""
+    if configurable.answer_cache_enabled:
+        answer_cache_question = _answer_cache_question(state, role_tools)
+    if answer_cache_question:
+        answer_cache = get_answer_cache(int(configurable.answer_cache_max_entries))
+        hit = answer_cache.lookup(
+            answer_cache_scope,
+            answer_cache_question,
+            threshold=float(configurable.answer_cache_threshold),
+            ttl_seconds=float(configurable.answer_cache_ttl_seconds),
+        )
+        if hit is not None:
+            cached, similarity = hit
+            debug_event("answer_cache.hit", similarity=round(similarity, 3), question=answer_cache_question[:80])
+            message_kwargs = {
+                "active_role": resolved_id,
+                "active_role_name": profile["name"],
+                "active_role_reason": state.get("active_role_reason", "根据对话意图选择。"),
+                "active_intent": state.get("active_intent", ""),
+                "active_tool_tier": state.get("active_tool_tier", "none"),
+                "allow_canvas_tools": bool(state.get("allow_canvas_tools", False)),
+                "allow_canvas_tools_reason": state.get("allow_canvas_tools_reason", ""),
+                "answer_cache_hit": True,
+                "usage": turn_usage_summary(state),
+            }
+            if cached.get("quick_replies"):
+                message_kwargs["quick_replies"] = cached["quick_replies"]
+            return {
+                "messages": [AIMessage(content=cached["content"], additional_kwargs=message_kwargs)],
+                "sources_gathered": [],
+                "active_role": resolved_id,
+                "active_role_name": profile["name"],
+                "active_role_reason": state.get("active_role_reason", "根据对话意图选择。"),
+                "active_intent": state.get("active_intent", ""),
+                "active_tool_tier": state.get("active_tool_tier", "none"),
+                "agent_loop_count": agent_loop_count,
+            }
+    answer_timed_out = False
+    sanitizer_fired: dict[str, dict[str, int]] = {}
+
     if llm_provider == "openai":
         try:
             kwargs: dict = {
@@ -1893,37 +2112,68 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
             if role_tools:
                 kwargs["tools"] = role_tools
                 kwargs["tool_choice"] = "auto"
-            try:
-                completion = get_openai_client().responses.create(**kwargs)
-                debug_openai_response("finalize_answer", completion)
-                result_text, tool_calls_payload, timed_out = _collect_stream_text_and_tools(
-                    completion,
-                    max_seconds=600,
-                )
-                if timed_out:
-                    result_text = _apply_timeout_fallback(result_text)
-                    tool_calls_payload = []
-                tool_calls_payload = _normalize_tool_calls_payload(tool_calls_payload)
-                tool_calls_payload = _filter_tool_calls_by_role(tool_calls_payload, resolved_id, allow_canvas_tools)
-            except Exception as exc:
-                # Fallback for OpenAI-compatible proxies that don't implement Responses API.
-                debug_openai_error("finalize_answer responses_fallback", exc)
-                client = get_openai_client()
-                chat_kwargs: dict = {
-                    "model": reasoning_model,
-                    "messages": [{"role": "user", "content": formatted_prompt}],
-                    "temperature": 0,
-                }
-                chat_tools = _to_chat_completions_tools(role_tools)
-                if chat_tools:
-                    chat_kwargs["tools"] = chat_tools
-                    chat_kwargs["tool_choice"] = "auto"
-                chat = client.chat.completions.create(**chat_kwargs)
-                msg = chat.choices[0].message
-                result_text = str(getattr(msg, "content", "") or "")
-                tool_calls_payload = _parse_chat_completions_tool_calls(msg)
-                tool_calls_payload = _normalize_tool_calls_payload(tool_calls_payload)
-                tool_calls_payload = _filter_tool_calls_by_role(tool_calls_payload, resolved_id, allow_canvas_tools)
+            if configurable.openai_prompt_cache_key:
+                kwargs["extra_body"] = {"prompt_cache_key": tool_set.cache_key("finalize_answer")}
+            last_user_text = _get_last_user_text(state)
+            pre_safety = _safety_executor.submit(
+                contextvars.copy_context().run, _classify_safety, configurable, last_user_text, ""
+            )
+            # Visible text and quick replies for clients (stream_mode="custom"). Text is held
+            # until the user turn is classified, then streams live unless it was flagged;
+            # quick replies go out as soon as their block closes.
+            actions_stream = ActionsStreamExtractor.for_node(
+                "finalize_answer",
+                hold=True,
+                text_filter=ShortUrlStreamResolver(state["sources_gathered"]),
+            )
+
+            def _on_answer_text(delta: str) -> None:
+                actions_stream.feed(delta)
+                if actions_stream.hold and pre_safety.done() and not _safety_flagged(pre_safety.result()):
+                    actions_stream.release()
+
+            with llm_call("finalize_answer", reasoning_model, "openai") as rec:
+                try:
+                    completion = get_openai_client().responses.create(**kwargs)
+                    debug_openai_response("finalize_answer", completion)
+                    result_text, tool_calls_payload, timed_out = _collect_stream_text_and_tools(
+                        rec.wrap_stream(completion),
+                        max_seconds=600,
+                        on_text=_on_answer_text if actions_stream is not None else None,
+                    )
+                    if actions_stream is not None:
+                        actions_stream.finish()
+                    streamed_text = result_text
+                    if timed_out:
+                        result_text = _apply_timeout_fallback(result_text)
+                        answer_timed_out = True
+                        tool_calls_payload = []
+                    tool_calls_payload = _normalize_tool_calls_payload(tool_calls_payload)
+                    tool_calls_payload = _filter_tool_calls_by_role(tool_calls_payload, resolved_id, allow_canvas_tools)
+                except Exception as exc:
+                    # Fallback for OpenAI-compatible proxies that don't implement Responses API.
+                    debug_openai_error("finalize_answer responses_fallback", exc)
+                    rec.path = "chat_fallback"
+                    if actions_stream is not None:
+                        # Drop the partial stream; the chat answer is sent once by sync() below.
+                        actions_stream.discard()
+                    streamed_text = None
+                    client = get_openai_client()
+                    chat_kwargs: dict = {
+                        "model": reasoning_model,
+                        "messages": [{"role": "user", "content": formatted_prompt}],
+                        "temperature": 0,
+                    }
+                    if tool_set.chat_tools:
+                        chat_kwargs["tools"] = list(tool_set.chat_tools)
+                        chat_kwargs["tool_choice"] = "auto"
+                    chat = client.chat.completions.create(**chat_kwargs)
+                    rec.record_response(chat)
+                    msg = chat.choices[0].message
+                    result_text = str(getattr(msg, "content", "") or "")
+                    tool_calls_payload = _parse_chat_completions_tool_calls(msg)
+                    tool_calls_payload = _normalize_tool_calls_payload(tool_calls_payload)
+                    tool_calls_payload = _filter_tool_calls_by_role(tool_calls_payload, resolved_id, allow_canvas_tools)
 
             # Story -> characters -> storyboard -> video autopipeline
             # Trigger when user pastes long story text and asks for animation/storyboard/video.
@@ -1961,7 +2211,7 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
                     except Exception:
                         last_user_text = ""
                     t = (last_user_text or "").strip()
-                    if any(k in t for k in ("三视", "三视图", "角色三视", "角色三视图")):
+                    if intent_features(last_user_text).has("turnaround"):
                         # Infer character names from recent user text (best-effort).
                         recent_user_text = ""
                         try:
@@ -2029,97 +2279,6 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
                 except Exception:
                     pass
 
-            # If the user is asking for open-ended story continuation recommendations,
-            # do NOT auto-create storyboard/video nodes in this turn; offer selectable directions.
-            last_user_text = ""
-            try:
-                for m in reversed(state.get("messages") or []):
-                    if getattr(m, "type", None) == "human" or getattr(m, "role", None) == "user":
-                        last_user_text = str(getattr(m, "content", "") or "")
-                        break
-            except Exception:
-                last_user_text = ""
-
-            # Always-on "magician" content safety:
-            # - Safety classification should be decided by an LLM (not brittle keyword lists).
-            # - We only use lightweight sanitization transforms AFTER classification.
-            def _classify_safety(user_text: str, planned_prompts: str) -> SafetyDecision:
-                model = getattr(configurable, "safety_classifier_model", None) or configurable.role_selector_model
-                payload = (
-                    "You are a strict-but-practical content safety classifier for a public creative tool.\n"
-                    "Task: judge whether the request/planned prompts contain explicit sexual content, explicit nudity, graphic gore, or explicit violence.\n"
-                    "Rules:\n"
-                    "- sexual=true only for explicit sexual acts/pornographic intent.\n"
-                    "- nudity=true if explicit nudity is requested or described for output.\n"
-                    "- gore=true only for graphic body harm/viscera/dismemberment close-ups.\n"
-                    "- violence=true for explicit harm descriptions that should be softened to PG-13 cinematic implication.\n"
-                    "- should_block=true if the assistant must refuse direct generation and ask to rewrite first (typically sexual/porn; or extreme gore).\n"
-                    "- should_sanitize=true if output should be rewritten/softened (PG-13) before proceeding.\n"
-                    "Return a JSON object matching the provided schema.\n\n"
-                    "USER_TEXT:\n"
-                    f"{(user_text or '').strip()}\n\n"
-                    "PLANNED_PROMPTS (may be empty):\n"
-                    f"{(planned_prompts or '').strip()}\n"
-                )
-                try:
-                    return _call_openai_structured(model, payload, SafetyDecision)
-                except Exception:
-                    # Fallback: assume safe but keep sanitization enabled in prompts via negativePrompt.
-                    return SafetyDecision(
-                        sexual=False,
-                        nudity=False,
-                        gore=False,
-                        violence=False,
-                        should_block=False,
-                        should_sanitize=True,
-                        reason="Fallback: classifier unavailable.",
-                    )
-
-            def _sanitize_sexual_text(text: str) -> str:
-                if not isinstance(text, str) or not text.strip():
-                    return text
-                replacements = {
-                    "无码": "（不展示细节）",
-                    "露点": "穿着完整（不露骨）",
-                    "裸体": "穿着完整（不露骨）",
-                    "性交": "亲密互动（不露骨）",
-                    "做爱": "亲密互动（不露骨）",
-                    "口交": "亲密互动（不露骨）",
-                    "肛交": "亲密互动（不露骨）",
-                    "强奸": "性侵（不展示细节，仅点到为止）",
-                    "迷奸": "性侵（不展示细节，仅点到为止）",
-                    "porn": "（不露骨）",
-                }
-                out = text
-                for k, v in replacements.items():
-                    out = out.replace(k, v)
-                return out
-
-            def _sanitize_violent_text(text: str) -> str:
-                if not isinstance(text, str) or not text.strip():
-                    return text
-                replacements = {
-                    "爆头": "强烈冲击（不展示细节）",
-                    "脑浆": "冲击性的后果（不展示细节）",
-                    "断肢": "受伤倒下（不展示细节）",
-                    "肢解": "镜头切走（用暗示表达）",
-                    "开膛": "镜头切走（用暗示表达）",
-                    "剖腹": "镜头切走（用暗示表达）",
-                    "内脏": "不展示细节",
-                    "肠子": "不展示细节",
-                    "碎尸": "不展示细节",
-                    "割喉": "镜头切走（用暗示表达）",
-                    "斩首": "镜头切走（用暗示表达）",
-                    "砍头": "镜头切走（用暗示表达）",
-                    "喷血": "用剪影/反应镜头表达冲击（不展示细节）",
-                    "血浆": "用光影/音效表达冲击（不展示细节）",
-                    "血肉模糊": "画面用遮挡/虚焦表达（不展示细节）",
-                }
-                out = text
-                for k, v in replacements.items():
-                    out = out.replace(k, v)
-                return out
-
             tool_prompts_text = ""
             try:
                 for c in tool_calls_payload or []:
@@ -2133,7 +2292,10 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
                             tool_prompts_text += "\n" + p
             except Exception:
                 pass
-            safety = _classify_safety(last_user_text or "", tool_prompts_text)
+            # Planned prompts need their own pass; otherwise the user-turn decision stands.
+            safety = pre_safety.result()
+            if tool_prompts_text.strip():
+                safety = _classify_safety(configurable, last_user_text, tool_prompts_text)
 
             if safety.should_block and (safety.sexual or safety.nudity):
                 tool_calls_payload = []
@@ -2162,6 +2324,10 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
             elif safety.should_sanitize and (safety.sexual or safety.nudity):
                 # Sanitize prompts and add safety negatives, but do not hard-block the whole turn.
                 try:
+                    engine = sanitizer_engines(configurable.sanitizer_rules_path)["sexual"]
+                    fired = engine.apply_plan(tool_calls_payload)
+                    if fired:
+                        sanitizer_fired["sexual"] = dict(fired)
                     for c in tool_calls_payload or []:
                         if c.get("name") != "createNode":
                             continue
@@ -2169,8 +2335,6 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
                         cfg = args.get("config")
                         if not isinstance(cfg, dict):
                             continue
-                        if isinstance(cfg.get("prompt"), str):
-                            cfg["prompt"] = _sanitize_sexual_text(cfg["prompt"])
                         neg = cfg.get("negativePrompt")
                         neg_text = neg if isinstance(neg, str) else ""
                         add_neg = "nude, naked, explicit sex, porn, nipples, genitalia"
@@ -2179,8 +2343,10 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
                 except Exception:
                     pass
             elif safety.should_sanitize and (safety.gore or safety.violence):
-                result_text = _sanitize_violent_text(result_text or "")
+                engine = sanitizer_engines(configurable.sanitizer_rules_path)["violent"]
+                result_text, fired = engine.apply(result_text or "")
                 try:
+                    fired.update(engine.apply_plan(tool_calls_payload))
                     for c in tool_calls_payload or []:
                         if c.get("name") != "createNode":
                             continue
@@ -2188,8 +2354,6 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
                         cfg = args.get("config")
                         if not isinstance(cfg, dict):
                             continue
-                        if isinstance(cfg.get("prompt"), str):
-                            cfg["prompt"] = _sanitize_violent_text(cfg["prompt"])
                         neg = cfg.get("negativePrompt")
                         neg_text = neg if isinstance(neg, str) else ""
                         add_neg = "gore, dismemberment, intestines, brains, blood splatter close-up, explicit violence, torture porn, nude, explicit sex"
@@ -2197,10 +2361,25 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
                             cfg["negativePrompt"] = (neg_text + ("\n" if neg_text else "") + add_neg).strip()
                 except Exception:
                     pass
+                if fired:
+                    sanitizer_fired["violent"] = dict(fired)
+            if sanitizer_fired:
+                debug_event("sanitizer.fired", rules=sanitizer_fired)
+            # Held text goes out only when the classified (and possibly sanitized) answer is
+            # still exactly the streamed model text; otherwise sync() below sends the final
+            # message instead (as an answer_reset if text already streamed live).
+            if actions_stream is not None:
+                if not safety.should_block and streamed_text is not None and result_text == streamed_text:
+                    actions_stream.release()
+                else:
+                    actions_stream.discard()
+            # If the user is asking for open-ended story continuation recommendations,
+            # do NOT auto-create storyboard/video nodes in this turn; offer selectable directions.
+            user_features = intent_features(last_user_text)
             is_story_suggestion_request = (
-                any(k in (last_user_text or "") for k in ("续写", "后续剧情", "接下来", "续作"))
-                and any(k in (last_user_text or "") for k in ("推荐", "方向", "灵感", "怎么写"))
-                and not any(k in (last_user_text or "") for k in ("九宫格", "分镜", "故事板", "storyboard", "15s"))
+                user_features.has("continuation_topic")
+                and user_features.has("suggestion_ask")
+                and not user_features.has("storyboard_or_15s")
             )
 
             if (
@@ -2243,20 +2422,11 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
             # for text-only deliverables like scripts, character sheets, or shot lists.
             storyboard_generation_intent = (
                 has_canvas_tool_calls
-                or any(k in (last_user_text or "") for k in ("九宫格", "分镜图", "故事板", "storyboard"))
-                or (
-                    any(k in (last_user_text or "") for k in ("生成", "出", "做成"))
-                    and any(k in (last_user_text or "") for k in ("分镜", "九宫格", "故事板", "图片", "生图", "视频", "15s", "15秒"))
-                )
-            )
-            has_lock_confirmation = any(
-                k in (last_user_text or "")
-                for k in ("确认锁定", "锁定场景", "锁定主体", "锁定风格", "确认风格", "风格锁定", "我确认", "确认：")
-            )
-            implicit_lock_confirmation = any(
-                k in (last_user_text or "")
-                for k in ("继续", "按你给的", "就按这个", "照这个来", "不用确认", "直接生成", "别问了")
+                or user_features.has("storyboard_explicit")
+                or (user_features.has("generate_verb") and user_features.has("generation_target"))
             )
+            has_lock_confirmation = user_features.has("lock_confirmation")
+            implicit_lock_confirmation = user_features.has("implicit_lock")
             # Hard fallback to prevent self-looping: after N turns in the same thread,
             # stop blocking on lock confirmation and proceed with default lock behavior.
             if hard_turn_cap > 0 and agent_loop_count >= hard_turn_cap:
@@ -2277,7 +2447,7 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
                     text = str(getattr(m, "content", "") or "")
                     if not text:
                         continue
-                    for key in ("确认锁定风格：", "风格锁定：", "锁定风格："):
+                    for key in STYLE_LOCK_KEYS:
                         if key in text:
                             after = text.split(key, 1)[1].strip()
                             if not after:
@@ -2380,7 +2550,7 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
                     return labels
 
                 is_continuation_step = (
-                    any(k in (last_user_text or "") for k in ("我选择方向", "自定义续写", "续写"))
+                    user_features.has("continuation_step")
                     and not is_story_suggestion_request
                 )
                 existing_labels = _canvas_labels_from_context(state.get("canvas_context"))
@@ -2504,10 +2674,7 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
                 # Storyboard workflow: prefer "九宫格分镜图(image) -> composeVideo" (single reference image).
                 # Note: users may ask for "短片/宣传片/产品介绍" without mentioning "分镜/九宫格";
                 # we infer storyboard intent from tool calls as well to keep continuity and auto-connect references.
-                wants_storyboard_by_user = any(
-                    kw in (last_user_text or "")
-                    for kw in ("分镜", "故事板", "storyboard", "九宫格", "15s")
-                )
+                wants_storyboard_by_user = user_features.has("wants_storyboard")
                 has_compose_video = any(
                     c.get("name") == "createNode"
                     and (c.get("arguments") or {}).get("type") == "composeVideo"
@@ -2761,10 +2928,7 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
 
                 # General continuity: if the user asks to base new content on existing results (基于/续写/同款/延展),
                 # ensure newly created image nodes are connected to a relevant upstream image before running.
-                reference_intent = any(
-                    kw in (last_user_text or "")
-                    for kw in ("基于", "同款", "同风格", "沿用", "续写", "延展", "变体", "参考", "保持一致")
-                )
+                reference_intent = user_features.has("reference")
 
                 def _pick_latest_success_image_label(canvas_context_obj: dict | None) -> str | None:
                     if not isinstance(canvas_context_obj, dict):
@@ -2930,7 +3094,7 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
             result = AIMessage(
                 content="无法生成最终答案：后端未配置模型密钥（请检查 OPENAI_API_KEY / GEMINI_API_KEY）。"
             )
-        except (APIConnectionError, OpenAIError) as exc:
+        except _openai_errors() as exc:
             debug_openai_error("finalize_answer", exc)
             llm_error_payload = _format_openai_error(exc)
             result = AIMessage(
@@ -2942,13 +3106,21 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
             result = AIMessage(content="无法生成最终答案：运行时异常。")
     else:
         # init Reasoning Model, default to Gemini 2.5 Flash
-        llm = ChatGoogleGenerativeAI(
+        llm = _gemini_chat_model(
             model=reasoning_model,
             temperature=0,
             max_retries=2,
             api_key=get_gemini_api_key(),
         )
-        result = llm.invoke(formatted_prompt)
+        with llm_call("finalize_answer", reasoning_model, "gemini") as rec:
+            result = record_or_replay(
+                "gemini",
+                {"call": "finalize_answer", "model": reasoning_model, "prompt": formatted_prompt},
+                lambda: llm.invoke(formatted_prompt),
+                encode=_dump_gemini_message,
+                decode=_load_gemini_message,
+            )
+            rec.record_response(result)
 
     # Replace the short urls with the original urls and add all used urls to the sources_gathered
     unique_sources = []
@@ -3019,10 +3191,10 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
         except Exception:
             # best-effort only
             pass
-    for source in state["sources_gathered"]:
-        if source["short_url"] in content:
-            content = content.replace(source["short_url"], source["value"])
-            unique_sources.append(source)
+    if isinstance(content, str):
+        content, unique_sources = resolve_short_urls(content, state["sources_gathered"])
+    if actions_stream is not None:
+        actions_stream.sync(content if isinstance(content, str) else "", quick_replies_payload)
 
     # Normalize content/tool calls
     tool_calls_payload = locals().get("tool_calls_payload", []) or []
@@ -3042,6 +3214,23 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
         message_kwargs["quick_replies"] = quick_replies_payload
     if llm_error_payload:
         message_kwargs["llm_error"] = llm_error_payload
+    if sanitizer_fired:
+        message_kwargs["sanitized"] = sanitizer_fired
+    message_kwargs["usage"] = turn_usage_summary(state)
+
+    if (
+        answer_cache is not None
+        and not answer_timed_out
+        and not llm_error_payload
+        and not tool_calls_payload
+        and isinstance(content, str)
+        and content.strip()
+    ):
+        answer_cache.store(
+            answer_cache_scope,
+            answer_cache_question,
+            {"content": content, "quick_replies": quick_replies_payload or None},
+        )
 
     return {
         "messages": [
@@ -3064,7 +3253,7 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
 builder = StateGraph(OverallState, config_schema=Configuration)
 
 # Define the nodes we will cycle between (web_research removed for animation/video focus)
-builder.add_node("select_role", select_role)
+builder.add_node("select_role", instrument_node("select_role", select_role, starts_turn=True))
 
 
 def direct_answer(state: OverallState, config: RunnableConfig):
@@ -3087,27 +3276,41 @@ def kb_retrieve(state: OverallState, config: RunnableConfig) -> OverallState:
         if (time.monotonic() - started_at) >= REQUEST_TIMEOUT_SECONDS:
             return {}
 
-    # Build a compact summary query to avoid sending full thread history.
-    query = _build_autorag_query(state).strip()
-    if not query:
+    # Several compact queries (question / summary / canvas entities) instead of one blended one.
+    queries = _build_autorag_query_variants(state, max(1, int(configurable.rag_query_variants or 1)))
+    if not queries:
         return {}
+    query = queries[0]
 
     # Allow RAG retrieval even when search_provider is "disabled", as long as AutoRAG is configured.
     provider = (configurable.search_provider or "").strip().lower()
-    if provider not in ("", "disabled", "autorag"):
+    if provider not in ("", "disabled", "autorag", "local"):
         return {}
 
-    snippets, sources = _call_autorag_search(configurable, query)
+    # Variants run concurrently and are merged with reciprocal-rank fusion (dedup by source URL).
+    snippets, sources = _retrieve_fused(configurable, provider, queries)
     if not snippets:
         return {}
+    budget = int(configurable.rag_snippet_token_budget or 0)
+    if budget > 0:
+        # Score against the user's actual question; drop near-duplicates and stop at the budget.
+        snippets = select_snippets(
+            _get_last_user_text(state) or query,
+            snippets,
+            token_budget=budget,
+            mmr_lambda=float(configurable.rag_mmr_lambda),
+            dedup_threshold=float(configurable.rag_dedup_threshold),
+        )
+        # Only cite documents whose snippet the model actually sees.
+        sources = _sources_in_snippets(sources, snippets)
     return {
-        "search_query": [query],
+        "search_query": queries,
         "web_research_result": snippets,
         "sources_gathered": sources or [],
     }
 
-builder.add_node("direct_answer", direct_answer)
-builder.add_node("kb_retrieve", kb_retrieve)
+builder.add_node("direct_answer", instrument_node("direct_answer", direct_answer))
+builder.add_node("kb_retrieve", instrument_node("kb_retrieve", kb_retrieve))
 
 
 @traceable
@@ -3116,6 +3319,8 @@ def summarize_memory(state: OverallState, config: RunnableConfig) -> OverallStat
 
     This runs after answering. The summary is returned in `conversation_summary` and can be
     persisted by the frontend (e.g. in D1) to survive thread expiry/restarts.
+    With `memory_trim_max_messages` set, the folded messages are also removed from the
+    thread (see agent.memory_trim) so checkpoints stay bounded on long threads.
     """
     try:
         messages = state.get("messages") or []
@@ -3125,10 +3330,17 @@ def summarize_memory(state: OverallState, config: RunnableConfig) -> OverallStat
         tail_keep = 16
         if len(messages) <= tail_keep:
             return {}
-        rendered = format_messages_for_prompt(messages)
+        configurable = Configuration.from_runnable_config(config)
+        trim_max = max(0, int(configurable.memory_trim_max_messages or 0))
+        if trim_max > 0:
+            # A trim leaves tail_keep messages plus the pinned style lock; keep the limit a few
+            # turns above that, or every following turn would summarize and trim again.
+            trim_max = max(trim_max, tail_keep + 8)
+        over_trim_limit = trim_max > 0 and len(messages) > trim_max
+        rendered = "" if over_trim_limit else format_messages_for_prompt(messages)
         # Trigger only when the serialized history becomes large.
         trigger_chars = 120_000
-        if isinstance(rendered, str) and len(rendered) < trigger_chars:
+        if not over_trim_limit and isinstance(rendered, str) and len(rendered) < trigger_chars:
             # Still allow a first-time summary when the conversation is moderately long.
             if not (isinstance(state.get("conversation_summary"), str) and state.get("conversation_summary").strip()):
                 if len(messages) < 40:
@@ -3136,7 +3348,6 @@ def summarize_memory(state: OverallState, config: RunnableConfig) -> OverallStat
             else:
                 return {}
 
-        configurable = Configuration.from_runnable_config(config)
         llm_provider = resolve_llm_provider(configurable.llm_provider)
         model = getattr(configurable, "reflection_model", None) or configurable.answer_model
         prev = state.get("conversation_summary") or ""
@@ -3163,31 +3374,43 @@ def summarize_memory(state: OverallState, config: RunnableConfig) -> OverallStat
         new_summary = ""
         if llm_provider == "openai":
             client = get_openai_client()
-            try:
-                response = client.responses.create(
-                    model=model,
-                    input=[{"role": "user", "content": [{"type": "input_text", "text": prompt}]}],
-                    stream=True,
-                )
-                debug_openai_response("summarize_memory", response)
-                new_summary = _collect_stream_text(response)
-            except Exception as exc:
-                debug_openai_error("summarize_memory responses_fallback", exc)
-                chat = client.chat.completions.create(
-                    model=model,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0,
-                )
-                msg = chat.choices[0].message
-                new_summary = str(getattr(msg, "content", "") or "")
+            with llm_call("summarize_memory", model, "openai") as rec:
+                try:
+                    response = client.responses.create(
+                        model=model,
+                        input=[{"role": "user", "content": [{"type": "input_text", "text": prompt}]}],
+                        stream=True,
+                    )
+                    debug_openai_response("summarize_memory", response)
+                    new_summary = _collect_stream_text(rec.wrap_stream(response))
+                except Exception as exc:
+                    debug_openai_error("summarize_memory responses_fallback", exc)
+                    rec.path = "chat_fallback"
+                    chat = client.chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=0,
+                    )
+                    rec.record_response(chat)
+                    msg = chat.choices[0].message
+                    new_summary = str(getattr(msg, "content", "") or "")
         else:
-            llm = ChatGoogleGenerativeAI(
+            llm = _gemini_chat_model(
                 model=model,
                 temperature=0,
                 max_retries=2,
                 api_key=get_gemini_api_key(),
             )
-            new_summary = str(llm.invoke(prompt).content or "")
+            with llm_call("summarize_memory", model, "gemini") as rec:
+                summary_msg = record_or_replay(
+                    "gemini",
+                    {"call": "summarize_memory", "model": model, "prompt": prompt},
+                    lambda: llm.invoke(prompt),
+                    encode=_dump_gemini_message,
+                    decode=_load_gemini_message,
+                )
+                rec.record_response(summary_msg)
+            new_summary = str(summary_msg.content or "")
 
         if not isinstance(new_summary, str):
             return {}
@@ -3197,12 +3420,23 @@ def summarize_memory(state: OverallState, config: RunnableConfig) -> OverallStat
         # Clamp overly-long outputs defensively.
         if len(new_summary) > 2200:
             new_summary = new_summary[:2200].rstrip()
-        return {"conversation_summary": new_summary}
+        update: dict = {"conversation_summary": new_summary}
+        if trim_max > 0:
+            # The older messages now live in the summary; drop them from the checkpoint.
+            removals = trim_folded_messages(
+                messages,
+                keep_tail=tail_keep,
+                archive_dir=(configurable.memory_archive_dir or "").strip(),
+                thread_id=str(((config or {}).get("configurable") or {}).get("thread_id") or ""),
+            )
+            if removals:
+                update["messages"] = removals
+        return update
     except Exception:
         return {}
 
 
-builder.add_node("summarize_memory", summarize_memory)
+builder.add_node("summarize_memory", instrument_node("summarize_memory", summarize_memory))
 
 # Entrypoint: role selection then direct answer (no web search)
 builder.add_edge(START, "select_role")
@@ -0,0 +1,118 @@
+"""Shared keep-alive HTTP client for small internal JSON calls.
+
+The pooled client honours HTTP(S)_PROXY / NO_PROXY and the SSL_CERT_FILE / SSL_CERT_DIR
+environment like urllib does; set HTTP_TRUST_ENV=0 to reach internal endpoints directly
+and ignore the host proxy settings.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass
+
+import httpx
+
+# Shared keep-alive pool for small internal JSON calls (e.g. the Worker-side AutoRAG proxy).
+# Creating a fresh connection per call costs a TCP + TLS handshake on every retrieval.
+POOL_MAX_CONNECTIONS = 16
+POOL_MAX_KEEPALIVE = 8
+POOL_KEEPALIVE_EXPIRY_SECONDS = 60.0
+
+_client: httpx.Client | None = None
+_client_lock = threading.Lock()
+
+
+class ResponseTooLargeError(Exception):
+    """Raised when a response body exceeds the configured size limit."""
+
+
+@dataclass(frozen=True)
+class HttpResult:
+    """Status code and (size-capped) body of a completed request."""
+
+    status_code: int
+    body: bytes
+
+    @property
+    def ok(self) -> bool:
+        """Whether the status code is 2xx."""
+        return 200 <= self.status_code < 300
+
+    def text(self) -> str:
+        """Decode the body as UTF-8 (invalid bytes are replaced)."""
+        return self.body.decode("utf-8", errors="replace")
+
+
+def _trust_env() -> bool:
+    return (os.getenv("HTTP_TRUST_ENV") or "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def get_pooled_client() -> httpx.Client:
+    """Return the process-wide pooled HTTP client (created lazily)."""
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=POOL_KEEPALIVE_EXPIRY_SECONDS,
+                ),
+                trust_env=_trust_env(),
+            )
+    return _client
+
+
+def close_pooled_client() -> None:
+    """Close the shared client (mainly for tests/benchmarks and graceful shutdown)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def post_json(
+    url: str,
+    payload: bytes,
+    *,
+    headers: dict[str, str] | None = None,
+    connect_timeout: float = 5.0,
+    read_timeout: float = 20.0,
+    max_response_bytes: int = 2_000_000,
+) -> HttpResult:
+    """POST a JSON payload over the shared pool and return the (size-capped) body.
+
+    Raises httpx.HTTPError for transport failures and ResponseTooLargeError when the
+    body exceeds `max_response_bytes`. Non-2xx responses are returned, not raised.
+    """
+    timeout = httpx.Timeout(
+        connect=connect_timeout,
+        read=read_timeout,
+        write=read_timeout,
+        pool=connect_timeout,
+    )
+    request_headers = {"content-type": "application/json"}
+    if headers:
+        request_headers.update(headers)
+
+    client = get_pooled_client()
+    with client.stream("POST", url, content=payload, headers=request_headers, timeout=timeout) as resp:
+        declared = resp.headers.get("content-length")
+        if max_response_bytes > 0 and declared and declared.isdigit() and int(declared) > max_response_bytes:
+            raise ResponseTooLargeError(
+                f"response too large: {declared} bytes > limit {max_response_bytes}"
+            )
+        chunks: list[bytes] = []
+        size = 0
+        for chunk in resp.iter_bytes():
+            size += len(chunk)
+            if max_response_bytes > 0 and size > max_response_bytes:
+                raise ResponseTooLargeError(
+                    f"response too large: >{max_response_bytes} bytes"
+                )
+            chunks.append(chunk)
+        return HttpResult(status_code=resp.status_code, body=b"".join(chunks))
@@ -0,0 +1,102 @@
+"""Keyword intent features for the latest user turn, evaluated once per text.
+
+The routing and gating rules in graph.py check the same user text against many keyword
+groups (creation hints, lock confirmations, story cues, continuation phrases, opt-outs).
+`intent_features(text)` returns one cached object per text that every rule of the turn
+reads; each distinct keyword is searched at most once per text no matter how many groups
+share it, and a group stops at its first hit.
+
+Matching is exact substring matching (case-sensitive), equivalent to
+`any(k in text for k in group)` for each group.
+
+A single combined regex/trie pass was measured and rejected: on long CJK story pastes
+sre spends ~60ns per character (dense first-character hits such as 他/她/画), which is
+several times slower than the C substring search behind `in` for the keywords the rules
+actually consult.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+INTENT_KEYWORDS: dict[str, tuple[str, ...]] = {
+    # _looks_like_story_request
+    "story_intent": ("分镜", "九宫格", "故事板", "动画", "短片", "成片", "视频", "日漫", "2d", "2D"),
+    "story_narrative": ("“", "”", "他", "她", "他们", "忽然", "转身", "抬头", "回头", "是夜"),
+    # Story pipeline
+    "story_opt_out": ("先不操作画布", "不要操作画布", "只聊", "只写", "不要生成", "不生成"),
+    "story_wants_video": ("视频", "动画", "短片", "成片", "生成"),
+    "story_prop_sheet": ("线装书", "恶鬼", "画像"),
+    "turnaround": ("三视", "三视图", "角色三视", "角色三视图"),
+    # select_role tool gating
+    "explicit_execute": ("不用确认", "不必确认", "别问", "直接执行", "直接生成", "自动执行", "自执行", "run", "tool"),
+    "creation": (
+        "生成",
+        "创建",
+        "画",
+        "做",
+        "帮",
+        "续写",
+        "分镜",
+        "故事板",
+        "九宫格",
+        "视频",
+        "图片",
+        "改",
+        "调整",
+        "修改",
+        "连接",
+        "运行",
+    ),
+    # finalize_answer continuity gates
+    "continuation_topic": ("续写", "后续剧情", "接下来", "续作"),
+    "suggestion_ask": ("推荐", "方向", "灵感", "怎么写"),
+    "storyboard_or_15s": ("九宫格", "分镜", "故事板", "storyboard", "15s"),
+    "storyboard_explicit": ("九宫格", "分镜图", "故事板", "storyboard"),
+    "generate_verb": ("生成", "出", "做成"),
+    "generation_target": ("分镜", "九宫格", "故事板", "图片", "生图", "视频", "15s", "15秒"),
+    "lock_confirmation": ("确认锁定", "锁定场景", "锁定主体", "锁定风格", "确认风格", "风格锁定", "我确认", "确认："),
+    "implicit_lock": ("继续", "按你给的", "就按这个", "照这个来", "不用确认", "直接生成", "别问了"),
+    "continuation_step": ("我选择方向", "自定义续写", "续写"),
+    "wants_storyboard": ("分镜", "故事板", "storyboard", "九宫格", "15s"),
+    "reference": ("基于", "同款", "同风格", "沿用", "续写", "延展", "变体", "参考", "保持一致"),
+}
+
+
+class IntentFeatures:
+    """Keyword groups present in one text; `has(group)` mirrors `any(k in text ...)`."""
+
+    __slots__ = ("text", "_keywords", "_groups")
+
+    def __init__(self, text: str) -> None:
+        """Wrap `text`; keywords and groups are evaluated lazily and memoized."""
+        self.text = text
+        self._keywords: dict[str, bool] = {}
+        self._groups: dict[str, bool] = {}
+
+    def contains(self, keyword: str) -> bool:
+        """Return whether `keyword` occurs in the text."""
+        found = self._keywords.get(keyword)
+        if found is None:
+            found = self._keywords[keyword] = keyword in self.text
+        return found
+
+    def has(self, group: str) -> bool:
+        """Return whether any keyword of `group` occurs in the text; unknown groups raise KeyError."""
+        found = self._groups.get(group)
+        if found is None:
+            keywords = INTENT_KEYWORDS.get(group)
+            if keywords is None:
+                raise KeyError(f"Unknown intent keyword group: {group}")
+            found = self._groups[group] = any(self.contains(k) for k in keywords)
+        return found
+
+    def flags(self) -> frozenset[str]:
+        """Every group present in the text (evaluates all groups)."""
+        return frozenset(group for group in INTENT_KEYWORDS if self.has(group))
+
+
+@lru_cache(maxsize=128)
+def intent_features(text: str | None) -> IntentFeatures:
+    """Shared, lazily evaluated intent features for `text` (cached per text)."""
+    return IntentFeatures(text if isinstance(text, str) else "")
@@ -0,0 +1,282 @@
+"""Local embedded vector index (search_provider="local").
+
+Offline build over a directory of project/KB documents, memory-mapped vectors for
+fast startup, brute-force or IVF top-k search. Results use the AutoRAG result shape
+(`{"sources": [{title, url, text, score}]}`) so `_autorag_normalize_result` applies.
+
+Embeddings come from a deterministic feature-hashing embedder (word tokens + CJK
+character uni/bi-grams), so no model download or network access is required.
+
+Usage:
+    python -m agent.local_index build --docs ./kb --out ./.kb_index [--ivf-lists 64]
+    python -m agent.local_index query --index ./.kb_index "九宫格怎么连视频"
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from agent.embeddings import DEFAULT_DIM, HashingEmbedder
+
+INDEX_FORMAT_VERSION = 1
+DOC_SUFFIXES = (".md", ".markdown", ".txt", ".rst")
+
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+CHUNKS_FILE = "chunks.jsonl"
+CENTROIDS_FILE = "ivf_centroids.npy"
+OFFSETS_FILE = "ivf_offsets.npy"
+
+
+def _chunk_text(text: str, *, max_chars: int, overlap: int) -> list[str]:
+    """Split on blank lines, packing paragraphs into chunks of at most max_chars."""
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    chunks: list[str] = []
+    current = ""
+    for para in paragraphs:
+        while len(para) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(para[:max_chars])
+            para = para[max_chars - overlap :] if overlap < max_chars else para[max_chars:]
+        if current and len(current) + len(para) + 2 > max_chars:
+            chunks.append(current)
+            tail = current[-overlap:] if overlap > 0 else ""
+            current = (tail + "\n\n" + para).strip() if tail else para
+        else:
+            current = (current + "\n\n" + para).strip() if current else para
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _title_for(path: Path, text: str) -> str:
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            return line.lstrip("#").strip()[:120] or path.stem
+    return path.stem
+
+
+def _kmeans(vectors: np.ndarray, k: int, *, iterations: int = 12, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means (cosine) returning (centroids, assignments)."""
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    centroids = vectors[rng.choice(n, size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+        for c in range(k):
+            members = vectors[assign == c]
+            if len(members) == 0:
+                centroids[c] = vectors[rng.integers(n)]
+                continue
+            mean = members.sum(axis=0)
+            norm = np.linalg.norm(mean)
+            centroids[c] = mean / norm if norm > 0 else mean
+    # The last update (including reseeded empty clusters) moved the centroids, so assign
+    # against the final ones; IVF probes by centroid and must find each vector's list.
+    centroids = centroids.astype(np.float32)
+    assign = np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+    return centroids, assign
+
+
+def build_index(
+    docs_dir: str | os.PathLike,
+    out_dir: str | os.PathLike,
+    *,
+    dim: int = DEFAULT_DIM,
+    ivf_lists: int = 0,
+    chunk_chars: int = 800,
+    chunk_overlap: int = 120,
+) -> dict:
+    """Build an index from every document under `docs_dir` and return its manifest."""
+    docs_path = Path(docs_dir)
+    out_path = Path(out_dir)
+    out_path.mkdir(parents=True, exist_ok=True)
+
+    records: list[dict] = []
+    for path in sorted(p for p in docs_path.rglob("*") if p.is_file() and p.suffix.lower() in DOC_SUFFIXES):
+        text = path.read_text(encoding="utf-8", errors="replace")
+        title = _title_for(path, text)
+        rel = path.relative_to(docs_path).as_posix()
+        for idx, chunk in enumerate(_chunk_text(text, max_chars=chunk_chars, overlap=chunk_overlap)):
+            records.append({"title": title, "url": f"kb://{rel}#{idx}", "text": chunk})
+
+    embedder = HashingEmbedder(dim)
+    vectors = embedder.embed_many([f"{r['title']}\n{r['text']}" for r in records])
+
+    lists = min(int(ivf_lists or 0), len(records))
+    offsets: np.ndarray | None = None
+    centroids: np.ndarray | None = None
+    if lists > 1:
+        centroids, assign = _kmeans(vectors, lists)
+        # Store vectors grouped by list so each IVF probe reads one contiguous mmap slice.
+        order = np.argsort(assign, kind="stable")
+        vectors = vectors[order]
+        records = [records[i] for i in order]
+        counts = np.bincount(assign, minlength=lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    np.save(out_path / VECTORS_FILE, vectors)
+    with open(out_path / CHUNKS_FILE, "w", encoding="utf-8") as fh:
+        for r in records:
+            fh.write(json.dumps(r, ensure_ascii=False) + "\n")
+    for name in (CENTROIDS_FILE, OFFSETS_FILE):
+        (out_path / name).unlink(missing_ok=True)
+    if centroids is not None and offsets is not None:
+        np.save(out_path / CENTROIDS_FILE, centroids)
+        np.save(out_path / OFFSETS_FILE, offsets)
+
+    manifest = {
+        "version": INDEX_FORMAT_VERSION,
+        "embedder": embedder.name,
+        "dim": dim,
+        "count": len(records),
+        "ivf_lists": lists if lists > 1 else 0,
+        "built_at": int(time.time()),
+    }
+    (out_path / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return manifest
+
+
+@dataclass
+class LocalVectorIndex:
+    """A built index loaded from disk (vectors memory-mapped, optional IVF lists)."""
+
+    manifest: dict
+    vectors: np.ndarray
+    chunks: list[dict]
+    centroids: np.ndarray | None
+    offsets: np.ndarray | None
+    embedder: HashingEmbedder
+
+    @classmethod
+    def load(cls, index_dir: str | os.PathLike) -> LocalVectorIndex:
+        """Load the index written by `build_index` from `index_dir`."""
+        path = Path(index_dir)
+        manifest = json.loads((path / MANIFEST_FILE).read_text(encoding="utf-8"))
+        if manifest.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported local index version: {manifest.get('version')}")
+        vectors = np.load(path / VECTORS_FILE, mmap_mode="r")
+        with open(path / CHUNKS_FILE, encoding="utf-8") as fh:
+            chunks = [json.loads(line) for line in fh if line.strip()]
+        centroids = offsets = None
+        if manifest.get("ivf_lists"):
+            centroids = np.load(path / CENTROIDS_FILE)
+            offsets = np.load(path / OFFSETS_FILE)
+        return cls(
+            manifest=manifest,
+            vectors=vectors,
+            chunks=chunks,
+            centroids=centroids,
+            offsets=offsets,
+            embedder=HashingEmbedder(int(manifest.get("dim") or DEFAULT_DIM)),
+        )
+
+    def search(self, query: str, *, top_k: int = 6, nprobe: int = 4) -> list[tuple[float, dict]]:
+        """Return up to `top_k` (cosine score, chunk) pairs, probing `nprobe` IVF lists."""
+        if not self.chunks or not query.strip():
+            return []
+        q = self.embedder.embed(query)
+        if self.centroids is not None and self.offsets is not None:
+            probe = min(max(1, nprobe), len(self.centroids))
+            lists = np.argpartition(-(self.centroids @ q), probe - 1)[:probe]
+            spans = [(int(self.offsets[c]), int(self.offsets[c + 1])) for c in lists]
+            spans = [(a, b) for a, b in spans if b > a]
+            if not spans:
+                return []
+            ids = np.concatenate([np.arange(a, b) for a, b in spans])
+            scores = np.concatenate([np.asarray(self.vectors[a:b] @ q) for a, b in spans])
+        else:
+            ids = None
+            scores = np.asarray(self.vectors @ q)
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        out: list[tuple[float, dict]] = []
+        for i in top:
+            row = int(ids[i]) if ids is not None else int(i)
+            out.append((float(scores[i]), self.chunks[row]))
+        return out
+
+
+_loaded: dict[str, tuple[float, LocalVectorIndex]] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_index(index_dir: str) -> LocalVectorIndex:
+    """Load (or reuse) an index; reloads automatically when the manifest is rebuilt."""
+    key = str(Path(index_dir).resolve())
+    mtime = os.stat(Path(key) / MANIFEST_FILE).st_mtime
+    with _loaded_lock:
+        cached = _loaded.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    index = LocalVectorIndex.load(key)
+    with _loaded_lock:
+        _loaded[key] = (mtime, index)
+    return index
+
+
+def search_local_index(index_dir: str, query: str, *, top_k: int = 6, nprobe: int = 4) -> dict:
+    """Search a local index and return an AutoRAG-shaped result dict."""
+    index = load_index(index_dir)
+    hits = index.search(query, top_k=top_k, nprobe=nprobe)
+    return {
+        "sources": [
+            {"title": chunk.get("title"), "url": chunk.get("url"), "text": chunk.get("text"), "score": score}
+            for score, chunk in hits
+        ]
+    }
+
+
+def main() -> None:
+    """Build or query an index from the command line."""
+    parser = argparse.ArgumentParser(description="Build or query the local KB vector index")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Build an index from a directory of documents")
+    build.add_argument("--docs", required=True, help="Directory with .md/.txt/.rst documents")
+    build.add_argument("--out", required=True, help="Output index directory")
+    build.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    build.add_argument("--ivf-lists", type=int, default=0, help="IVF list count (0 = brute force)")
+    build.add_argument("--chunk-chars", type=int, default=800)
+    build.add_argument("--chunk-overlap", type=int, default=120)
+
+    query = sub.add_parser("query", help="Query an index")
+    query.add_argument("--index", required=True)
+    query.add_argument("--top-k", type=int, default=6)
+    query.add_argument("--nprobe", type=int, default=4)
+    query.add_argument("text")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        started = time.monotonic()
+        manifest = build_index(
+            args.docs,
+            args.out,
+            dim=args.dim,
+            ivf_lists=args.ivf_lists,
+            chunk_chars=args.chunk_chars,
+            chunk_overlap=args.chunk_overlap,
+        )
+        sys.stdout.write(json.dumps({**manifest, "seconds": round(time.monotonic() - started, 3)}, ensure_ascii=False) + "\n")
+        return
+    result = search_local_index(args.index, args.text, top_k=args.top_k, nprobe=args.nprobe)
+    for src in result["sources"]:
+        sys.stdout.write(f"{src['score']:.3f}  {src['url']}  {src['title']}\n")
+
+
+if __name__ == "__main__":
+    main()
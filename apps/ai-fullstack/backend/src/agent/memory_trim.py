@@ -0,0 +1,85 @@
+"""Summary-aware trimming of the checkpointed message history.
+
+`OverallState.messages` uses add_messages, so every turn appends to the thread and every
+checkpoint write re-serializes the whole history, although prompts only read the last
+few turns plus `conversation_summary`. Once summarize_memory has folded the older
+messages into the summary, `trim_folded_messages` returns RemoveMessage updates for them
+so the checkpoint keeps a bounded tail.
+
+The latest user message carrying a style lock ("确认锁定风格：..." etc.) is kept even when
+it is folded, because finalize_answer still looks the lock up in the history.
+
+Folded messages can be appended to a cold-storage archive first
+(`<archive_dir>/<thread_id>.jsonl`, one serialized message per line). If the archive write
+fails, nothing is removed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any
+
+from langchain_core.messages import RemoveMessage, message_to_dict
+
+STYLE_LOCK_KEYS = ("确认锁定风格：", "风格锁定：", "锁定风格：")
+
+_UNSAFE_PATH_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def _is_user(message: Any) -> bool:
+    return getattr(message, "type", None) == "human" or getattr(message, "role", None) == "user"
+
+
+def _has_style_lock(message: Any) -> bool:
+    if not _is_user(message):
+        return False
+    text = str(getattr(message, "content", "") or "")
+    return any(key in text for key in STYLE_LOCK_KEYS)
+
+
+def folded_messages(messages: list, keep_tail: int) -> list:
+    """Messages before the last `keep_tail` ones, minus the pinned style-lock message."""
+    cut = len(messages) - max(0, keep_tail)
+    if cut <= 0:
+        return []
+    pinned = None
+    for index in range(len(messages) - 1, -1, -1):
+        if _has_style_lock(messages[index]):
+            pinned = index
+            break
+    return [m for index, m in enumerate(messages[:cut]) if index != pinned]
+
+
+def archive_messages(archive_dir: str, thread_id: str, messages: list) -> Path:
+    """Append `messages` to the thread's JSONL archive and return its path."""
+    name = _UNSAFE_PATH_CHARS.sub("_", str(thread_id or "")).strip("._") or "no-thread"
+    path = Path(archive_dir) / f"{name}.jsonl"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [json.dumps(message_to_dict(m), ensure_ascii=False, default=str) for m in messages]
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write("\n".join(lines) + "\n")
+        fh.flush()
+        os.fsync(fh.fileno())
+    return path
+
+
+def trim_folded_messages(
+    messages: list,
+    *,
+    keep_tail: int,
+    archive_dir: str = "",
+    thread_id: str = "",
+) -> list[RemoveMessage]:
+    """RemoveMessage updates for the messages already folded into the summary."""
+    folded = [m for m in folded_messages(messages, keep_tail) if getattr(m, "id", None)]
+    if not folded:
+        return []
+    if archive_dir:
+        try:
+            archive_messages(archive_dir, thread_id, folded)
+        except (OSError, TypeError, ValueError):
+            return []
+    return [RemoveMessage(id=m.id) for m in folded]
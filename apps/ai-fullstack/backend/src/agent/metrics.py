@@ -0,0 +1,437 @@
+"""In-process latency/usage metrics rendered in the Prometheus text format.
+
+Kept dependency-free (no prometheus_client): a small registry of labeled counters
+and histograms, a node wrapper for graph timings, and `llm_call()` to record one
+model call (TTFT, total time, stream chunks, tokens, path taken). Finished calls are
+also handed to `agent.usage` for per-turn and per-thread accounting.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import math
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+from agent.debug_log import correlation
+from agent.profiling import profile_node, profile_requested
+from agent.usage import collect_node_calls, estimate_cost_usd, record_call
+
+NODE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+CHUNK_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+_INF_LE = 'le="+Inf"'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "") or "") for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic counter, exported as `<name>_total`."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> None:
+        """Create a counter with the given label names."""
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """Add `amount` (>= 0) to the series selected by `labels`."""
+        if amount < 0:
+            raise ValueError("Counters can only increase.")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        """Return the current value of the series selected by `labels`."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}_total{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed bucket bounds plus `_sum` and `_count`."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = NODE_BUCKETS,
+    ) -> None:
+        """Create a histogram with the given label names and upper bucket bounds."""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        # Per label set: [bucket counts..., sum, count]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """Record one observation in the series selected by `labels`."""
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def snapshot(self, **labels: Any) -> dict[str, float]:
+        """Return the `sum` and `count` of the series selected by `labels`."""
+        with self._lock:
+            row = list(self._values.get(self._key(labels)) or [0.0] * (len(self.buckets) + 2))
+        return {"sum": row[-2], "count": row[-1]}
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines: list[str] = []
+        for key, row in items:
+            for i, bound in enumerate(self.buckets):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(row[i])}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, _INF_LE)} {_format_value(row[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(row[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(row[-1])}")
+        return lines
+
+
+_M = TypeVar("_M", bound=_Metric)
+
+
+class Registry:
+    """Ordered set of metrics rendered together for the /metrics endpoint."""
+
+    def __init__(self) -> None:
+        """Create an empty registry."""
+        self._metrics: list[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _M) -> _M:
+        """Add `metric` to the registry and return it."""
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Render every registered metric in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+_LLM_LABELS = ("node", "call", "model", "provider", "interaction_mode", "path")
+
+NODE_DURATION = REGISTRY.register(
+    Histogram(
+        "tapcanvas_node_duration_seconds",
+        "Wall-clock time spent in each graph node.",
+        ("node", "interaction_mode", "outcome"),
+        NODE_BUCKETS,
+    )
+)
+LLM_TTFT = REGISTRY.register(
+    Histogram(
+        "tapcanvas_llm_ttft_seconds",
+        "Time from request start to the first streamed output chunk.",
+        _LLM_LABELS,
+        LLM_BUCKETS,
+    )
+)
+LLM_DURATION = REGISTRY.register(
+    Histogram("tapcanvas_llm_duration_seconds", "Total time of a model call.", _LLM_LABELS, LLM_BUCKETS)
+)
+LLM_CHUNKS = REGISTRY.register(
+    Histogram("tapcanvas_llm_stream_chunks", "Stream events received per model call.", _LLM_LABELS, CHUNK_BUCKETS)
+)
+LLM_CALLS = REGISTRY.register(
+    Counter(
+        "tapcanvas_llm_calls",
+        "Model calls by path (responses, chat_fallback, gemini) and outcome.",
+        _LLM_LABELS + ("outcome",),
+    )
+)
+LLM_TOKENS = REGISTRY.register(
+    Counter(
+        "tapcanvas_llm_tokens",
+        "Tokens reported by the provider (kind: input, output, cached, reasoning).",
+        ("node", "model", "provider", "interaction_mode", "kind"),
+    )
+)
+LLM_COST = REGISTRY.register(
+    Counter(
+        "tapcanvas_llm_cost_usd",
+        "Estimated spend for models priced in LLM_PRICES_JSON.",
+        ("node", "model", "provider", "interaction_mode"),
+    )
+)
+
+_interaction_mode: contextvars.ContextVar[str] = contextvars.ContextVar("tapcanvas_interaction_mode", default="")
+_node_name: contextvars.ContextVar[str] = contextvars.ContextVar("tapcanvas_node_name", default="")
+
+
+def current_interaction_mode() -> str:
+    """Return the interaction_mode of the graph node currently running, if any."""
+    return _interaction_mode.get()
+
+
+def instrument_node(name: str, fn: Callable, *, starts_turn: bool = False) -> Callable:
+    """Wrap a graph node so its duration is observed (and interaction_mode is visible to LLM metrics).
+
+    LLM calls made inside the node are appended to the `turn_usage` state key; the
+    node that `starts_turn` (the graph entry) resets it.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(state, config):
+        mode = state.get("interaction_mode") if isinstance(state, dict) else None
+        token = _interaction_mode.set(mode if isinstance(mode, str) and mode else _interaction_mode.get())
+        node_token = _node_name.set(name)
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        run_id = (config or {}).get("run_id") or ((config or {}).get("metadata") or {}).get("run_id")
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            profiler = profile_node(name, config, starts_turn=starts_turn) if profile_requested(config) else nullcontext()
+            with collect_node_calls(thread_id) as calls, correlation(thread_id=thread_id, run_id=run_id, node=name), profiler:
+                result = fn(state, config)
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            NODE_DURATION.observe(
+                time.perf_counter() - started,
+                node=name,
+                interaction_mode=_interaction_mode.get(),
+                outcome=outcome,
+            )
+            _node_name.reset(node_token)
+            _interaction_mode.reset(token)
+        if isinstance(result, dict) and (calls or starts_turn):
+            prior = [] if starts_turn else list(state.get("turn_usage") or [])
+            result = {**result, "turn_usage": prior + calls}
+        return result
+
+    return wrapper
+
+
+def _get(obj: Any, name: str) -> Any:
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def _as_int(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _first_detail(details: Any, *names: str) -> Any:
+    if details is None:
+        return None
+    for name in names:
+        value = _get(details, name)
+        if value is not None:
+            return value
+    return None
+
+
+def extract_usage(obj: Any) -> dict[str, int] | None:
+    """Normalize provider usage (Responses, Chat Completions, Gemini usage_metadata).
+
+    Returns input/output/cached/reasoning token counts; reasoning is a subset of output.
+    """
+    if obj is None:
+        return None
+    if _get(obj, "input_tokens") is not None or _get(obj, "output_tokens") is not None:
+        input_details = _get(obj, "input_tokens_details") or _get(obj, "input_token_details")
+        output_details = _get(obj, "output_tokens_details") or _get(obj, "output_token_details")
+        return {
+            "input": _as_int(_get(obj, "input_tokens")),
+            "output": _as_int(_get(obj, "output_tokens")),
+            "cached": _as_int(_first_detail(input_details, "cached_tokens", "cache_read")),
+            "reasoning": _as_int(_first_detail(output_details, "reasoning_tokens", "reasoning")),
+        }
+    if _get(obj, "prompt_tokens") is not None or _get(obj, "completion_tokens") is not None:
+        return {
+            "input": _as_int(_get(obj, "prompt_tokens")),
+            "output": _as_int(_get(obj, "completion_tokens")),
+            "cached": _as_int(_first_detail(_get(obj, "prompt_tokens_details"), "cached_tokens")),
+            "reasoning": _as_int(_first_detail(_get(obj, "completion_tokens_details"), "reasoning_tokens")),
+        }
+    return None
+
+
+class LLMCallRecorder:
+    """Collects timings for one model call; see `llm_call()`."""
+
+    def __init__(self, call: str, model: str, provider: str) -> None:
+        """Start timing a call; node and interaction_mode come from the running node."""
+        self.node = _node_name.get()
+        self.call = call
+        self.model = model or ""
+        self.provider = provider or ""
+        self.interaction_mode = current_interaction_mode()
+        self.path = "responses" if provider == "openai" else provider
+        self.started = time.perf_counter()
+        self.first_chunk_at: float | None = None
+        self.chunks = 0
+        self.usage: dict[str, int] | None = None
+        # Callers that swallow provider errors set this to "error" themselves.
+        self.outcome = "ok"
+
+    def mark_first_output(self) -> None:
+        """Note the time of the first output chunk (time to first token)."""
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+
+    def record_usage(self, usage: Any) -> None:
+        """Keep the provider-reported token usage, if it can be normalized."""
+        normalized = extract_usage(usage)
+        if normalized is not None:
+            self.usage = normalized
+
+    def record_response(self, response: Any) -> None:
+        """Record usage from a non-streamed response (chat completion / Gemini message)."""
+        usage = _get(response, "usage") or _get(response, "usage_metadata")
+        self.record_usage(usage)
+
+    def wrap_stream(self, stream: Iterable) -> Iterator:
+        """Yield events unchanged while counting chunks, TTFT and the final usage."""
+        for event in stream:
+            self.chunks += 1
+            ev_type = _get(event, "type")
+            if isinstance(ev_type, str):
+                if ev_type.endswith(".delta"):
+                    self.mark_first_output()
+                elif ev_type == "response.completed":
+                    self.record_usage(_get(_get(event, "response"), "usage"))
+            elif _get(event, "choices"):
+                self.mark_first_output()
+                if _get(event, "usage") is not None:
+                    self.record_usage(_get(event, "usage"))
+            yield event
+
+    def labels(self) -> dict[str, str]:
+        """Return the label set shared by this call's metrics."""
+        return {
+            "node": self.node,
+            "call": self.call,
+            "model": self.model,
+            "provider": self.provider,
+            "interaction_mode": self.interaction_mode,
+            "path": self.path,
+        }
+
+    def finish(self, outcome: str) -> None:
+        """Observe duration, TTFT, chunks, tokens and cost, and record the call for usage totals."""
+        labels = self.labels()
+        duration = time.perf_counter() - self.started
+        LLM_DURATION.observe(duration, **labels)
+        if self.first_chunk_at is not None:
+            LLM_TTFT.observe(self.first_chunk_at - self.started, **labels)
+        if self.chunks:
+            LLM_CHUNKS.observe(self.chunks, **labels)
+        LLM_CALLS.inc(outcome=outcome, **labels)
+        usage = self.usage or {}
+        cost = estimate_cost_usd(self.model, usage) if usage else None
+        usage_labels = {
+            "node": self.node,
+            "model": self.model,
+            "provider": self.provider,
+            "interaction_mode": self.interaction_mode,
+        }
+        for kind in ("input", "output", "cached", "reasoning"):
+            amount = usage.get(kind) or 0
+            if amount:
+                LLM_TOKENS.inc(amount, kind=kind, **usage_labels)
+        if cost:
+            LLM_COST.inc(cost, **usage_labels)
+        record_call(
+            {
+                **labels,
+                "outcome": outcome,
+                "latency_ms": round(duration * 1000, 3),
+                "ttft_ms": round((self.first_chunk_at - self.started) * 1000, 3) if self.first_chunk_at is not None else None,
+                **{kind: int(usage.get(kind) or 0) for kind in ("input", "output", "cached", "reasoning")},
+                "usage_reported": bool(self.usage),
+                "cost_usd": cost,
+            }
+        )
+
+
+@contextmanager
+def llm_call(call: str, model: str, provider: str) -> Iterator[LLMCallRecorder]:
+    """Record one model call. Set `rec.path` when a fallback path is taken.
+
+    Streams must be consumed (via `rec.wrap_stream`) inside the `with` block so the
+    total time covers the full generation.
+    """
+    rec = LLMCallRecorder(call, model, provider)
+    try:
+        yield rec
+    except BaseException:
+        rec.finish("error")
+        raise
+    rec.finish(rec.outcome)
+
+
+def render_metrics() -> str:
+    """Render the default registry in the Prometheus text format."""
+    return REGISTRY.render()
@@ -0,0 +1,186 @@
+"""On-demand sampling profiler for individual graph runs.
+
+Enabled per run with `configurable.profile_run=true`, the `x-tapcanvas-profile: 1`
+request header (forwarded via langgraph.json `configurable_headers`) or PROFILE_RUN=1.
+While an instrumented node runs, a background thread samples that node's stack with
+`sys._current_frames()`; samples from all nodes of the run are merged and written to
+`<profile_dir>/<thread_id>/<run_id>/`:
+
+  stacks.folded  flamegraph.pl / speedscope compatible folded stacks ("a;b;c count")
+  summary.txt    per-node wall time plus top-N functions by self and total samples
+
+When the toggle is off, instrument_node only does a dict lookup per node.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+DEFAULT_PROFILE_DIR = ".profiles"
+DEFAULT_INTERVAL_MS = 5.0
+PROFILE_HEADER = "x-tapcanvas-profile"
+TOP_N = 30
+_MAX_SESSIONS = 64
+_TRUTHY = ("1", "true", "yes", "on")
+_UNSAFE_PATH_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def profile_requested(config: Any) -> bool:
+    """Return whether this run asked for profiling (config, request header or PROFILE_RUN)."""
+    configurable = (config or {}).get("configurable") or {}
+    for value in (configurable.get("profile_run"), configurable.get(PROFILE_HEADER), os.environ.get("PROFILE_RUN")):
+        if value is True or (isinstance(value, str) and value.strip().lower() in _TRUTHY):
+            return True
+    return False
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Sample one thread's Python stack at a fixed interval into folded-stack counts."""
+
+    def __init__(self, thread_ident: int, interval_s: float, root: str) -> None:
+        """Prepare a sampler for `thread_ident`; stacks are rooted at `root`."""
+        self.thread_ident = thread_ident
+        self.interval_s = max(0.0005, interval_s)
+        self.root = root
+        self.counts: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{root}", daemon=True)
+
+    def _run(self) -> None:
+        sampler_ident = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_ident)
+            if frame is None or self.thread_ident == sampler_ident:
+                continue
+            stack: list[str] = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(self.root)
+            self.counts[";".join(reversed(stack))] += 1
+
+    def start(self) -> StackSampler:
+        """Start sampling on a daemon thread."""
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter[str]:
+        """Stop sampling and return the folded-stack counts."""
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+
+class RunProfile:
+    """Merged samples for one run, rewritten to disk after every profiled node."""
+
+    def __init__(self, path: Path, interval_s: float) -> None:
+        """Create an empty profile written under the `path` directory."""
+        self.path = path
+        self.interval_s = interval_s
+        self.counts: Counter[str] = Counter()
+        self.node_seconds: list[tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, node: str, counts: Counter[str], seconds: float) -> None:
+        """Merge one node's samples and wall time."""
+        with self._lock:
+            self.counts.update(counts)
+            self.node_seconds.append((node, seconds))
+
+    def summary(self) -> str:
+        """Render node timings and the top self/inclusive frames as text."""
+        with self._lock:
+            counts = Counter(self.counts)
+            node_seconds = list(self.node_seconds)
+        total = sum(counts.values())
+        self_counts: Counter[str] = Counter()
+        total_counts: Counter[str] = Counter()
+        for stack, n in counts.items():
+            frames = stack.split(";")[1:]  # drop the node root
+            if frames:
+                self_counts[frames[-1]] += n
+            for frame in set(frames):
+                total_counts[frame] += n
+        lines = [f"samples={total} interval_ms={self.interval_s * 1000:g}", "", "nodes (wall seconds):"]
+        lines += [f"  {node:<24} {seconds:9.3f}" for node, seconds in node_seconds]
+
+        def table(title: str, counter: Counter[str]) -> list[str]:
+            rows = ["", f"top {TOP_N} by {title}:", f"  {'samples':>8} {'pct':>6}  function"]
+            for frame, n in counter.most_common(TOP_N):
+                rows.append(f"  {n:>8} {100.0 * n / total if total else 0.0:>5.1f}%  {frame}")
+            return rows
+
+        lines += table("self samples", self_counts)
+        lines += table("total samples (inclusive)", total_counts)
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> None:
+        """Write `stacks.folded` and `summary.txt` to the profile directory."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            folded = "".join(f"{stack} {n}\n" for stack, n in sorted(self.counts.items()))
+        (self.path / "stacks.folded").write_text(folded, encoding="utf-8")
+        (self.path / "summary.txt").write_text(self.summary(), encoding="utf-8")
+
+
+_sessions: OrderedDict[tuple[str, str], RunProfile] = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def _safe(part: str) -> str:
+    return _UNSAFE_PATH_CHARS.sub("_", part).strip("._") or "unknown"
+
+
+def _session(config: Any, starts_turn: bool) -> RunProfile:
+    config = config or {}
+    configurable = config.get("configurable") or {}
+    thread_id = str(configurable.get("thread_id") or "no-thread")
+    run_id = str(config.get("run_id") or (config.get("metadata") or {}).get("run_id") or "")
+    key = (thread_id, run_id)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        # Local runs have no run id: the entry node starts a fresh profile per turn.
+        if session is None or (starts_turn and not run_id):
+            base = Path(str(configurable.get("profile_dir") or os.environ.get("PROFILE_DIR") or DEFAULT_PROFILE_DIR))
+            name = run_id or time.strftime("turn-%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+            try:
+                interval_ms = float(configurable.get("profile_interval_ms") or os.environ.get("PROFILE_INTERVAL_MS") or DEFAULT_INTERVAL_MS)
+            except (TypeError, ValueError):
+                interval_ms = DEFAULT_INTERVAL_MS
+            session = RunProfile(base / _safe(thread_id) / _safe(name), interval_ms / 1000.0)
+            _sessions[key] = session
+        _sessions.move_to_end(key)
+        while len(_sessions) > _MAX_SESSIONS:
+            _sessions.popitem(last=False)
+    return session
+
+
+@contextmanager
+def profile_node(name: str, config: Any, *, starts_turn: bool = False) -> Iterator[None]:
+    """Sample the current thread while one node runs and merge into the run's profile."""
+    session = _session(config, starts_turn)
+    sampler = StackSampler(threading.get_ident(), session.interval_s, root=name).start()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        counts = sampler.stop()
+        session.add(name, counts, time.perf_counter() - started)
+        try:
+            session.write()
+        except OSError:
+            pass
@@ -0,0 +1,271 @@
+"""Import-time registry of static prompt assets (tool schemas, structured-output schemas).
+
+Tool definitions per role and structured-output JSON schemas are built and serialized
+once, then shared by every call. Each asset carries a content hash of its canonical JSON,
+used as the OpenAI `prompt_cache_key` when `openai_prompt_cache_key` is enabled so that
+requests sharing the same static prefix are routed to the same prompt cache.
+
+Shared dicts/lists must be treated as read-only by callers.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+from agent.roles import DEFAULT_ROLE_ID, ROLE_DEFINITIONS, normalize_role_id
+from agent.tools_and_schemas import CharacterExtraction, RoleDecision, SafetyDecision
+
+ROLE_ALLOWED_CANVAS_TOOLS: dict[str, frozenset[str]] = {
+    # Creative operators
+    "storyboard_artist": frozenset({"createNode", "updateNode", "connectNodes", "runNode"}),
+    "character_designer": frozenset({"createNode", "updateNode", "connectNodes", "runNode"}),
+    "scene_designer": frozenset({"createNode", "updateNode", "connectNodes", "runNode"}),
+    # Governance / writing-only roles
+    "art_director": frozenset(),
+    "screenwriter": frozenset(),
+    "product_designer": frozenset(),
+    "music_director": frozenset(),
+    # Safety rewrite role: should not mutate canvas unless explicitly requested/confirmed
+    "magician": frozenset(),
+}
+
+
+def content_hash(value: Any) -> str:
+    """Short, stable hash of a JSON-serializable value (key order independent)."""
+    canonical = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def _canvas_tool_definitions() -> list[dict]:
+    """Canvas tools exposed to the LLM for function calling (frontends will execute).
+
+    NOTE: Responses API expects function tools in the flat shape:
+    {type: 'function', name, description?, parameters, strict?}
+    """
+    config_schema = {
+        "type": "object",
+        "description": "节点 data 配置（会写入 node.data）。常用字段：kind、prompt、negativePrompt、systemPrompt、keywords、imageModel/videoModel 等。",
+        "properties": {
+            "kind": {
+                "type": "string",
+                "description": "任务类型（通常由 type 推导），例如 image/textToImage/composeVideo/video。",
+            },
+            "prompt": {"type": "string", "description": "主提示词"},
+            "negativePrompt": {"type": "string", "description": "负面提示词"},
+            "systemPrompt": {"type": "string", "description": "系统提示词/风格基准"},
+            "keywords": {
+                "type": ["string", "array"],
+                "items": {"type": "string"},
+                "description": "关键词（可用逗号分隔字符串或数组）",
+            },
+            "imageModel": {"type": "string", "description": "图像模型（可选）"},
+            "videoModel": {"type": "string", "description": "视频模型（可选）"},
+        },
+        "additionalProperties": True,
+    }
+    return [
+        {
+            "type": "function",
+            "name": "createNode",
+            "description": "创建画布节点（仅支持 image/textToImage/composeVideo/video）。config 会写入 node.data。",
+            "strict": False,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "type": {
+                        "type": "string",
+                        "enum": ["image", "textToImage", "composeVideo", "video"],
+                        "description": "逻辑节点类型（前端会映射成 taskNode.kind）",
+                    },
+                    "label": {"type": "string", "description": "可选：节点标签"},
+                    "config": config_schema,
+                    "remixFromNodeId": {
+                        "type": "string",
+                        "description": "可选：基于已有视频节点做 Remix（传入源节点 ID）",
+                    },
+                    "position": {
+                        "type": "object",
+                        "properties": {"x": {"type": "number"}, "y": {"type": "number"}},
+                        "required": ["x", "y"],
+                        "additionalProperties": False,
+                        "description": "可选：节点位置",
+                    },
+                },
+                "required": ["type"],
+                "additionalProperties": False,
+            },
+        },
+        {
+            "type": "function",
+            "name": "updateNode",
+            "description": "更新已存在节点的配置或标签，通常用于写入/修改 prompt。",
+            "strict": False,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "nodeId": {
+                        "type": "string",
+                        "description": "节点 ID（也可直接传节点 label；前端会按 label 解析）",
+                    },
+                    "label": {"type": "string", "description": "可选：新标签"},
+                    "config": config_schema,
+                },
+                "required": ["nodeId"],
+                "additionalProperties": False,
+            },
+        },
+        {
+            "type": "function",
+            "name": "connectNodes",
+            "description": "连接两个节点，source -> target。",
+            "strict": False,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "sourceNodeId": {
+                        "type": "string",
+                        "description": "源节点 ID（也可直接传节点 label；前端会按 label 解析）",
+                    },
+                    "targetNodeId": {
+                        "type": "string",
+                        "description": "目标节点 ID（也可直接传节点 label；前端会按 label 解析）",
+                    },
+                    "sourceHandle": {"type": "string", "description": "可选：源手柄"},
+                    "targetHandle": {"type": "string", "description": "可选：目标手柄"},
+                },
+                "required": ["sourceNodeId", "targetNodeId"],
+                "additionalProperties": False,
+            },
+        },
+        {
+            "type": "function",
+            "name": "runNode",
+            "description": "执行一个节点（例如 composeVideo/image），前端自行处理执行细节。",
+            "strict": False,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "nodeId": {
+                        "type": "string",
+                        "description": "节点 ID（也可直接传节点 label；前端会按 label 解析）",
+                    },
+                },
+                "required": ["nodeId"],
+                "additionalProperties": False,
+            },
+        },
+    ]
+
+
+def to_chat_completions_tools(response_api_tools: list[dict] | tuple[dict, ...] | None) -> list[dict]:
+    """Convert Responses-API style tools to Chat Completions tool schema."""
+    if not isinstance(response_api_tools, (list, tuple)) or not response_api_tools:
+        return []
+    out: list[dict] = []
+    for t in response_api_tools:
+        if not isinstance(t, dict):
+            continue
+        if t.get("type") != "function":
+            continue
+        name = t.get("name")
+        if not isinstance(name, str) or not name.strip():
+            continue
+        out.append(
+            {
+                "type": "function",
+                "function": {
+                    "name": name,
+                    "description": t.get("description") or "",
+                    "parameters": t.get("parameters") or {"type": "object", "properties": {}},
+                },
+            }
+        )
+    return out
+
+
+@dataclass(frozen=True)
+class ToolSet:
+    """Tools one role may call, pre-shaped for the Responses and Chat Completions APIs."""
+
+    names: frozenset[str]
+    responses_tools: tuple[dict, ...]
+    chat_tools: tuple[dict, ...]
+    digest: str
+
+    def __bool__(self) -> bool:
+        """Return whether the set holds any tools."""
+        return bool(self.responses_tools)
+
+    def cache_key(self, call: str) -> str:
+        """Return the prompt cache key for `call` with this tool set."""
+        return f"tapcanvas:{call}:{self.digest}"
+
+
+@dataclass(frozen=True)
+class StructuredSchema:
+    """JSON schema of a structured-output model, plus its serialized form and hash."""
+
+    name: str
+    schema: dict
+    schema_json: str
+    digest: str
+
+    def cache_key(self, call: str | None = None) -> str:
+        """Return the prompt cache key for `call` (defaults to the schema name)."""
+        return f"tapcanvas:{call or self.name}:{self.digest}"
+
+
+def _build_tool_set(names: frozenset[str], tools: list[dict]) -> ToolSet:
+    selected = tuple(t for t in tools if t.get("name") in names)
+    return ToolSet(
+        names=names,
+        responses_tools=selected,
+        chat_tools=tuple(to_chat_completions_tools(selected)),
+        digest=content_hash(list(selected)),
+    )
+
+
+CANVAS_TOOLS: tuple[dict, ...] = tuple(_canvas_tool_definitions())
+NO_TOOLS = _build_tool_set(frozenset(), [])
+_ROLE_TOOL_SETS: dict[str, ToolSet] = {
+    role["id"]: _build_tool_set(ROLE_ALLOWED_CANVAS_TOOLS.get(role["id"], frozenset()), list(CANVAS_TOOLS))
+    for role in ROLE_DEFINITIONS
+}
+
+
+def role_tool_set(role_id: str, allow_canvas_tools: bool = True) -> ToolSet:
+    """Tools for a role, honouring role permissions and the decision-layer gate."""
+    if not allow_canvas_tools:
+        return NO_TOOLS
+    return _ROLE_TOOL_SETS.get(normalize_role_id(role_id or DEFAULT_ROLE_ID), NO_TOOLS)
+
+
+@lru_cache(maxsize=64)
+def structured_schema(schema_model: type) -> StructuredSchema:
+    """Return the schema asset for a pydantic model (built once per model)."""
+    schema = schema_model.model_json_schema()
+    return StructuredSchema(
+        name=schema_model.__name__,
+        schema=schema,
+        schema_json=json.dumps(schema, ensure_ascii=False),
+        digest=content_hash(schema),
+    )
+
+
+# Structured-output models used on the hot path are registered at import time.
+for _model in (RoleDecision, SafetyDecision, CharacterExtraction):
+    structured_schema(_model)
+del _model
+
+
+def asset_digests() -> dict[str, str]:
+    """Content hashes of every registered asset (for debugging cache-key stability)."""
+    digests = {f"tools:{role_id}": tool_set.digest for role_id, tool_set in _ROLE_TOOL_SETS.items()}
+    for model in (RoleDecision, SafetyDecision, CharacterExtraction):
+        asset = structured_schema(model)
+        digests[f"schema:{asset.name}"] = asset.digest
+    return digests
@@ -1,174 +1,244 @@
 from __future__ import annotations
 
-from typing import List
-
-from agent.tools_and_schemas import PromptRequest, PromptResult
-
-
-def _cn_prompt(req: PromptRequest) -> PromptResult:
-    parts: List[str] = []
-    aspects: List[str] = []
-    notes: List[str] = []
-
-    parts.append(req.subject.strip())
-    if req.visual_style:
-        parts.append(req.visual_style.strip())
-
-    workflow = req.workflow
-    if workflow == "character_creation":
-        parts.extend(
-            [
-                "全身角色设定稿",
-                "turnaround 多视角，姿态稳定",
-                "清晰轮廓，便于跨镜头复现",
-            ]
-        )
-        aspects.extend(
-            [
-                "保持服装/配件位置一致",
-                "同一光照与背景，棚拍渐变底",
-                "中焦镜头，避免夸张透视",
-            ]
-        )
-        notes.append("推荐输出多视角（正面/3⁄4/侧面/背面），背景统一。")
-    elif workflow == "direct_image":
-        parts.extend(
-            [
-                "单镜头主视图",
-                "主体居中，高清锐利",
-                "干净背景（可渐变/虚化），突出主体",
-            ]
-        )
-        aspects.append("相机中焦或轻微长焦，避免畸变；保持同一配色与材质。")
-    elif workflow == "merchandise":
-        parts.extend(
-            [
-                "产品/衍生品渲染",
-                "干净电商/陈列背景",
-                "光线均匀，材质质感清晰",
-            ]
-        )
-        aspects.append("保持角色元素/标志物一致；背景简洁以突出产品。")
-
-    if req.consistency:
-        parts.append(f"一致性要求：{req.consistency.strip()}")
-
-    if req.model:
-        notes.append(f"模型提示：面向 {req.model}，保持分辨率与时长在可接受范围内。")
-
-    parts.extend(
-        [
+import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List
+
+from pydantic import ValidationError
+
+from agent.tools_and_schemas import (
+    PromptBatchItem,
+    PromptBatchRequest,
+    PromptRequest,
+    PromptResult,
+)
+
+
+@dataclass(frozen=True)
+class _LanguageTemplate:
+    joiner: str
+    consistency: str
+    model_note: str
+    quality_tail: tuple[str, ...]
+    base_negative: str
+
+
+@dataclass(frozen=True)
+class _WorkflowTemplate:
+    parts: tuple[str, ...]
+    aspects: tuple[str, ...]
+    notes: tuple[str, ...]
+    negative: str
+
+
+_LANGUAGES: Dict[str, _LanguageTemplate] = {
+    "zh": _LanguageTemplate(
+        joiner="，",
+        consistency="一致性要求：{}",
+        model_note="模型提示：面向 {}，保持分辨率与时长在可接受范围内。",
+        quality_tail=(
             "高质量，清晰对焦，干净轮廓",
             "柔和主光 + rim light 勾勒边缘（若适用）",
-        ]
-    )
+        ),
+        base_negative="低清晰度，模糊，噪点，水印，文字，logo，畸变，肢体错位，解剖错误",
+    ),
+    "en": _LanguageTemplate(
+        joiner=", ",
+        consistency="consistency anchor: {}",
+        model_note="Model hint: target {}, keep resolution/duration within supported range.",
+        quality_tail=(
+            "high quality, sharp focus, clean silhouette",
+            "soft key light + rim light when appropriate",
+        ),
+        base_negative="low quality, blurry, noisy, watermark, text, logo, distortion, broken anatomy",
+    ),
+}
+
+_WORKFLOWS: Dict[tuple[str, str], _WorkflowTemplate] = {
+    ("character_creation", "zh"): _WorkflowTemplate(
+        parts=(
+            "全身角色设定稿",
+            "turnaround 多视角，姿态稳定",
+            "清晰轮廓，便于跨镜头复现",
+        ),
+        aspects=(
+            "保持服装/配件位置一致",
+            "同一光照与背景，棚拍渐变底",
+            "中焦镜头，避免夸张透视",
+        ),
+        notes=("推荐输出多视角（正面/3⁄4/侧面/背面），背景统一。",),
+        negative="夸张卡通比例，反派邪恶表情，杂乱背景",
+    ),
+    ("direct_image", "zh"): _WorkflowTemplate(
+        parts=(
+            "单镜头主视图",
+            "主体居中，高清锐利",
+            "干净背景（可渐变/虚化），突出主体",
+        ),
+        aspects=("相机中焦或轻微长焦，避免畸变；保持同一配色与材质。",),
+        notes=(),
+        negative="杂乱场景，过曝或极暗，对比度过高",
+    ),
+    ("merchandise", "zh"): _WorkflowTemplate(
+        parts=(
+            "产品/衍生品渲染",
+            "干净电商/陈列背景",
+            "光线均匀，材质质感清晰",
+        ),
+        aspects=("保持角色元素/标志物一致；背景简洁以突出产品。",),
+        notes=(),
+        negative="杂乱陈列，背景文字，强阴影遮挡产品",
+    ),
+    ("character_creation", "en"): _WorkflowTemplate(
+        parts=(
+            "full-body character sheet",
+            "turnaround multi-view, stable posture",
+            "clean silhouette for cross-shot consistency",
+        ),
+        aspects=(
+            "lock outfit/accessory placement",
+            "same lighting and studio gradient background",
+            "mid focal length, avoid distortion",
+        ),
+        notes=("Recommend exporting multiple views (front/3⁄4/side/back) with unified background.",),
+        negative="exaggerated cartoon proportions, villainous grin, busy background",
+    ),
+    ("direct_image", "en"): _WorkflowTemplate(
+        parts=(
+            "single shot main view",
+            "subject centered, crisp focus",
+            "clean background (gradient or soft blur) to highlight subject",
+        ),
+        aspects=("Mid or slight tele focal length; keep palette/material consistent.",),
+        notes=(),
+        negative="cluttered scene, overexposed or crushed blacks, harsh contrast",
+    ),
+    ("merchandise", "en"): _WorkflowTemplate(
+        parts=(
+            "product/merch rendering",
+            "clean e-commerce display background",
+            "even lighting, clear material readability",
+        ),
+        aspects=("Preserve character motifs/logos; keep background minimal to highlight product.",),
+        notes=(),
+        negative="messy display, background text, strong shadows hiding product",
+    ),
+}
+
+
+@dataclass(frozen=True)
+class _CompiledTemplate:
+    """Fixed fragments for one (workflow, language), pre-joined at import."""
+
+    language: _LanguageTemplate
+    body: str
+    tail: str
+    negative_prompt: str
+    aspects: tuple[str, ...]
+    notes: tuple[str, ...]
+
+
+def _compile_templates() -> Dict[tuple[str, str], _CompiledTemplate]:
+    compiled: Dict[tuple[str, str], _CompiledTemplate] = {}
+    for (workflow, language), wf in _WORKFLOWS.items():
+        lang = _LANGUAGES[language]
+        compiled[(workflow, language)] = _CompiledTemplate(
+            language=lang,
+            body=lang.joiner.join(wf.parts),
+            tail=lang.joiner.join(lang.quality_tail),
+            negative_prompt=lang.joiner.join([lang.base_negative, wf.negative]),
+            aspects=wf.aspects,
+            notes=wf.notes,
+        )
+    return compiled
 
-    prompt = "，".join([p for p in parts if p])
 
-    negative_list = [
-        "低清晰度，模糊，噪点，水印，文字，logo，畸变，肢体错位，解剖错误",
-    ]
-    if workflow == "character_creation":
-        negative_list.append("夸张卡通比例，反派邪恶表情，杂乱背景")
-    elif workflow == "direct_image":
-        negative_list.append("杂乱场景，过曝或极暗，对比度过高")
-    elif workflow == "merchandise":
-        negative_list.append("杂乱陈列，背景文字，强阴影遮挡产品")
+_TEMPLATES = _compile_templates()
 
-    negative_prompt = "，".join(negative_list)
+
+def generate_prompt(request: PromptRequest) -> PromptResult:
+    """Generate a ready-to-use prompt (and negative prompt) for the chosen workflow."""
+    language = "en" if request.language == "en" else "zh"
+    tpl = _TEMPLATES[(request.workflow, language)]
+    lang = tpl.language
+
+    segments: List[str] = [request.subject.strip()]
+    if request.visual_style:
+        segments.append(request.visual_style.strip())
+    segments.append(tpl.body)
+    if request.consistency:
+        segments.append(lang.consistency.format(request.consistency.strip()))
+    segments.append(tpl.tail)
+
+    notes = list(tpl.notes)
+    if request.model:
+        notes.append(lang.model_note.format(request.model))
 
     return PromptResult(
-        workflow=workflow,
-        prompt=prompt,
-        negative_prompt=negative_prompt,
-        suggested_aspects=aspects,
+        workflow=request.workflow,
+        prompt=lang.joiner.join([s for s in segments if s]),
+        negative_prompt=tpl.negative_prompt,
+        suggested_aspects=list(tpl.aspects),
         notes=notes,
     )
 
 
-def _en_prompt(req: PromptRequest) -> PromptResult:
-    parts: List[str] = []
-    aspects: List[str] = []
-    notes: List[str] = []
-
-    parts.append(req.subject.strip())
-    if req.visual_style:
-        parts.append(req.visual_style.strip())
-
-    workflow = req.workflow
-    if workflow == "character_creation":
-        parts.extend(
-            [
-                "full-body character sheet",
-                "turnaround multi-view, stable posture",
-                "clean silhouette for cross-shot consistency",
-            ]
-        )
-        aspects.extend(
-            [
-                "lock outfit/accessory placement",
-                "same lighting and studio gradient background",
-                "mid focal length, avoid distortion",
-            ]
-        )
-        notes.append("Recommend exporting multiple views (front/3⁄4/side/back) with unified background.")
-    elif workflow == "direct_image":
-        parts.extend(
-            [
-                "single shot main view",
-                "subject centered, crisp focus",
-                "clean background (gradient or soft blur) to highlight subject",
-            ]
-        )
-        aspects.append("Mid or slight tele focal length; keep palette/material consistent.")
-    elif workflow == "merchandise":
-        parts.extend(
-            [
-                "product/merch rendering",
-                "clean e-commerce display background",
-                "even lighting, clear material readability",
-            ]
-        )
-        aspects.append("Preserve character motifs/logos; keep background minimal to highlight product.")
-
-    if req.consistency:
-        parts.append(f"consistency anchor: {req.consistency.strip()}")
+@lru_cache(maxsize=4096)
+def _render_prompt_json(request_json: str) -> tuple[str, bytes]:
+    body = generate_prompt(PromptRequest.model_validate_json(request_json)).model_dump_json().encode("utf-8")
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    return etag, body
 
-    if req.model:
-        notes.append(f"Model hint: target {req.model}, keep resolution/duration within supported range.")
 
-    parts.extend(
-        [
-            "high quality, sharp focus, clean silhouette",
-            "soft key light + rim light when appropriate",
-        ]
-    )
+def render_prompt_response(request: PromptRequest) -> tuple[str, bytes]:
+    """Return (strong ETag, JSON body) for a request, memoized by the canonical request JSON."""
+    return _render_prompt_json(request.model_dump_json())
 
-    prompt = ", ".join([p for p in parts if p])
 
-    negative_list = [
-        "low quality, blurry, noisy, watermark, text, logo, distortion, broken anatomy",
-    ]
-    if workflow == "character_creation":
-        negative_list.append("exaggerated cartoon proportions, villainous grin, busy background")
-    elif workflow == "direct_image":
-        negative_list.append("cluttered scene, overexposed or crushed blacks, harsh contrast")
-    elif workflow == "merchandise":
-        negative_list.append("messy display, background text, strong shadows hiding product")
+def prompt_batch_size(batch: PromptBatchRequest) -> int:
+    """Return how many items `expand_prompt_batch` would produce, without building them."""
+    size = len(batch.items)
+    cross = batch.cross
+    if cross is not None:
+        size += len(cross.subjects) * len(cross.workflows) * len(cross.languages)
+    return size
 
-    negative_prompt = ", ".join(negative_list)
 
-    return PromptResult(
-        workflow=workflow,
-        prompt=prompt,
-        negative_prompt=negative_prompt,
-        suggested_aspects=aspects,
-        notes=notes,
-    )
+def expand_prompt_batch(batch: PromptBatchRequest) -> List[Dict[str, Any]]:
+    """Return raw item payloads in order: explicit items first, then the cross product."""
+    payloads: List[Dict[str, Any]] = list(batch.items)
+    cross = batch.cross
+    if cross is not None:
+        shared = {
+            "visual_style": cross.visual_style,
+            "model": cross.model,
+            "consistency": cross.consistency,
+        }
+        for subject in cross.subjects:
+            for workflow in cross.workflows:
+                for language in cross.languages:
+                    payloads.append({"subject": subject, "workflow": workflow, "language": language, **shared})
+    return payloads
 
 
-def generate_prompt(request: PromptRequest) -> PromptResult:
-    """Generate a ready-to-use prompt (and negative prompt) for the chosen workflow."""
-    if request.language == "en":
-        return _en_prompt(request)
-    return _cn_prompt(request)
+def _format_validation_error(exc: ValidationError) -> str:
+    parts: List[str] = []
+    for err in exc.errors():
+        loc = ".".join(str(p) for p in err.get("loc") or ()) or "item"
+        parts.append(f"{loc}: {err.get('msg')}")
+    return "; ".join(parts)
+
+
+def generate_prompt_batch(payloads: List[Dict[str, Any]]) -> Iterator[PromptBatchItem]:
+    """Generate prompts for each payload in order; invalid items yield an error entry instead of failing the batch."""
+    for index, payload in enumerate(payloads):
+        try:
+            request = PromptRequest.model_validate(payload)
+        except ValidationError as exc:
+            yield PromptBatchItem(index=index, ok=False, error=_format_validation_error(exc))
+            continue
+        try:
+            yield PromptBatchItem(index=index, ok=True, result=generate_prompt(request))
+        except Exception as exc:
+            yield PromptBatchItem(index=index, ok=False, error=f"{exc.__class__.__name__}: {exc}")
@@ -0,0 +1,206 @@
+"""Process-wide cache for knowledge-base retrieval results."""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable
+
+
+def normalize_rag_query(query: str) -> str:
+    """Normalize a retrieval query for cache keying (case/whitespace-insensitive)."""
+    if not isinstance(query, str):
+        return ""
+    return " ".join(query.split()).lower()
+
+
+def _estimate_bytes(value: Any) -> int:
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except Exception:
+        return len(str(value).encode("utf-8"))
+
+
+@dataclass
+class _Entry:
+    value: Any
+    size: int
+    stored_at: float
+
+
+class RagResultCache:
+    """Thread-safe LRU + TTL cache with stale-while-revalidate, bounded by total bytes.
+
+    - age < ttl: fresh hit.
+    - ttl <= age < ttl + stale: the stale value is returned immediately and a single
+      background refresh is scheduled for the key.
+    - otherwise: miss, the loader runs inline. Concurrent misses for the same key are
+      coalesced: one caller loads, the others wait for its result (or its exception).
+    Only values accepted by `cacheable` are stored, so transient errors are never cached.
+    """
+
+    def __init__(self, *, max_bytes: int = 8_000_000, refresh_workers: int = 2) -> None:
+        """Create an empty cache bounded by `max_bytes` of estimated JSON size."""
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._refreshing: set[Hashable] = set()
+        self._inflight: dict[Hashable, Future] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, refresh_workers), thread_name_prefix="rag-cache-refresh"
+        )
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "evictions": 0,
+            "coalesced": 0,
+        }
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        *,
+        ttl_seconds: float,
+        stale_seconds: float = 0.0,
+        cacheable: Callable[[Any], bool] | None = None,
+    ) -> Any:
+        """Return the cached value for `key`, loading it with `loader` on a miss."""
+        now = time.monotonic()
+        schedule_refresh = False
+        flight: Future | None = None
+        leader = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.stored_at
+                if age < ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry.value
+                if age < ttl_seconds + max(0.0, stale_seconds):
+                    self._entries.move_to_end(key)
+                    self._stats["stale_hits"] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        schedule_refresh = True
+                    value = entry.value
+                else:
+                    self._drop(key)
+                    entry = None
+            if entry is None:
+                flight = self._inflight.get(key)
+                if flight is None:
+                    self._stats["misses"] += 1
+                    flight = self._inflight[key] = Future()
+                    leader = True
+                else:
+                    self._stats["coalesced"] += 1
+
+        if entry is not None:
+            if schedule_refresh:
+                self._executor.submit(self._refresh, key, loader, cacheable)
+            return value
+
+        if not leader:
+            return flight.result()
+        try:
+            value = loader()
+            self.put(key, value, cacheable=cacheable)
+        except BaseException as exc:
+            flight.set_exception(exc)
+            raise
+        else:
+            flight.set_result(value)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return value
+
+    def put(self, key: Hashable, value: Any, *, cacheable: Callable[[Any], bool] | None = None) -> None:
+        """Store `value` under `key` (if cacheable and within the byte budget)."""
+        if self.max_bytes <= 0:
+            return
+        if cacheable is not None and not cacheable(value):
+            return
+        size = _estimate_bytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = _Entry(value=value, size=size, stored_at=time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any], cacheable: Callable[[Any], bool] | None) -> None:
+        try:
+            value = loader()
+            if cacheable is None or cacheable(value):
+                self.put(key, value)
+                with self._lock:
+                    self._stats["refreshes"] += 1
+            else:
+                with self._lock:
+                    self._stats["refresh_errors"] += 1
+        except Exception:
+            with self._lock:
+                self._stats["refresh_errors"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Return counters plus hit ratio (fresh + stale hits over all lookups)."""
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._entries)
+            out["bytes"] = self._bytes
+            out["max_bytes"] = self.max_bytes
+        lookups = out["hits"] + out["stale_hits"] + out["misses"]
+        out["hit_ratio"] = ((out["hits"] + out["stale_hits"]) / lookups) if lookups else 0.0
+        return out
+
+
+_rag_cache: RagResultCache | None = None
+_rag_cache_lock = threading.Lock()
+
+
+def get_rag_cache(max_bytes: int) -> RagResultCache:
+    """Return the process-wide RAG cache, applying the latest byte budget."""
+    global _rag_cache
+    with _rag_cache_lock:
+        if _rag_cache is None:
+            _rag_cache = RagResultCache(max_bytes=max_bytes)
+        else:
+            _rag_cache.max_bytes = max(0, int(max_bytes))
+    return _rag_cache
+
+
+def rag_cache_stats() -> dict:
+    """Return cache metrics, or `{"enabled": False}` before the first cached retrieval."""
+    cache = _rag_cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": cache.max_bytes > 0, **cache.stats()}
@@ -59,23 +59,26 @@ ROLE_DEFINITIONS: List[Role] = [
 DEFAULT_ROLE_ID = "art_director"
 
 
+# Built once at import; the role table is static and callers treat these as read-only.
+_ROLE_MAP: Dict[str, Role] = {role["id"]: role for role in ROLE_DEFINITIONS}
+_ROLES_PROMPT_BLOCK = "\n".join(
+    f"- {role['id']} | {role['name']}: {role['summary']} (回复风格：{role['style']})"
+    for role in ROLE_DEFINITIONS
+)
+
+
 def role_map() -> Dict[str, Role]:
-    """Return a lookup map keyed by role id."""
-    return {role["id"]: role for role in ROLE_DEFINITIONS}
+    """Return a lookup map keyed by role id (shared; do not mutate)."""
+    return _ROLE_MAP
 
 
 def normalize_role_id(role_id: str) -> str:
     """Ensure the selected role id exists, otherwise fall back to the default."""
-    if role_id in role_map():
+    if role_id in _ROLE_MAP:
         return role_id
     return DEFAULT_ROLE_ID
 
 
 def roles_prompt_block() -> str:
     """Format the roles for inclusion in a routing prompt."""
-    lines = []
-    for role in ROLE_DEFINITIONS:
-        lines.append(
-            f"- {role['id']} | {role['name']}: {role['summary']} (回复风格：{role['style']})"
-        )
-    return "\n".join(lines)
+    return _ROLES_PROMPT_BLOCK
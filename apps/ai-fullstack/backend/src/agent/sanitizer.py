@@ -0,0 +1,143 @@
+"""Compiled one-pass replacement engine for PG-13 sanitization of answers and plans.
+
+Each rule table (term -> replacement) compiles to one alternation regex ordered longest
+term first, so a text is rewritten in a single scan with leftmost-longest matching
+instead of one `str.replace` pass per term. Every rewrite reports how often each rule
+fired. `apply_plan` sanitizes all createNode prompts of a tool-call plan in one batch.
+
+Tables default to DEFAULT_RULES and can be overridden with a JSON file (Configuration
+`sanitizer_rules_path`, or SANITIZER_RULES_PATH):
+
+    {"violent": {"爆头": "冲击（不展示细节）", "血浆": null}, "sexual": {...}}
+
+Entries are merged over the defaults; a null replacement removes a default rule.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable
+
+DEFAULT_RULES: dict[str, dict[str, str]] = {
+    "sexual": {
+        "无码": "（不展示细节）",
+        "露点": "穿着完整（不露骨）",
+        "裸体": "穿着完整（不露骨）",
+        "性交": "亲密互动（不露骨）",
+        "做爱": "亲密互动（不露骨）",
+        "口交": "亲密互动（不露骨）",
+        "肛交": "亲密互动（不露骨）",
+        "强奸": "性侵（不展示细节，仅点到为止）",
+        "迷奸": "性侵（不展示细节，仅点到为止）",
+        "porn": "（不露骨）",
+    },
+    "violent": {
+        "爆头": "强烈冲击（不展示细节）",
+        "脑浆": "冲击性的后果（不展示细节）",
+        "断肢": "受伤倒下（不展示细节）",
+        "肢解": "镜头切走（用暗示表达）",
+        "开膛": "镜头切走（用暗示表达）",
+        "剖腹": "镜头切走（用暗示表达）",
+        "内脏": "不展示细节",
+        "肠子": "不展示细节",
+        "碎尸": "不展示细节",
+        "割喉": "镜头切走（用暗示表达）",
+        "斩首": "镜头切走（用暗示表达）",
+        "砍头": "镜头切走（用暗示表达）",
+        "喷血": "用剪影/反应镜头表达冲击（不展示细节）",
+        "血浆": "用光影/音效表达冲击（不展示细节）",
+        "血肉模糊": "画面用遮挡/虚焦表达（不展示细节）",
+    },
+}
+
+# Joins batch items; never part of a rule term, so matches cannot span two items.
+_BATCH_SEPARATOR = "\x00"
+
+
+class ReplacementEngine:
+    """Leftmost-longest multi-term replacement compiled from one rule table."""
+
+    def __init__(self, name: str, table: dict[str, str]) -> None:
+        """Compile `table` (term -> replacement) into one longest-first alternation."""
+        self.name = name
+        self.table = {k: v for k, v in table.items() if k and _BATCH_SEPARATOR not in k}
+        terms = sorted(self.table, key=len, reverse=True)
+        self._regex = re.compile("|".join(map(re.escape, terms))) if terms else None
+
+    def _sub(self, text: str, fired: Counter[str]) -> str:
+        table = self.table
+
+        def replace(match: re.Match) -> str:
+            term = match.group()
+            fired[term] += 1
+            return table[term]
+
+        return self._regex.sub(replace, text)
+
+    def apply(self, text: str) -> tuple[str, Counter[str]]:
+        """Rewrite `text` in one pass; return (text, {term: times fired})."""
+        fired: Counter[str] = Counter()
+        if self._regex is None or not isinstance(text, str) or not text.strip():
+            return text, fired
+        return self._sub(text, fired), fired
+
+    def apply_batch(self, texts: Iterable[str]) -> tuple[list[str], Counter[str]]:
+        """Rewrite many texts with a single scan over their concatenation."""
+        items = list(texts)
+        fired: Counter[str] = Counter()
+        if self._regex is None or not items:
+            return items, fired
+        joined = _BATCH_SEPARATOR.join(items)
+        if len(items) > 1 and joined.count(_BATCH_SEPARATOR) != len(items) - 1:
+            # Inputs already contain the separator; fall back to per-item passes.
+            return [self._sub(t, fired) for t in items], fired
+        return self._sub(joined, fired).split(_BATCH_SEPARATOR), fired
+
+    def apply_plan(self, tool_calls: list[dict] | None) -> Counter[str]:
+        """Sanitize every createNode `config.prompt` of a tool-call plan in place."""
+        configs: list[dict] = []
+        for call in tool_calls or []:
+            if not isinstance(call, dict) or call.get("name") != "createNode":
+                continue
+            cfg = (call.get("arguments") or {}).get("config")
+            if isinstance(cfg, dict) and isinstance(cfg.get("prompt"), str):
+                configs.append(cfg)
+        prompts, fired = self.apply_batch(cfg["prompt"] for cfg in configs)
+        for cfg, prompt in zip(configs, prompts):
+            cfg["prompt"] = prompt
+        return fired
+
+
+@lru_cache(maxsize=8)
+def _load_engines(path: str, mtime: float) -> dict[str, ReplacementEngine]:
+    tables = {name: dict(table) for name, table in DEFAULT_RULES.items()}
+    if path:
+        with open(path, encoding="utf-8") as fh:
+            overrides = json.load(fh)
+        if not isinstance(overrides, dict):
+            raise ValueError(f"Sanitizer rules must be a JSON object: {path}")
+        for name, table in overrides.items():
+            if not isinstance(table, dict):
+                continue
+            merged = tables.setdefault(str(name), {})
+            for term, replacement in table.items():
+                if replacement is None:
+                    merged.pop(str(term), None)
+                else:
+                    merged[str(term)] = str(replacement)
+    return {name: ReplacementEngine(name, table) for name, table in tables.items()}
+
+
+def sanitizer_engines(path: str | None = None) -> dict[str, ReplacementEngine]:
+    """Engines by table name; reloaded when the rules file changes, defaults on error."""
+    path = (path or os.getenv("SANITIZER_RULES_PATH") or "").strip()
+    if path:
+        try:
+            return _load_engines(path, os.path.getmtime(path))
+        except (OSError, ValueError):
+            pass
+    return _load_engines("", 0.0)
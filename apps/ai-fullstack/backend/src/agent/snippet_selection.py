@@ -0,0 +1,86 @@
+"""Token-budgeted, diversity-aware selection of retrieved snippets (MMR)."""
+
+from __future__ import annotations
+
+import re
+
+import numpy as np
+
+from agent.embeddings import HashingEmbedder
+
+_CJK_RE = re.compile(r"[　-〿㐀-鿿＀-￯]")
+
+_embedder = HashingEmbedder()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: ~1 token per CJK char, ~4 chars per token otherwise."""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    if estimate_tokens(text) <= budget:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo].rstrip() + "…"
+
+
+def select_snippets(
+    query: str,
+    snippets: list[str],
+    *,
+    token_budget: int = 1500,
+    mmr_lambda: float = 0.7,
+    dedup_threshold: float = 0.9,
+) -> list[str]:
+    """Pick relevant, non-redundant snippets for the answer prompt (MMR under a token budget).
+
+    Snippets are embedded once; relevance and pairwise similarity are computed as
+    matrix products. Near-duplicates (similarity >= dedup_threshold to an already
+    selected snippet) are dropped, and selection stops once the budget is spent.
+    The first pick is truncated to fit if it alone exceeds the budget.
+    """
+    candidates = [s for s in snippets if isinstance(s, str) and s.strip()]
+    if not candidates or token_budget <= 0:
+        return candidates
+
+    vectors = _embedder.embed_many(candidates)
+    q = _embedder.embed(query or "")
+    relevance = vectors @ q if np.any(q) else np.zeros(len(candidates), dtype=np.float32)
+    similarity = vectors @ vectors.T
+
+    selected: list[int] = []
+    remaining = np.ones(len(candidates), dtype=bool)
+    max_sim = np.zeros(len(candidates), dtype=np.float32)
+    used = 0
+    out: list[str] = []
+    while remaining.any():
+        scores = mmr_lambda * relevance - (1.0 - mmr_lambda) * max_sim
+        scores = np.where(remaining, scores, -np.inf)
+        best = int(np.argmax(scores))
+        remaining[best] = False
+        if selected and max_sim[best] >= dedup_threshold:
+            continue
+        text = candidates[best]
+        cost = estimate_tokens(text)
+        if used + cost > token_budget:
+            if out:
+                continue
+            text = _truncate_to_tokens(text, token_budget)
+            cost = estimate_tokens(text)
+        selected.append(best)
+        out.append(text)
+        used += cost
+        max_sim = np.maximum(max_sim, similarity[best])
+        if used >= token_budget:
+            break
+    return out
@@ -31,3 +31,7 @@ class OverallState(TypedDict):
     research_loop_count: int
     reasoning_model: str
     canvas_context: dict
+    # "agent" | "agent_max" | "plan", sent by the chat UI with each run.
+    interaction_mode: NotRequired[str]
+    # LLM call records (tokens, latency) for the current turn; reset by the entry node.
+    turn_usage: NotRequired[list]
@@ -0,0 +1,190 @@
+"""Static file serving for the built frontend with precompressed siblings and cache headers."""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from dataclasses import dataclass
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, PathLike, StaticFiles
+from starlette.types import Scope
+
+# Vite emits content-hashed bundles as assets/<name>-<hash>.<ext>; those never change in place.
+DEFAULT_IMMUTABLE_PATTERN = r"(^|/)assets/[^/]+[.-][A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Preference order when the client accepts several encodings.
+_SIBLING_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    """Parse Accept-Encoding into the set of codings with q > 0."""
+    accepted: set[str] = set()
+    for item in (header or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(coding)
+    if "*" in accepted:
+        accepted.update(enc for enc, _ in _SIBLING_ENCODINGS)
+    return accepted
+
+
+@dataclass(frozen=True)
+class _HtmlEntry:
+    mtime_ns: int
+    size: int
+    etag: str
+    body: bytes
+    gzip_body: bytes
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves prebuilt .br/.gz siblings and sets long-lived cache headers.
+
+    - `<file>.br` / `<file>.gz` is served with Content-Encoding when the client accepts it
+      (Range requests always get the identity file so byte offsets stay meaningful).
+    - Content-hashed assets get `Cache-Control: immutable`; everything else revalidates.
+    - HTML entry points are kept in memory (plus a gzip copy) with a strong content ETag.
+    """
+
+    def __init__(self, *args, immutable_pattern: str = DEFAULT_IMMUTABLE_PATTERN, **kwargs) -> None:
+        """Create the app; `immutable_pattern` matches paths that get the immutable Cache-Control."""
+        super().__init__(*args, **kwargs)
+        self._immutable_re = re.compile(immutable_pattern)
+        self._html_cache: dict[str, _HtmlEntry] = {}
+        # Keyed by path alone (mtime lives in the value) so rebuilt files replace their entry.
+        self._siblings: dict[str, tuple[int, dict[str, tuple[str, os.stat_result]]]] = {}
+        self._lock = threading.Lock()
+
+    def _relative(self, full_path: str) -> str:
+        for directory in self.all_directories:
+            try:
+                rel = os.path.relpath(full_path, os.path.realpath(directory))
+            except ValueError:
+                continue
+            if not rel.startswith(".."):
+                return rel.replace(os.sep, "/")
+        return os.path.basename(full_path)
+
+    def _cache_control(self, full_path: str) -> str:
+        if self._immutable_re.search(self._relative(full_path)):
+            return IMMUTABLE_CACHE_CONTROL
+        return REVALIDATE_CACHE_CONTROL
+
+    def _compressed_siblings(self, full_path: str, stat_result: os.stat_result) -> dict[str, tuple[str, os.stat_result]]:
+        with self._lock:
+            cached = self._siblings.get(full_path)
+        if cached is not None and cached[0] == stat_result.st_mtime_ns:
+            return cached[1]
+        found: dict[str, tuple[str, os.stat_result]] = {}
+        for encoding, suffix in _SIBLING_ENCODINGS:
+            try:
+                sibling_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            # Ignore siblings older than the source (stale precompression).
+            if sibling_stat.st_mtime_ns >= stat_result.st_mtime_ns:
+                found[encoding] = (full_path + suffix, sibling_stat)
+        with self._lock:
+            self._siblings[full_path] = (stat_result.st_mtime_ns, found)
+        return found
+
+    def _html_entry(self, full_path: str, stat_result: os.stat_result) -> _HtmlEntry:
+        with self._lock:
+            entry = self._html_cache.get(full_path)
+        if entry is not None and entry.mtime_ns == stat_result.st_mtime_ns and entry.size == stat_result.st_size:
+            return entry
+        with open(full_path, "rb") as fh:
+            body = fh.read()
+        entry = _HtmlEntry(
+            mtime_ns=stat_result.st_mtime_ns,
+            size=stat_result.st_size,
+            etag='"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+            body=body,
+            gzip_body=gzip.compress(body, compresslevel=9, mtime=0),
+        )
+        with self._lock:
+            self._html_cache[full_path] = entry
+        return entry
+
+    def file_response(
+        self,
+        full_path: PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        """Build the response for `full_path`, preferring a compressed sibling the client accepts."""
+        full_path = str(full_path)
+        request_headers = Headers(scope=scope)
+        has_range = "range" in request_headers
+
+        if full_path.endswith(".html") and not has_range:
+            return self._html_response(full_path, stat_result, request_headers, status_code)
+
+        headers = {"Cache-Control": self._cache_control(full_path)}
+        siblings = self._compressed_siblings(full_path, stat_result)
+        if siblings:
+            headers["Vary"] = "Accept-Encoding"
+        if siblings and not has_range:
+            accepted = _accepted_encodings(request_headers.get("accept-encoding", ""))
+            for encoding, _ in _SIBLING_ENCODINGS:
+                if encoding in accepted and encoding in siblings:
+                    sibling_path, sibling_stat = siblings[encoding]
+                    media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+                    response = FileResponse(
+                        sibling_path,
+                        status_code=status_code,
+                        headers={**headers, "Content-Encoding": encoding},
+                        media_type=media_type,
+                        stat_result=sibling_stat,
+                    )
+                    if self.is_not_modified(response.headers, request_headers):
+                        return NotModifiedResponse(response.headers)
+                    return response
+
+        response = FileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    def _html_response(
+        self,
+        full_path: str,
+        stat_result: os.stat_result,
+        request_headers: Headers,
+        status_code: int,
+    ) -> Response:
+        entry = self._html_entry(full_path, stat_result)
+        use_gzip = "gzip" in _accepted_encodings(request_headers.get("accept-encoding", ""))
+        # Each encoding is a distinct representation, so it gets its own strong ETag.
+        etag = entry.etag[:-1] + '-gz"' if use_gzip else entry.etag
+        headers = {
+            "ETag": etag,
+            "Cache-Control": REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        if status_code == 200 and self.is_not_modified(Headers(headers=headers), request_headers):
+            return NotModifiedResponse(Headers(headers=headers))
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(entry.gzip_body, status_code=status_code, headers=headers, media_type="text/html")
+        return Response(entry.body, status_code=status_code, headers=headers, media_type="text/html")
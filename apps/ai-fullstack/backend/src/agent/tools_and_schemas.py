@@ -1,4 +1,4 @@
-from typing import List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 
 
@@ -101,6 +101,74 @@ class PromptResult(BaseModel):
     )
 
 
+class PromptBatchCross(BaseModel):
+    """Cartesian expansion of subjects x workflows x languages into PromptRequests."""
+
+    subjects: List[str] = Field(
+        description="Subjects to expand; every subject is combined with every workflow and language."
+    )
+    workflows: List[Literal["character_creation", "direct_image", "merchandise"]] = Field(
+        description="Workflows to expand."
+    )
+    languages: List[Literal["zh", "en"]] = Field(
+        default_factory=lambda: ["zh"],
+        description="Output languages to expand.",
+    )
+    visual_style: str | None = Field(
+        default=None,
+        description="Optional style cues shared by every expanded item.",
+    )
+    model: str | None = Field(
+        default=None,
+        description="Optional model hint shared by every expanded item.",
+    )
+    consistency: str | None = Field(
+        default=None,
+        description="Optional consistency anchor shared by every expanded item.",
+    )
+
+
+class PromptBatchRequest(BaseModel):
+    """Batch of prompt requests, given explicitly and/or as a cross expansion."""
+
+    items: List[Dict[str, Any]] = Field(
+        default_factory=list,
+        description="PromptRequest payloads, validated one by one so a bad item only fails itself.",
+    )
+    cross: PromptBatchCross | None = Field(
+        default=None,
+        description="Optional subjects x workflows x languages expansion, appended after items.",
+    )
+    stream: bool | None = Field(
+        default=None,
+        description="Force NDJSON streaming on/off; by default large batches are streamed.",
+    )
+
+
+class PromptBatchItem(BaseModel):
+    """Outcome of one batch item: the result, or the error that item raised."""
+
+    index: int = Field(description="Position of the item in the expanded batch.")
+    ok: bool = Field(description="True if the prompt was generated.")
+    result: PromptResult | None = Field(
+        default=None,
+        description="Generated prompt when ok is true.",
+    )
+    error: str | None = Field(
+        default=None,
+        description="Validation/generation error when ok is false.",
+    )
+
+
+class PromptBatchResult(BaseModel):
+    """Non-streamed batch response, one item per expanded request."""
+
+    results: List[PromptBatchItem] = Field(
+        default_factory=list,
+        description="One entry per expanded item, in request order.",
+    )
+
+
 class CharacterItem(BaseModel):
     name: str = Field(description="Character name as mentioned in the story.")
     role: Optional[str] = Field(
@@ -0,0 +1,167 @@
+"""Per-node, per-turn and per-thread token, latency and cost accounting for LLM calls."""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Iterator
+
+USAGE_KINDS = ("input", "output", "cached", "reasoning")
+
+# Calls recorded while the current graph node runs (None outside instrumented nodes).
+_node_calls: contextvars.ContextVar[list[dict] | None] = contextvars.ContextVar("tapcanvas_node_calls", default=None)
+_thread_id: contextvars.ContextVar[str] = contextvars.ContextVar("tapcanvas_thread_id", default="")
+
+
+@lru_cache(maxsize=1)
+def _prices() -> dict[str, dict[str, float]]:
+    """USD per 1M tokens by model, from LLM_PRICES_JSON.
+
+    Example: {"gpt-4.1": {"input": 2.0, "cached": 0.5, "output": 8.0}}. Models without
+    an entry are reported without cost. Reasoning tokens are billed as output tokens.
+    """
+    raw = os.getenv("LLM_PRICES_JSON", "").strip()
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return {}
+    prices: dict[str, dict[str, float]] = {}
+    if isinstance(data, dict):
+        for model, row in data.items():
+            if not isinstance(row, dict):
+                continue
+            try:
+                prices[str(model)] = {k: float(v) for k, v in row.items() if k in ("input", "cached", "output")}
+            except (TypeError, ValueError):
+                continue
+    return prices
+
+
+def estimate_cost_usd(model: str, usage: dict[str, int]) -> float | None:
+    """Return the USD cost of `usage` at the configured model price, or None if unpriced."""
+    price = _prices().get(model or "")
+    if not price:
+        return None
+    input_tokens = int(usage.get("input") or 0)
+    cached = min(int(usage.get("cached") or 0), input_tokens)
+    input_price = price.get("input", 0.0)
+    cost = (
+        (input_tokens - cached) * input_price
+        + cached * price.get("cached", input_price)
+        + int(usage.get("output") or 0) * price.get("output", 0.0)
+    )
+    return cost / 1_000_000
+
+
+@contextmanager
+def collect_node_calls(thread_id: str | None) -> Iterator[list[dict]]:
+    """Collect the LLM call records made while one graph node runs."""
+    calls: list[dict] = []
+    calls_token = _node_calls.set(calls)
+    thread_token = _thread_id.set(str(thread_id or ""))
+    try:
+        yield calls
+    finally:
+        _node_calls.reset(calls_token)
+        _thread_id.reset(thread_token)
+
+
+def current_node_calls() -> list[dict]:
+    """Return the call records collected so far in the running node."""
+    return list(_node_calls.get() or [])
+
+
+def record_call(record: dict) -> None:
+    """Attach one finished LLM call to the running node and its thread totals."""
+    calls = _node_calls.get()
+    if calls is not None:
+        calls.append(record)
+    thread_id = _thread_id.get()
+    if thread_id:
+        THREAD_TOTALS.add(thread_id, record)
+
+
+def _empty_totals() -> dict[str, Any]:
+    return {"calls": 0, **{k: 0 for k in USAGE_KINDS}, "latency_ms": 0.0, "cost_usd": None}
+
+
+def _accumulate(totals: dict[str, Any], record: dict) -> None:
+    totals["calls"] += 1
+    for kind in USAGE_KINDS:
+        totals[kind] += int(record.get(kind) or 0)
+    totals["latency_ms"] = round(totals["latency_ms"] + float(record.get("latency_ms") or 0.0), 3)
+    cost = record.get("cost_usd")
+    if cost is not None:
+        totals["cost_usd"] = round((totals["cost_usd"] or 0.0) + float(cost), 8)
+
+
+def summarize_calls(calls: list[dict]) -> dict[str, Any]:
+    """Aggregate call records into turn totals plus per-node and per-call breakdowns."""
+    totals = _empty_totals()
+    by_node: dict[str, dict[str, Any]] = {}
+    for record in calls:
+        _accumulate(totals, record)
+        node = str(record.get("node") or "")
+        if node not in by_node:
+            by_node[node] = _empty_totals()
+        _accumulate(by_node[node], record)
+    totals["by_node"] = by_node
+    totals["llm_calls"] = [
+        {k: record.get(k) for k in ("node", "call", "model", "path", "outcome", "latency_ms", "ttft_ms", *USAGE_KINDS)}
+        for record in calls
+    ]
+    return totals
+
+
+def turn_usage_summary(state: dict) -> dict[str, Any]:
+    """Usage of the current turn so far: earlier nodes (state) plus the running node."""
+    prior = state.get("turn_usage") if isinstance(state, dict) else None
+    return summarize_calls(list(prior or []) + current_node_calls())
+
+
+class ThreadUsageTotals:
+    """Running per-thread usage totals, bounded to the most recently active threads."""
+
+    def __init__(self, max_threads: int = 10_000) -> None:
+        """Create empty totals keeping at most `max_threads` threads."""
+        self.max_threads = max_threads
+        self._totals: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, thread_id: str, record: dict) -> None:
+        """Add one call record to the thread's totals."""
+        with self._lock:
+            totals = self._totals.get(thread_id)
+            if totals is None:
+                totals = self._totals[thread_id] = _empty_totals()
+            else:
+                self._totals.move_to_end(thread_id)
+            _accumulate(totals, record)
+            while len(self._totals) > self.max_threads:
+                self._totals.popitem(last=False)
+
+    def get(self, thread_id: str) -> dict[str, Any] | None:
+        """Return a copy of the thread's totals, or None if nothing was recorded."""
+        with self._lock:
+            totals = self._totals.get(thread_id)
+            return dict(totals) if totals is not None else None
+
+    def stats(self) -> dict[str, Any]:
+        """Return how many threads are tracked and the bound."""
+        with self._lock:
+            return {"threads": len(self._totals), "max_threads": self.max_threads}
+
+
+THREAD_TOTALS = ThreadUsageTotals()
+
+
+def thread_usage(thread_id: str) -> dict[str, Any] | None:
+    """Return the process-wide running totals for `thread_id`, or None."""
+    return THREAD_TOTALS.get(thread_id)
@@ -1,4 +1,8 @@
+import hashlib
+import re
+from functools import lru_cache
 from typing import Any, Dict, List
+
 from langchain_core.messages import AnyMessage, AIMessage, HumanMessage, SystemMessage
 
 
@@ -40,7 +44,7 @@ def resolve_urls(urls_to_resolve: List[Any], id: int) -> Dict[str, str]:
     Create a map of the vertex ai search urls (very long) to a short url with a unique id for each url.
     Ensures each original URL gets a consistent shortened form while maintaining uniqueness.
     """
-    prefix = f"https://vertexaisearch.cloud.google.com/id/"
+    prefix = "https://vertexaisearch.cloud.google.com/id/"
     urls = [site.web.uri for site in urls_to_resolve]
 
     # Create a dictionary that maps each unique URL to its first occurrence index
@@ -60,35 +64,108 @@ def insert_citation_markers(text, citations_list):
         text (str): The original text string.
         citations_list (list): A list of dictionaries, where each dictionary
                                contains 'start_index', 'end_index', and
-                               'segment_string' (the marker to insert).
+                               'segments' (the links rendered as the marker).
                                Indices are assumed to be for the original text.
 
     Returns:
         str: The text with citation markers inserted.
     """
-    # Sort citations by end_index in descending order.
-    # If end_index is the same, secondary sort by start_index descending.
-    # This ensures that insertions at the end of the string don't affect
-    # the indices of earlier parts of the string that still need to be processed.
-    sorted_citations = sorted(
-        citations_list, key=lambda c: (c["end_index"], c["start_index"]), reverse=True
+    # Walk the insertion points left to right and join the pieces once (linear in the
+    # text plus markers) instead of re-slicing the whole string for every citation.
+    # Markers sharing an end_index keep the historical order: ascending start_index,
+    # and for identical spans the later citation first.
+    order = sorted(
+        range(len(citations_list)),
+        key=lambda i: (
+            citations_list[i]["end_index"],
+            citations_list[i]["start_index"],
+            -i,
+        ),
     )
+    pieces = []
+    cursor = 0
+    length = len(text)
+    for i in order:
+        end_idx = min(max(citations_list[i]["end_index"], 0), length)
+        pieces.append(text[cursor:end_idx])
+        cursor = max(cursor, end_idx)
+        for segment in citations_list[i]["segments"]:
+            pieces.append(f" [{segment['label']}]({segment['short_url']})")
+    pieces.append(text[cursor:])
+    return "".join(pieces)
 
-    modified_text = text
-    for citation_info in sorted_citations:
-        # These indices refer to positions in the *original* text,
-        # but since we iterate from the end, they remain valid for insertion
-        # relative to the parts of the string already processed.
-        end_idx = citation_info["end_index"]
-        marker_to_insert = ""
-        for segment in citation_info["segments"]:
-            marker_to_insert += f" [{segment['label']}]({segment['short_url']})"
-        # Insert the citation marker at the original end_idx position
-        modified_text = (
-            modified_text[:end_idx] + marker_to_insert + modified_text[end_idx:]
-        )
 
-    return modified_text
+KB_SHORT_URL_PREFIX = "https://kb.local/s/"
+
+
+def kb_short_url(url: str) -> str:
+    """Stable short url for a knowledge-base source (same url -> same id across turns)."""
+    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:10]
+    return f"{KB_SHORT_URL_PREFIX}{digest}"
+
+
+@lru_cache(maxsize=64)
+def _short_url_pattern(short_urls: tuple) -> "re.Pattern[str]":
+    # Longest first so a short url never matches as the prefix of a longer one.
+    return re.compile("|".join(re.escape(u) for u in sorted(short_urls, key=len, reverse=True)))
+
+
+def resolve_short_urls(content: str, sources: List[Dict[str, Any]]):
+    """Replace every source short url in `content` with its original url in one pass.
+
+    Returns (content, used_sources) where used_sources lists, in `sources` order, the
+    first source for each short url that appears in the content.
+    """
+    by_short_url: Dict[str, Dict[str, Any]] = {}
+    for source in sources or []:
+        short_url = source.get("short_url") if isinstance(source, dict) else None
+        if isinstance(short_url, str) and short_url and short_url not in by_short_url:
+            by_short_url[short_url] = source
+    if not by_short_url or not isinstance(content, str) or not content:
+        return content, []
+
+    used = set()
+
+    def replace(match):
+        short_url = match.group()
+        used.add(short_url)
+        return str(by_short_url[short_url].get("value") or short_url)
+
+    content = _short_url_pattern(tuple(by_short_url)).sub(replace, content)
+    return content, [source for short_url, source in by_short_url.items() if short_url in used]
+
+
+class ShortUrlStreamResolver:
+    """Streaming counterpart of `resolve_short_urls` for answer text deltas.
+
+    Text is passed on once no short url can still span its end. Trailing whitespace is held
+    as well, because final answers are stripped, so everything returned so far is a prefix
+    of `resolve_short_urls(full_text.rstrip(), sources)[0]`.
+    """
+
+    _width = len(kb_short_url(""))
+
+    def __init__(self, sources: List[Dict[str, Any]]):
+        """Resolve against `sources` (items with "short_url" and "value")."""
+        self.sources = sources
+        self._pending = ""
+
+    def feed(self, text: str) -> str:
+        """Return the resolved text that is safe to show after appending `text`."""
+        buf = self._pending + text
+        cut = len(buf.rstrip())
+        for start in range(max(0, cut - self._width + 1), cut):
+            tail = buf[start:cut]
+            if KB_SHORT_URL_PREFIX.startswith(tail) or tail.startswith(KB_SHORT_URL_PREFIX):
+                cut = start
+                break
+        self._pending = buf[cut:]
+        return resolve_short_urls(buf[:cut], self.sources)[0]
+
+    def finish(self) -> str:
+        """Return the resolved remainder at the end of the stream, without trailing whitespace."""
+        text, self._pending = self._pending.rstrip(), ""
+        return resolve_short_urls(text, self.sources)[0]
 
 
 def get_citations(response, resolved_urls_map):
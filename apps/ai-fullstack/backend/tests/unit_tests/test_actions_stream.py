@@ -0,0 +1,109 @@
+from agent.actions_stream import ActionsStreamExtractor
+from agent.utils import ShortUrlStreamResolver, kb_short_url
+
+ACTIONS = '{"actions": [{"label": "继续", "input": "继续生成"}]}'
+
+
+def _stream(text, size):
+    texts, actions = [], []
+    extractor = ActionsStreamExtractor(texts.append, actions.append)
+    for i in range(0, len(text), size):
+        extractor.feed(text[i : i + size])
+    extractor.finish()
+    return "".join(texts), actions
+
+
+def test_fenced_block_is_stripped_for_every_chunk_size():
+    text = f"好的，镜头如下。\n```tapcanvas_actions\n{ACTIONS}\n```\n结束"
+    for size in (1, 2, 3, 7, len(text)):
+        visible, actions = _stream(text, size)
+        assert visible == "好的，镜头如下。\n\n结束"
+        assert actions == [[{"label": "继续", "input": "继续生成"}]]
+
+
+def test_bare_marker_block_is_stripped():
+    text = f"分镜完成。\ntapcanvas_actions\n{ACTIONS}"
+    for size in (1, 4, len(text)):
+        visible, actions = _stream(text, size)
+        assert visible == "分镜完成。\n"
+        assert actions and actions[0][0]["label"] == "继续"
+
+
+def test_marker_inside_a_line_is_plain_text():
+    text = "变量名叫 tapcanvas_actions 就行"
+    for size in (1, 5, len(text)):
+        assert _stream(text, size) == (text, [])
+
+
+def test_text_without_marker_streams_unchanged():
+    text = "第一行\n第二行 `code`\n```python\nprint(1)\n```"
+    for size in (1, 3, len(text)):
+        assert _stream(text, size)[0] == text
+
+
+def test_bare_marker_without_json_stays_visible():
+    text = "说明如下：\ntapcanvas_actions 是按钮协议的名字。\n后面还有内容"
+    for size in (1, 3, len(text)):
+        assert _stream(text, size) == (text, [])
+
+
+def test_bare_marker_at_end_of_stream_is_released():
+    assert _stream("结尾\ntapcanvas_actions  ", 2)[0] == "结尾\ntapcanvas_actions  "
+
+
+def _recording_extractor(hold, text_filter=None):
+    events = []
+    extractor = ActionsStreamExtractor(
+        lambda t: events.append(("text", t)),
+        lambda a: events.append(("actions", a)),
+        lambda t: events.append(("reset", t)),
+        hold=hold,
+        text_filter=text_filter,
+    )
+    return extractor, events
+
+
+def test_held_text_waits_for_release_but_quick_replies_do_not():
+    sources = [{"short_url": kb_short_url("https://docs.example/x"), "value": "https://docs.example/x"}]
+    extractor, events = _recording_extractor(hold=True, text_filter=ShortUrlStreamResolver(sources))
+    extractor.feed(f"答案 {sources[0]['short_url']}\n```tapcanvas_actions\n{ACTIONS}\n```\n")
+    assert events == [("actions", [{"label": "继续", "input": "继续生成"}])]
+    extractor.release()
+    extractor.feed("更多")
+    extractor.finish()
+    # Trailing whitespace waits for more text, since final answers are stripped.
+    assert events[1:] == [("text", "答案 https://docs.example/x"), ("text", "\n\n更多")]
+
+
+def test_discarded_text_is_replaced_by_the_final_message_once():
+    extractor, events = _recording_extractor(hold=True)
+    extractor.feed("未经检查的原始回答")
+    extractor.finish()
+    extractor.discard()
+    extractor.sync("已拦截，请改写后再试。", [{"label": "改写", "input": "改写"}])
+    assert events == [("text", "已拦截，请改写后再试。"), ("actions", [{"label": "改写", "input": "改写"}])]
+
+
+def test_live_text_is_reset_when_the_final_answer_differs():
+    extractor, events = _recording_extractor(hold=True)
+    extractor.feed("第一段")
+    extractor.release()
+    extractor.feed("第二段")
+    extractor.finish()
+    extractor.discard()
+    extractor.sync("已改写", None)
+    assert events == [("text", "第一段"), ("text", "第二段"), ("reset", "已改写")]
+
+
+def test_sync_appends_the_tail_or_resets():
+    extractor, events = _recording_extractor(hold=False)
+    extractor.feed("第一段")
+    extractor.finish()
+    extractor.sync("第一段\n\n下一步提示", None)
+    assert events == [("text", "第一段"), ("text", "\n\n下一步提示")]
+
+    extractor, events = _recording_extractor(hold=False)
+    extractor.feed("模型原文")
+    extractor.finish()
+    extractor.sync("改写后的回答", None)
+    assert events == [("text", "模型原文"), ("reset", "改写后的回答")]
@@ -0,0 +1,66 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.answer_cache import SemanticAnswerCache
+from agent.graph import _answer_cache_question
+
+QUESTION = "什么是景深？"
+SCOPE = ("director", "agent", "none")
+
+
+def _state(messages, **extra):
+    return {
+        "messages": messages,
+        "allow_canvas_tools": False,
+        "active_tool_tier": "none",
+        "web_research_result": [],
+        **extra,
+    }
+
+
+def _cached_answer(cache, state):
+    """Mirror finalize_answer: look up, and store on a miss, only when a key is produced."""
+    question = _answer_cache_question(state, [])
+    if not question:
+        return None
+    hit = cache.lookup(SCOPE, question, threshold=0.9, ttl_seconds=60)
+    if hit is None:
+        cache.store(SCOPE, question, {"content": f"answer for {len(state['messages'])} messages"})
+        return None
+    return hit[0]
+
+
+def test_first_turn_questions_are_shared():
+    cache = SemanticAnswerCache()
+    assert _cached_answer(cache, _state([HumanMessage(content=QUESTION)])) is None
+    assert _cached_answer(cache, _state([HumanMessage(content=QUESTION)])) is not None
+
+
+def test_threads_with_different_histories_do_not_share_hits():
+    cache = SemanticAnswerCache()
+    thread_a = _state(
+        [
+            HumanMessage(content="我们在拍一部黑白侦探片"),
+            AIMessage(content="好的，已锁定黑白胶片风格。"),
+            HumanMessage(content=QUESTION),
+        ]
+    )
+    thread_b = _state(
+        [
+            HumanMessage(content="我要做一支彩色儿童动画"),
+            AIMessage(content="好的，明快的卡通风格。"),
+            HumanMessage(content=QUESTION),
+        ]
+    )
+    assert _cached_answer(cache, thread_a) is None
+    assert _cached_answer(cache, thread_b) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_history_free_answer_is_not_served_to_a_thread_with_history():
+    cache = SemanticAnswerCache()
+    _cached_answer(cache, _state([HumanMessage(content=QUESTION)]))
+    with_summary = _state([HumanMessage(content=QUESTION)], conversation_summary="用户偏好：水墨风格")
+    with_history = _state([HumanMessage(content="锁定风格：水墨"), AIMessage(content="ok"), HumanMessage(content=QUESTION)])
+    assert _cached_answer(cache, with_summary) is None
+    assert _cached_answer(cache, with_history) is None
+    assert cache.stats()["hits"] == 0
@@ -0,0 +1,35 @@
+import threading
+
+import httpx
+import pytest
+
+from agent.autorag_server import SEARCH_PATH, make_server
+
+
+@pytest.fixture
+def base_url():
+    server = make_server("127.0.0.1", 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"ragId": 7, "query": "景深"},
+        {"ragId": None, "query": "景深"},
+        {"ragId": "kb", "query": ["景深"]},
+        {"ragId": "kb", "query": "   "},
+        ["not", "an", "object"],
+    ],
+)
+def test_malformed_fields_get_400(base_url, body):
+    assert httpx.post(base_url + SEARCH_PATH, json=body, trust_env=False).status_code == 400
+
+
+def test_valid_search(base_url):
+    resp = httpx.post(base_url + SEARCH_PATH, json={"ragId": "kb", "query": "景深"}, trust_env=False)
+    assert resp.status_code == 200
+    assert resp.json()["ragId"] == "kb"
@@ -0,0 +1,59 @@
+import time
+
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+
+from agent.checkpointer import CompressedSerializer, SqliteSaver
+
+
+def _put(saver, thread_id, values, step=0):
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    versions = {channel: saver.get_next_version(None, None) for channel in values}
+    checkpoint = create_checkpoint({**empty_checkpoint(), "channel_versions": versions}, None, step)
+    checkpoint["channel_values"] = values
+    return saver.put(config, checkpoint, {"source": "loop", "step": step, "parents": {}}, versions)
+
+
+def test_compressed_serializer_round_trip():
+    serde = CompressedSerializer(min_size=16)
+    value = {"messages": ["分镜说明。" * 200], "n": 3}
+    type_, data = serde.dumps_typed(value)
+    assert serde.loads_typed((type_, data)) == value
+    small = serde.dumps_typed({"n": 1})
+    assert serde.loads_typed(small) == {"n": 1}
+
+
+def test_put_and_get_round_trip(tmp_path):
+    saver = SqliteSaver(tmp_path / "cp.sqlite")
+    try:
+        config = _put(saver, "t1", {"messages": ["hi"], "active_role": "director"})
+        saver.put_writes(config, [("messages", ["pending"])], task_id="task-1")
+        loaded = saver.get_tuple({"configurable": {"thread_id": "t1", "checkpoint_ns": ""}})
+        assert loaded.checkpoint["channel_values"] == {"messages": ["hi"], "active_role": "director"}
+        assert loaded.pending_writes == [("task-1", "messages", ["pending"])]
+        assert saver.get_tuple({"configurable": {"thread_id": "missing", "checkpoint_ns": ""}}) is None
+    finally:
+        saver.close()
+
+
+def test_checkpoints_survive_reopen(tmp_path):
+    path = tmp_path / "cp.sqlite"
+    saver = SqliteSaver(path)
+    _put(saver, "t1", {"messages": ["persisted"]})
+    saver.close()
+    reopened = SqliteSaver(path)
+    try:
+        loaded = reopened.get_tuple({"configurable": {"thread_id": "t1", "checkpoint_ns": ""}})
+        assert loaded.checkpoint["channel_values"]["messages"] == ["persisted"]
+    finally:
+        reopened.close()
+
+
+def test_gc_removes_idle_threads(tmp_path):
+    saver = SqliteSaver(tmp_path / "cp.sqlite", ttl_seconds=60)
+    try:
+        _put(saver, "t1", {"messages": ["old"]})
+        assert saver.gc() == 0
+        assert saver.gc(now=time.time() + 120) == 1
+        assert saver.get_tuple({"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}) is None
+    finally:
+        saver.close()
@@ -0,0 +1,42 @@
+import json
+import threading
+
+import pytest
+
+from agent import debug_log
+
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch):
+    path = tmp_path / "debug.jsonl"
+    monkeypatch.setenv("DEBUG_OPENAI_RESPONSES", "1")
+    monkeypatch.setenv("DEBUG_LOG_FILE", str(path))
+    debug_log.configure(force=True)
+    yield path
+    monkeypatch.delenv("DEBUG_OPENAI_RESPONSES")
+    debug_log.configure(force=True)
+
+
+def test_counters_are_exact_under_concurrent_events(log_file):
+    before = debug_log.debug_stats()["emitted"]
+
+    def emit():
+        for _ in range(500):
+            debug_log.debug_event("test.concurrent")
+
+    threads = [threading.Thread(target=emit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = debug_log.debug_stats()
+    assert stats["emitted"] - before == 4000
+
+
+def test_fields_are_snapshotted_at_enqueue(log_file):
+    chunks = ["a"]
+    debug_log.debug_event("test.snapshot", chunks=chunks)
+    chunks.append("b")
+    debug_log.shutdown()
+    lines = [json.loads(line) for line in log_file.read_text(encoding="utf-8").splitlines()]
+    assert [line["chunks"] for line in lines if line["event"] == "test.snapshot"] == [["a"]]
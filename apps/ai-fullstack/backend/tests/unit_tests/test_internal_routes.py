@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from agent.app import app
+from agent.usage import THREAD_TOTALS
+
+SECRET = "s3cret"
+INTERNAL_GETS = ["/internal/usage/threads/t-1", "/internal/debug/log"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("INTERNAL_API_SECRET", SECRET)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("path", INTERNAL_GETS)
+def test_internal_routes_require_the_secret(client, path):
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={"x-internal-secret": "wrong"}).status_code == 401
+
+
+@pytest.mark.parametrize("path", INTERNAL_GETS)
+def test_internal_routes_are_hidden_without_a_configured_secret(client, monkeypatch, path):
+    monkeypatch.delenv("INTERNAL_API_SECRET")
+    assert client.get(path, headers={"x-internal-secret": SECRET}).status_code == 404
+
+
+def test_thread_usage_with_the_secret(client):
+    THREAD_TOTALS.add("t-1", {"input": 10, "output": 5, "latency_ms": 12.5})
+    resp = client.get("/internal/usage/threads/t-1", headers={"x-internal-secret": SECRET})
+    assert resp.status_code == 200
+    assert resp.json()["input"] == 10
+
+
+def test_debug_log_stats_with_the_secret(client):
+    resp = client.get("/internal/debug/log", headers={"x-internal-secret": SECRET})
+    assert resp.status_code == 200
+    assert "enabled" in resp.json()
+
+
+def test_config_reload_requires_the_secret(client):
+    assert client.post("/internal/config/reload").status_code == 401
+    resp = client.post("/internal/config/reload", headers={"x-internal-secret": SECRET})
+    assert resp.status_code == 200
+    assert resp.json()["ok"] is True
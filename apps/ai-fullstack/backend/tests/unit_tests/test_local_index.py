@@ -0,0 +1,38 @@
+import random
+
+import numpy as np
+
+from agent.local_index import LocalVectorIndex, _kmeans, build_index
+
+WORDS = "镜头 景深 光线 构图 色调 剪辑 节奏 角色 场景 分镜 特写 远景 逆光 运镜 字幕 配乐".split()
+
+
+def _write_corpus(docs_dir, count=60):
+    rng = random.Random(3)
+    docs_dir.mkdir()
+    for i in range(count):
+        body = " ".join(rng.choice(WORDS) for _ in range(40))
+        (docs_dir / f"doc{i:02d}.md").write_text(f"# 文档 {i}\n\n{body} 编号{i}\n", encoding="utf-8")
+
+
+def test_ivf_search_finds_the_brute_force_top_hit(tmp_path):
+    _write_corpus(tmp_path / "docs")
+    build_index(tmp_path / "docs", tmp_path / "flat")
+    build_index(tmp_path / "docs", tmp_path / "ivf", ivf_lists=8)
+    flat = LocalVectorIndex.load(tmp_path / "flat")
+    ivf = LocalVectorIndex.load(tmp_path / "ivf")
+    assert ivf.centroids is not None
+    for chunk in flat.chunks:
+        query = f"{chunk['title']}\n{chunk['text']}"
+        expected = flat.search(query, top_k=1)[0][1]["url"]
+        assert ivf.search(query, top_k=1, nprobe=1)[0][1]["url"] == expected
+
+
+def test_kmeans_assignments_match_the_returned_centroids():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(200, 16))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    # Few iterations leave k-means unconverged, so the last centroid update still moves points.
+    for iterations in (1, 3):
+        centroids, assign = _kmeans(vectors, 12, iterations=iterations)
+        assert np.array_equal(assign, np.argmax(vectors @ centroids.T, axis=1))
@@ -0,0 +1,77 @@
+import json
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage
+
+from agent import graph
+from agent.memory_trim import folded_messages, trim_folded_messages
+
+
+def _history(turns):
+    messages = []
+    for i in range(turns):
+        messages.append(HumanMessage(content=f"问题 {i}", id=f"h{i}"))
+        messages.append(AIMessage(content=f"回答 {i}", id=f"a{i}"))
+    return messages
+
+
+def test_keeps_the_tail():
+    messages = _history(5)
+    assert [m.id for m in folded_messages(messages, 4)] == ["h0", "a0", "h1", "a1", "h2", "a2"]
+    assert folded_messages(messages, 20) == []
+
+
+def test_latest_style_lock_is_pinned():
+    messages = _history(4)
+    messages[2] = HumanMessage(content="确认锁定风格：水墨", id="lock")
+    folded_ids = [m.id for m in folded_messages(messages, 2)]
+    assert "lock" not in folded_ids
+    assert "h0" in folded_ids
+
+
+def test_trim_returns_remove_updates_and_archives(tmp_path):
+    messages = _history(3)
+    removals = trim_folded_messages(messages, keep_tail=2, archive_dir=str(tmp_path), thread_id="t/1")
+    assert all(isinstance(r, RemoveMessage) for r in removals)
+    assert [r.id for r in removals] == ["h0", "a0", "h1", "a1"]
+    lines = (tmp_path / "t_1.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["data"]["id"] for line in lines] == ["h0", "a0", "h1", "a1"]
+
+
+def test_failed_archive_removes_nothing(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("", encoding="utf-8")
+    assert trim_folded_messages(_history(3), keep_tail=2, archive_dir=str(blocker), thread_id="t") == []
+
+
+class _FakeOpenAI:
+    def __init__(self):
+        self.calls = 0
+        self.responses = SimpleNamespace(create=self._unsupported)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+
+    def _unsupported(self, **_kwargs):
+        raise RuntimeError("responses API unavailable")
+
+    def _complete(self, **_kwargs):
+        self.calls += 1
+        message = SimpleNamespace(content=f"摘要 {self.calls}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_small_trim_limit_does_not_summarize_every_turn(monkeypatch):
+    client = _FakeOpenAI()
+    monkeypatch.setattr(graph, "get_openai_client", lambda: client)
+    config = {"configurable": {"llm_provider": "openai", "memory_trim_max_messages": 4}}
+    state = {"messages": _history(15), "conversation_summary": ""}
+
+    for turn in (15, 16):
+        update = graph.summarize_memory(state, config)
+        removed = {m.id for m in update.get("messages", [])}
+        state = {
+            "messages": [m for m in state["messages"] if m.id not in removed] + _history(turn + 1)[-2:],
+            "conversation_summary": update.get("conversation_summary", state["conversation_summary"]),
+        }
+
+    assert client.calls == 1
+    assert len(state["messages"]) == 20
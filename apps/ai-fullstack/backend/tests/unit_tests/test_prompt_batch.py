@@ -0,0 +1,40 @@
+from fastapi.testclient import TestClient
+
+from agent import app as app_module
+from agent.app import PROMPT_BATCH_MAX_ITEMS, app
+
+
+def test_oversized_cross_product_is_rejected_before_expansion(monkeypatch):
+    def expand(_payload):
+        raise AssertionError("oversized batch was expanded")
+
+    monkeypatch.setattr(app_module, "expand_prompt_batch", expand)
+    subjects = [f"s{i}" for i in range(PROMPT_BATCH_MAX_ITEMS // 3 + 1)]
+    response = TestClient(app).post(
+        "/api/prompt/generate/batch",
+        json={"cross": {"subjects": subjects, "workflows": ["direct_image", "merchandise", "character_creation"]}},
+    )
+    assert response.status_code == 413
+    assert str(len(subjects) * 3) in response.json()["detail"]
+
+
+def test_mixed_batch_keeps_request_order_and_item_errors():
+    response = TestClient(app).post(
+        "/api/prompt/generate/batch",
+        json={
+            "items": [{"subject": "cat", "workflow": "direct_image"}, {"workflow": "nope"}],
+            "cross": {"subjects": ["dog"], "workflows": ["merchandise"], "languages": ["zh", "en"]},
+            "stream": False,
+        },
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert [r["ok"] for r in results] == [True, False, True, True]
+
+
+def test_single_prompt_carries_etag_and_cache_control():
+    response = TestClient(app).post("/api/prompt/generate", json={"subject": "cat", "workflow": "direct_image"})
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('"')
+    assert response.headers["cache-control"] == "private, no-cache"
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+from agent.rag_cache import RagResultCache, normalize_rag_query
+
+
+def test_normalize_rag_query():
+    assert normalize_rag_query("  Depth   of\tField ") == "depth of field"
+    assert normalize_rag_query(None) == ""
+
+
+def test_fresh_hit_skips_the_loader():
+    cache = RagResultCache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return ["doc"]
+
+    assert cache.get_or_load("q", loader, ttl_seconds=60) == ["doc"]
+    assert cache.get_or_load("q", loader, ttl_seconds=60) == ["doc"]
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_uncacheable_values_are_not_stored():
+    cache = RagResultCache()
+    cache.get_or_load("q", lambda: {"error": "timeout"}, ttl_seconds=60, cacheable=lambda v: "error" not in v)
+    assert cache.stats()["entries"] == 0
+
+
+def test_stale_value_is_served_while_refreshing():
+    cache = RagResultCache()
+    cache.put("q", "old")
+    refreshed = threading.Event()
+
+    def loader():
+        refreshed.set()
+        return "new"
+
+    with cache._lock:
+        cache._entries["q"].stored_at -= 10
+    assert cache.get_or_load("q", loader, ttl_seconds=5, stale_seconds=60) == "old"
+    assert refreshed.wait(5)
+    deadline = time.monotonic() + 5
+    while cache.stats()["refreshes"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.get_or_load("q", loader, ttl_seconds=5) == "new"
+
+
+def test_lru_eviction_respects_the_byte_budget():
+    cache = RagResultCache(max_bytes=40)
+    cache.put("a", "x" * 15)
+    cache.put("b", "y" * 15)
+    cache.put("c", "z" * 15)
+    stats = cache.stats()
+    assert stats["bytes"] <= 40
+    assert stats["evictions"] == 1
+    assert cache.get_or_load("a", lambda: "reloaded", ttl_seconds=60) == "reloaded"
+
+
+def test_concurrent_misses_share_one_load():
+    cache = RagResultCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return ["doc"]
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_load("q", loader, ttl_seconds=60)))
+        for _ in range(4)
+    ]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["coalesced"] < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1]
+    assert results == [["doc"]] * 4
+
+
+def test_waiters_see_the_leader_exception():
+    cache = RagResultCache()
+    started = threading.Event()
+    release = threading.Event()
+
+    def loader():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("backend down")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_load("q", loader, ttl_seconds=60)
+        except RuntimeError as exc:
+            errors.append(str(exc))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["coalesced"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    assert errors == ["backend down", "backend down"]
+    with pytest.raises(KeyError):
+        cache._inflight["q"]
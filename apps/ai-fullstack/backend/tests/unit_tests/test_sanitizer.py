@@ -0,0 +1,45 @@
+import json
+
+from agent.sanitizer import ReplacementEngine, sanitizer_engines
+
+
+def test_longest_term_wins():
+    engine = ReplacementEngine("t", {"血": "A", "血浆": "B"})
+    text, fired = engine.apply("血浆和血")
+    assert text == "B和A"
+    assert fired == {"血浆": 1, "血": 1}
+
+
+def test_batch_matches_per_item_apply():
+    engine = sanitizer_engines("")["violent"]
+    texts = ["他被爆头", "平静的湖面", "喷血的场面，爆头"]
+    batch, fired = engine.apply_batch(texts)
+    assert batch == [engine.apply(t)[0] for t in texts]
+    assert fired["爆头"] == 2
+
+
+def test_apply_plan_only_rewrites_create_node_prompts():
+    engine = sanitizer_engines("")["sexual"]
+    calls = [
+        {"name": "createNode", "arguments": {"config": {"prompt": "裸体的雕像"}}},
+        {"name": "updateNode", "arguments": {"config": {"prompt": "裸体"}}},
+        {"name": "createNode", "arguments": {"config": {}}},
+    ]
+    fired = engine.apply_plan(calls)
+    assert calls[0]["arguments"]["config"]["prompt"] == "穿着完整（不露骨）的雕像"
+    assert calls[1]["arguments"]["config"]["prompt"] == "裸体"
+    assert fired == {"裸体": 1}
+
+
+def test_rules_file_overrides_defaults(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"violent": {"爆头": "冲击", "血浆": None}}), encoding="utf-8")
+    engine = sanitizer_engines(str(path))["violent"]
+    assert engine.apply("爆头")[0] == "冲击"
+    assert engine.apply("血浆")[0] == "血浆"
+
+
+def test_invalid_rules_file_falls_back_to_defaults(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text("[]", encoding="utf-8")
+    assert sanitizer_engines(str(path))["violent"].apply("爆头")[0] == "强烈冲击（不展示细节）"
@@ -0,0 +1,19 @@
+import os
+
+from agent.static_files import PrecompressedStaticFiles
+
+
+def test_sibling_cache_replaces_the_entry_when_a_file_is_rebuilt(tmp_path):
+    source = tmp_path / "app.js"
+    source.write_text("console.log(1)")
+    (tmp_path / "app.js.gz").write_bytes(b"gz")
+    static = PrecompressedStaticFiles(directory=tmp_path)
+
+    for step in range(3):
+        mtime_ns = 1_700_000_000_000_000_000 + step * 1_000_000_000
+        os.utime(source, ns=(mtime_ns, mtime_ns))
+        os.utime(tmp_path / "app.js.gz", ns=(mtime_ns, mtime_ns))
+        siblings = static._compressed_siblings(str(source), os.stat(source))
+        assert set(siblings) == {"gzip"}
+
+    assert list(static._siblings) == [str(source)]
@@ -0,0 +1,44 @@
+from agent.utils import (
+    ShortUrlStreamResolver,
+    insert_citation_markers,
+    kb_short_url,
+    resolve_short_urls,
+)
+
+
+def test_kb_short_url_is_stable():
+    assert kb_short_url("https://docs.example/a") == kb_short_url("https://docs.example/a")
+    assert kb_short_url("https://docs.example/a") != kb_short_url("https://docs.example/b")
+
+
+def test_short_urls_round_trip_through_citations():
+    sources = [
+        {"label": "A", "short_url": kb_short_url("https://docs.example/a"), "value": "https://docs.example/a"},
+        {"label": "B", "short_url": kb_short_url("https://docs.example/b"), "value": "https://docs.example/b"},
+        {"label": "C", "short_url": kb_short_url("https://docs.example/c"), "value": "https://docs.example/c"},
+    ]
+    text = insert_citation_markers(
+        "景深很浅。光线偏冷。",
+        [
+            {"start_index": 0, "end_index": 5, "segments": [sources[0]]},
+            {"start_index": 5, "end_index": 10, "segments": [sources[1]]},
+        ],
+    )
+    assert text == f"景深很浅。 [A]({sources[0]['short_url']})光线偏冷。 [B]({sources[1]['short_url']})"
+    resolved, used = resolve_short_urls(text, sources)
+    assert resolved == "景深很浅。 [A](https://docs.example/a)光线偏冷。 [B](https://docs.example/b)"
+    assert used == sources[:2]
+
+
+def test_resolve_short_urls_without_sources_is_a_no_op():
+    assert resolve_short_urls("text", []) == ("text", [])
+
+
+def test_streamed_short_urls_resolve_across_delta_boundaries():
+    sources = [{"short_url": kb_short_url("https://docs.example/a"), "value": "https://docs.example/a"}]
+    text = f"见 {sources[0]['short_url']}，以及 https://kb.local/other  \n"
+    expected = resolve_short_urls(text.rstrip(), sources)[0]
+    for size in (1, 2, 5, 11, len(text)):
+        resolver = ShortUrlStreamResolver(sources)
+        parts = [resolver.feed(text[i : i + size]) for i in range(0, len(text), size)]
+        assert "".join(parts) + resolver.finish() == expected